@@ -1,4 +1,12 @@
+import os
+
+import numpy as np
+
 from .budgetfund import budgetfund, fund_utils
+from .budgetfund.forecast import monte_carlo
+from .budgetfund.ledger import to_day, month_labels
+from .parquet_io import export_ledger, export_assets
+from .budgetfund.statement import statement_chunks, CHUNK_ROWS
 from .member.member_type import guardian, dependant, member_edit
 from .property.asset import Asset, PropertyRegistry
 from .property.asset_utils import summarize_total_value, search_assets, get_visualization_data
@@ -70,14 +78,14 @@ class BudgetSystem:
                 f"Current Fund: {self.fund.get()}")
 
     # -------- fund methods --------
-    def print_fund_log(self, start, end):
-        return fund_utils.print_log(self.fund, start, end)
+    def print_fund_log(self, start, end, page_size=fund_utils.PAGE_SIZE):
+        return fund_utils.print_log(self.fund, start, end, page_size)
 
-    def search_fund_log(self, keyword=''):
-        return fund_utils.search_log(self.fund, keyword)
+    def search_fund_log(self, keyword='', page_size=fund_utils.PAGE_SIZE):
+        return fund_utils.search_log(self.fund, keyword, page_size)
 
-    def filter_fund_status(self, status=True):
-        return fund_utils.filter_status(self.fund, status)
+    def filter_fund_status(self, status=True, page_size=fund_utils.PAGE_SIZE):
+        return fund_utils.filter_status(self.fund, status, page_size)
 
     def add_fund(self, amount, description='', date=None):
         return self.fund.add(amount, description, date)
@@ -85,20 +93,113 @@ class BudgetSystem:
     def sub_fund(self, amount, description='', date=None):
         return self.fund.sub(amount, description, date)
 
-    def visualize(self, year_month):
-        return self.fund.summarize_month(year_month)
+    def import_statement(self, path, columns=None, chunk_rows=CHUNK_ROWS, progress=None, date_format=None,
+                         **read_csv_args):
+        """Import a bank statement (CSV, or OFX / QFX) into the fund.
+
+        The file is read `chunk_rows` rows at a time; every chunk is
+        converted column-wise and recorded with one fund.apply_batch call,
+        so memory stays flat however large the file is. Rows that would
+        overdraw the fund are logged as failed, as with sub_fund.
+
+        columns     : field -> column name in the CSV, fields "date",
+                      "amount", "description" and optionally "action"
+                      (otherwise a negative amount is an expense)
+        progress    : called after every chunk with the running report
+        date_format : strftime format of the date column (default: inferred)
+
+        Extra keyword arguments go to pandas.read_csv. Returns the report:
+        rows, succeeded, failed, chunks, seconds and rows_per_sec.
+        """
+        report = {"rows": 0, "succeeded": 0, "failed": 0, "chunks": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+        started = time.perf_counter()
+        try:
+            for actions, amounts, descriptions, dates in statement_chunks(path, columns, chunk_rows, date_format,
+                                                                          **read_csv_args):
+                ok = self.fund.apply_batch(actions, amounts, descriptions, dates)
+                report["rows"] += len(ok)
+                report["succeeded"] += int(ok.sum())
+                report["failed"] += int(len(ok) - ok.sum())
+                report["chunks"] += 1
+                report["seconds"] = time.perf_counter() - started
+                report["rows_per_sec"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+                if progress is not None:
+                    progress(dict(report))
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Statement import stopped after {report['rows']} rows: {e}")
+            raise
+        report["seconds"] = time.perf_counter() - started
+        report["rows_per_sec"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+        print(f"Imported {report['rows']} rows ({report['failed']} failed) in {report['seconds']:.2f}s, "
+              f"{report['rows_per_sec']:,.0f} rows/sec.")
+        return report
+
+    def add_recurring_fund(self, action, amount, description='', every="monthly", start=None, end=None,
+                           interval=1, day=None, weekday=None, nth=None):
+        return self.fund.add_recurring(action, amount, description, every, start, end,
+                                       interval, day, weekday, nth)
+
+    def materialize_recurring(self, until=None):
+        return self.fund.materialize_recurring(until)
+
+    def visualize(self, year_month, plot=True):
+        return self.fund.summarize_month(year_month, plot=plot)
 
     def validate_fund(self, amount=0):
         return self.fund.validate(amount)
 
-    def summarize_month(self, start_month, end_month=''):
+    def summarize_month(self, start_month, end_month='', plot=True):
         if end_month == '':
-            return self.fund.summarize_month(start_month, start_month)
-        return self.fund.summarize_month(start_month, end_month)
+            return self.fund.summarize_month(start_month, start_month, plot=plot)
+        return self.fund.summarize_month(start_month, end_month, plot=plot)
 
     def get_df(self, start=None, end=None):
         return self.fund.get_df(start, end)
 
+    def forecast(self, months=12, n_paths=10000, history_months=24, seed=None, workers=None, start=None):
+        """Monte Carlo forecast of the fund balance over the next `months` months.
+
+        Every month of every path adds the guardians' incomes (get_income(),
+        taken as monthly amounts) and the recurring items due that month that
+        are not recorded yet, and subtracts one random draw of the other
+        expenses. Those are drawn per description from its monthly totals
+        over the `history_months` months before `start` (default: this
+        month); descriptions with a recurring rule are left out of the
+        history, they are counted exactly.
+
+        workers: number of processes to split the paths across (None = this
+        process). With a seed the result does not depend on it.
+
+        Returns
+        -------
+        dict
+            {"months": ["YYYY-MM", ...], "percentiles": {5, 25, 50, 75, 95 ->
+            balance per month}, "p_below_zero": share of paths below zero in
+            some month, "p_below_zero_by_month": share per month}
+        """
+        try:
+            months, n_paths, history_months = int(months), int(n_paths), int(history_months)
+            if months < 1 or n_paths < 1 or history_months < 1:
+                raise ValueError("months, n_paths and history_months must be at least 1.")
+            current = to_day(start).astype("datetime64[M]")
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Invalid forecast parameters: {e}")
+            raise
+        horizon = np.arange(current + 1, current + 1 + months)
+
+        # known cash flow: incomes + recurring items (due ones not recorded yet count in month 1)
+        income = sum(float(m.get_income()) for m in self.members if getattr(m, "type", None) == 'guardian')
+        due = self.fund.upcoming((horizon[-1] + 1).astype("datetime64[D]") - 1)
+        at = np.maximum(0, (due["date"].to_numpy().astype("datetime64[M]") - horizon[0]).astype(np.int64))
+        signed = np.where(due["action"].to_numpy() == "add", 1.0, -1.0) * due["amount"].to_numpy()
+        net = income + np.bincount(at, weights=signed, minlength=months)
+
+        history = self.fund.expense_history(str(current - history_months), str(current - 1))
+        history = history.drop(columns=set(self.fund.recurring.descriptions), errors="ignore")
+        result = monte_carlo(self.fund.get(), net, history.to_numpy().T, n_paths, seed, workers)
+        result["months"] = month_labels(horizon).tolist()
+        return result
+
     # -------- property / asset methods --------
     def add_asset_for_member(self, member_id, name, asset_type, current_value, date_acquired=None):
         """Create an asset for a given member ID and add it to the registry."""
@@ -150,6 +251,16 @@ class BudgetSystem:
         """Return aggregated data for charts."""
         return get_visualization_data(self.property_registry, group_by=group_by)
 
+    def export_parquet(self, root):
+        """Export the fund log and the property registry as Parquet datasets
+        (root/ledger and root/assets, partitioned by household and year_month)
+        for offline analysis; read them back with parquet_io.read_ledger /
+        read_assets. Needs pyarrow. Returns the row counts written."""
+        return {
+            "ledger": export_ledger(self.fund, os.path.join(root, "ledger"), self.household_name),
+            "assets": export_assets(self.property_registry, os.path.join(root, "assets"), self.household_name),
+        }
+
 
 
 def initialization(system=None):
@@ -313,8 +424,11 @@ def fund_editor(system):
             time.sleep(0.05)
             amount=float(input('Please enter amount:'))
             text=input('Please enter description:')
-            date=input("Please enter date (YYYY-MM-DD): ")
-            system.add_fund(amount,text,date)
+            date=input("Please enter date (YYYY-MM-DD, blank for today): ").strip() or None
+            try:
+                system.add_fund(amount,text,date)
+            except ValueError:
+                print("Transaction not recorded.")
             input("\nPress Enter to return...")
 
         elif choice == "2":
@@ -322,8 +436,11 @@ def fund_editor(system):
             time.sleep(0.05)
             amount=float(input('Please enter amount:'))
             text=input('Please enter description:')
-            date=input("Please enter date (YYYY-MM-DD): ")
-            system.sub_fund(amount,text,date)
+            date=input("Please enter date (YYYY-MM-DD, blank for today): ").strip() or None
+            try:
+                system.sub_fund(amount,text,date)
+            except ValueError:
+                print("Transaction not recorded.")
             input("\nPress Enter to return...")
 
         elif choice == "3":
@@ -333,6 +450,27 @@ def fund_editor(system):
             print("Invalid choice.")
             input("Press Enter to try again...")
 
+def browse_pages(result):
+    """Page through a print/search/filter result: n = next, p = previous, Enter = return."""
+    if not isinstance(result, list) or len(result) != 2:
+        input("\nPress Enter to return...")
+        return
+    records, summary = result
+    page = 0
+    while True:
+        print(f"{summary}  (page {page + 1}/{max(records.page_count, 1)})")
+        cmd = input("n = next page, p = previous page, Enter = return: ").strip().lower()
+        if cmd == "":
+            return
+        if cmd == "n" and page + 1 < records.page_count:
+            page += 1
+        elif cmd == "p" and page > 0:
+            page -= 1
+        else:
+            print("No such page.")
+            continue
+        records.show(page)
+
 def log_viewer(system):
     while True:
         clear_screen()
@@ -359,15 +497,13 @@ def log_viewer(system):
             start = start or None
             end   = end or None
 
-            system.print_fund_log(start, end)
-            input("\nPress Enter to return...")
+            browse_pages(system.print_fund_log(start, end))
 
         elif choice == "2":
             print("=== Search Fund Log ===")
             time.sleep(0.05)
             keyword = input("Enter keyword to search in description: ")
-            system.search_fund_log(keyword)
-            input("\nPress Enter to return...")
+            browse_pages(system.search_fund_log(keyword))
 
         elif choice == "3":
             print("=== Filter Fund Log by Status ===")
@@ -384,8 +520,7 @@ def log_viewer(system):
                 print("Invalid choice.")
                 input("Press Enter to return...")
                 continue
-            system.filter_fund_status(flag)
-            input("\nPress Enter to return...")
+            browse_pages(system.filter_fund_status(flag))
 
         elif choice == "4":
             print("=== Fund Summary ===")
@@ -0,0 +1,166 @@
+import math
+
+import pandas as pd
+
+Z_THRESHOLD = 3.0       # standard deviations above the mean
+QUANTILE = 0.95         # ... and above this quantile of the description's expenses
+MIN_COUNT = 10          # expenses seen before a description can be flagged
+
+
+class QuantileSketch:
+    """Running estimate of one quantile in constant memory (the P² algorithm).
+
+    Five markers: min, p/2, p, (1+p)/2 and max. Every observation moves
+    the marker positions; a marker drifting a whole position from where
+    it should be is adjusted with a parabolic (else linear) fit of its
+    neighbours. No observation is kept after the first five.
+    """
+
+    __slots__ = ("p", "q", "n", "want", "step")
+
+    def __init__(self, p=QUANTILE):
+        self.p = p
+        self.q = []                                     # marker heights (the first five values until then)
+        self.n = [0, 1, 2, 3, 4]                        # marker positions
+        self.want = [0, 2 * p, 4 * p, 2 + 2 * p, 4]     # desired positions
+        self.step = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        n, want = self.n, self.want
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            want[i] += self.step[i]
+        for i in (1, 2, 3):
+            d = want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                fit = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < fit < q[i + 1]:
+                    fit = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = fit
+                n[i] += d
+
+    def value(self):
+        """Current estimate (nan before the first observation)."""
+        q = self.q
+        if len(q) < 5:
+            return q[round(self.p * (len(q) - 1))] if q else math.nan
+        return q[2]
+
+
+class _Stats:
+    """Welford running mean / variance and a quantile sketch of one description."""
+
+    __slots__ = ("count", "mean", "m2", "sketch")
+
+    def __init__(self, p):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sketch = QuantileSketch(p)
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.sketch.add(x)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class AnomalyDetector:
+    """Flags unusual expenses as they are recorded, without reading the ledger.
+
+    Attach one to a fund (budgetfund(..., detector=AnomalyDetector())) and
+    every succeeded sub, one by one or in apply_batch, is passed to
+    observe(). Per description it keeps a count, the Welford mean and
+    variance and a P² sketch of the `quantile` (constant memory each).
+    An expense is flagged, before it joins the statistics, when at least
+    `min_count` expenses of that description were seen and it is more than
+    `z` standard deviations above their mean and above their quantile.
+
+    Flagged expenses are kept as columns (a few per flag); query them with
+    records() or budgetfund.anomalies().
+    """
+
+    FLAG_COLUMNS = ("position", "date", "description", "amount", "mean", "std", "z")
+
+    def __init__(self, z=Z_THRESHOLD, quantile=QUANTILE, min_count=MIN_COUNT):
+        if not 0 < quantile < 1:
+            raise ValueError("quantile must be between 0 and 1.")
+        self.z = z
+        self.quantile = quantile
+        self.min_count = max(2, int(min_count))
+        self._stats = {}                                    # description -> _Stats
+        self._flags = {name: [] for name in self.FLAG_COLUMNS}
+
+    def __len__(self):
+        return len(self._flags["position"])
+
+    def observe(self, position, description, amount, date):
+        """Check one expense and add it to its description's statistics.
+
+        position : ledger position of the row; date : its datetime64[D].
+        Returns True if it was flagged.
+        """
+        stats = self._stats.get(description)
+        if stats is None:
+            stats = self._stats[description] = _Stats(self.quantile)
+        flagged = False
+        if stats.count >= self.min_count:
+            std = stats.std()
+            excess = amount - stats.mean
+            if excess > self.z * std and amount > stats.sketch.value():
+                flags = self._flags
+                flags["position"].append(position)
+                flags["date"].append(date)
+                flags["description"].append(description)
+                flags["amount"].append(amount)
+                flags["mean"].append(stats.mean)
+                flags["std"].append(std)
+                flags["z"].append(excess / std if std else math.inf)
+                flagged = True
+        stats.add(amount)
+        return flagged
+
+    def stats(self, description):
+        """{"count", "mean", "std", "quantile"} of a description (None if never seen)."""
+        stats = self._stats.get(description)
+        if stats is None:
+            return None
+        return {"count": stats.count, "mean": stats.mean, "std": stats.std(),
+                "quantile": stats.sketch.value()}
+
+    def records(self, start=None, end=None, description=None):
+        """Flagged expenses as a DataFrame (FLAG_COLUMNS), in the order they were
+        recorded; start / end (datetime64[D], inclusive) and description filter."""
+        df = pd.DataFrame({name: pd.Series(values, dtype="datetime64[ns]" if name == "date" else None)
+                           for name, values in self._flags.items()},
+                          columns=list(self.FLAG_COLUMNS))
+        if start is not None:
+            df = df[df["date"] >= start]
+        if end is not None:
+            df = df[df["date"] <= end]
+        if description is not None:
+            df = df[df["description"] == description]
+        return df.reset_index(drop=True)
@@ -0,0 +1,209 @@
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .ledger import ACTION_CODES, STATUS_CODES, ledger_frame
+from .ledger_file import MappedLedger, write_ledger_file
+from .date_index import search_sorted
+from .rollup import MonthBucket, merge_totals
+
+MANIFEST = "segments.json"
+SUFFIX = ".bfl"
+HOT_MONTHS = 3          # months budgetfund.archive() keeps in memory by default
+OPEN_SEGMENTS = 4       # segments kept memory-mapped at a time (least recently used go first)
+
+
+class Archive:
+    """Closed months of a budgetfund, as immutable segments on disk.
+
+    Each archived month is one ledger file (see ledger_file) named
+    ``YYYY-MM.bfl``, rows in date order with their date-order balances and
+    only the descriptions they use. The manifest (segments.json) lists the
+    segments with a summary checkpoint each: row count, opening and closing
+    balance, income, expense, succeeded / failed counts and expense per
+    description (integer units).
+
+    - summaries of archived months come from the manifest alone
+    - a segment is mapped only when a query needs its rows, and at most
+      OPEN_SEGMENTS stay mapped
+    - archived rows are numbered 0..rows-1 in month order; the fund's
+      in-memory (hot) rows follow them
+
+    The manifest is replaced atomically after the segment files are
+    written, so an interrupted append() leaves the archive as it was.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.opening = None     # fund opening balance (units) before the first archived month
+        self.scale = None
+        self.until = None       # first day that is not archived (datetime64[D]), None if nothing is
+        self.segments = []      # manifest entries, month order
+        self._open = OrderedDict()
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as f:
+                data = json.load(f)
+            self.opening, self.scale = data["opening"], data["scale"]
+            self.until = np.datetime64(data["until"], "D")
+            self.segments = data["segments"]
+        self._index()
+
+    def _index(self):
+        self._keys = np.array([np.datetime64(s["month"], "M").astype(np.int64) for s in self.segments],
+                              dtype=np.int64)
+        self._starts = np.concatenate(([0], np.cumsum([s["rows"] for s in self.segments]))).astype(np.int64)
+
+    @property
+    def rows(self):
+        """Number of archived rows."""
+        return int(self._starts[-1])
+
+    @property
+    def closing(self):
+        """Balance (units) at the end of the last archived month."""
+        return self.segments[-1]["closing"] if self.segments else self.opening
+
+    # ----- writing -----
+    def append(self, ledger, opening, until):
+        """Archive `ledger`: rows dated before `until`, in date order, with
+        date-order balances starting from `opening` (units), which must be
+        the closing balance of the archive so far (or the fund opening
+        balance for the first call). One segment per month."""
+        os.makedirs(self.path, exist_ok=True)
+        if self.opening is None:
+            self.opening, self.scale = int(opening), ledger.scale
+        segments = list(self.segments)
+        dates = ledger.column("date")
+        months, starts = np.unique(dates.astype("datetime64[M]"), return_index=True)
+        ends = np.append(starts[1:], len(ledger))
+        for month, lo, hi in zip(months, starts.tolist(), ends.tolist()):
+            name = str(month)
+            segment = ledger.take(slice(lo, hi))
+            write_ledger_file(os.path.join(self.path, name + SUFFIX), segment, opening)
+            bucket = MonthBucket()
+            bucket.update(**{col: segment.column(col) for col in ("action", "amount", "desc", "status")})
+            closing = int(segment.column("balance")[-1])
+            segments.append({
+                "month": name,
+                "file": name + SUFFIX,
+                "rows": hi - lo,
+                "opening": int(opening),
+                "closing": closing,
+                "succeeded": bucket.succeeded,
+                "failed": bucket.failed,
+                "income": bucket.income,
+                "expense": bucket.expense,
+                "expense_by_desc": {segment.descriptions[d]: t for d, t in bucket.expense_by_desc.items()},
+            })
+            opening = closing
+
+        manifest = os.path.join(self.path, MANIFEST)
+        with open(manifest + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"opening": self.opening, "scale": self.scale, "until": str(until),
+                       "segments": segments}, f)
+        os.replace(manifest + ".tmp", manifest)
+        self.segments, self.until = segments, until
+        self._index()
+
+    # ----- reading -----
+    def ledger(self, i):
+        """Segment i as a MappedLedger (kept mapped while recently used)."""
+        segment = self._open.pop(i, None)
+        if segment is None:
+            segment = MappedLedger(os.path.join(self.path, self.segments[i]["file"]))
+        self._open[i] = segment
+        if len(self._open) > OPEN_SEGMENTS:
+            self._open.popitem(last=False)
+        return segment
+
+    def span(self, start_key=None, end_key=None):
+        """Segments of the months start_key..end_key (month numbers, inclusive)."""
+        lo = 0 if start_key is None else int(np.searchsorted(self._keys, start_key))
+        hi = len(self.segments) if end_key is None else int(np.searchsorted(self._keys, end_key, side="right"))
+        return range(lo, max(lo, hi))
+
+    def frames(self, span):
+        """One get_df-style DataFrame per segment in `span`."""
+        out = []
+        for i in span:
+            segment = self.ledger(i)
+            index = pd.RangeIndex(self._starts[i], self._starts[i + 1])
+            out.append(ledger_frame(segment, slice(0, len(segment)), segment.column("balance"), index))
+        return out
+
+    def row_frames(self, positions):
+        """get_df-style DataFrames of archived rows (positions, ascending), one per segment touched."""
+        owner = np.searchsorted(self._starts, positions, side="right") - 1
+        out = []
+        for i in np.unique(owner).tolist():
+            rows = positions[owner == i]
+            segment = self.ledger(i)
+            local = rows - self._starts[i]
+            out.append(ledger_frame(segment, local, segment.column("balance")[local], pd.Index(rows)))
+        return out
+
+    def records(self):
+        """Every archived row in budgetfund.get_log's record shape."""
+        out = []
+        for i in range(len(self.segments)):
+            out.extend(self.ledger(i).records())
+        return out
+
+    def select(self, status=None, action=None, span=None, keyword=None):
+        """Positions (ascending) of archived rows in `span` matching every given filter
+        (same filters as budgetfund.select). Only the segments in `span` are read."""
+        found = []
+        for i in range(len(self.segments)) if span is None else span:
+            segment = self.ledger(i)
+            keep = np.ones(len(segment), dtype=bool)
+            if status is not None:
+                keep &= segment.column("status") == STATUS_CODES[status]
+            if action is not None:
+                keep &= segment.column("action") == ACTION_CODES[action]
+            if keyword is not None:
+                lowered = keyword.lower()
+                ids = [d for d, text in enumerate(segment.descriptions) if lowered in text.lower()]
+                if not ids:
+                    continue
+                keep &= np.isin(segment.column("desc"), ids)
+            found.append(np.flatnonzero(keep) + self._starts[i])
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def summarize(self, span):
+        """Combine the checkpoints of the segments in `span` (MonthlyRollup.summarize
+        layout, expense_by_desc keyed by description text); None if `span` is empty."""
+        if not span:
+            return None
+        totals = {"succeeded": 0, "failed": 0, "income": 0, "expense": 0, "expense_by_desc": {}}
+        for i in span:
+            totals = merge_totals(totals, self.segments[i])
+        return totals
+
+    def balances_through(self, days):
+        """Balance (units) at the end of each of `days`, all before `until`.
+
+        Days in a month without a segment take the closing balance of the
+        last segment before them; only segments of the months the days fall
+        in are mapped, and each day is one binary search there.
+        """
+        days = np.asarray(days, dtype="datetime64[D]")
+        if not self.segments:
+            return np.full(days.shape, self.opening, dtype=np.int64)
+        months = days.astype("datetime64[M]").astype(np.int64)
+        at = np.searchsorted(self._keys, months, side="right") - 1
+        known = at >= 0
+        at0 = np.maximum(at, 0)
+        closing = np.array([s["closing"] for s in self.segments], dtype=np.int64)
+        out = np.where(known, closing[at0], self.opening).astype(np.int64)
+        inside = known & (self._keys[at0] == months)
+        for i in np.unique(at[inside]).tolist():
+            hit = inside & (at == i)
+            segment = self.ledger(i)
+            k = search_sorted(segment.column("date"), days[hit], side="right")
+            balance = segment.column("balance")[np.maximum(k - 1, 0)]
+            out[hit] = np.where(k > 0, balance, self.segments[i]["opening"])
+        return out
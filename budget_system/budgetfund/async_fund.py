@@ -0,0 +1,79 @@
+import asyncio
+import math
+
+import numpy as np
+
+
+
+class AsyncFund:
+    """asyncio front end for a budgetfund that coalesces writes.
+
+    ``await fund.add(...)`` / ``await fund.sub(...)`` only queue the
+    request. Requests that arrive within `window_ms` of the first queued
+    one (or until `max_batch` are queued) are applied together with one
+    budgetfund.apply_batch call: one balance pass, one log extend and one
+    journal write. Each caller still gets its own result (True / False for
+    a sub that would overdraw), exactly as if the requests had been made
+    one by one in arrival order.
+
+    Bad arguments (amount, date) raise in the caller right away and never
+    reach the batch.
+    """
+
+    def __init__(self, fund, window_ms=1, max_batch=4096):
+        self.fund = fund
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._pending = []      # (action, amount, description, day, future)
+        self._timer = None
+
+    async def add(self, amount, description='', date=None):
+        return await self._submit("add", amount, description, date)
+
+    async def sub(self, amount, description='', date=None):
+        return await self._submit("sub", amount, description, date)
+
+    def _submit(self, action, amount, description, date):
+        amount = float(amount)
+        if not math.isfinite(amount):
+            # 不能进批次: apply_batch 会整批拒绝, 连累同一窗口里的其他请求
+            raise ValueError("Amount must be a finite number.")
+        if action == "sub" and amount < 0:
+            raise ValueError("Amount must be non-negative.")
+        day = self.fund.transaction_day(date)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((action, amount, description, day, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return future
+
+    def _flush(self):
+        """Apply everything queued so far as one batch and resolve the callers."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        actions, amounts, descriptions, days, futures = zip(*batch)
+        try:
+            ok = self.fund.apply_batch(np.array(actions), np.array(amounts),
+                                       list(descriptions), np.array(days, dtype="datetime64[D]"))
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, ok.tolist()):
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self):
+        """Apply whatever is queued right now, without waiting for the window."""
+        self._flush()
+
+    def get(self):
+        return self.fund.get()
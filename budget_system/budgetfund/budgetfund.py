@@ -1,25 +1,232 @@
+import os
+import threading
+from contextlib import nullcontext
+from functools import wraps
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
+
+from .ledger import (Ledger, ACTIONS, STATUSES, ACTION_CODES, DEFAULT_SCALE, ledger_frame, month_labels,
+                     settle_batch, to_day, to_days, to_units, to_units_array, from_units)
+from .date_index import DateIndex, month_start, next_month_start, signed_amounts
+from .rollup import MonthlyRollup, month_key, merge_totals
+from .fund_plot import render_summary
+from .journal import Journal
+from .ledger_file import MappedLedger, write_ledger_file, description_path
+from .text_index import DescriptionIndex
+from .code_index import CodeIndex, intersect
+from .running import RunningBalance, date_order_balances
+from .archive import Archive, HOT_MONTHS
+from .recurring import Schedule
+from .rolling import RollingMetrics, RUNWAY_WINDOW
+from .envelopes import Envelopes, EnvelopeExceededError
 
 class InsufficientFundsError(Exception):
     """Raised when a fund does not have enough balance for an operation."""
     pass
 
 
+def _reader(method):
+    """Run a read method under the fund's read lock (thread_safe mode).
+
+    Reads refresh the lazily kept indexes and caches, so two readers must
+    not do that at the same time; writers never take this lock.
+    """
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._budgetfund__read_lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
 class budgetfund:  # this is the class for the whole budget of the family
     log_title = ['action', 'amount', 'description', 'balance', 'status', 'date']
 
-    def __init__(self, opening_balance, name=''):
-        self.opening_balance = float(opening_balance)
-        self.__balance = float(opening_balance)
+    def __init__(self, opening_balance, name='', journal=None, thread_safe=False, scale=DEFAULT_SCALE,
+                 archive=None, detector=None):
+        """journal: optional Journal (or file path) that every write is logged to.
+        An existing journal is replayed first and its opening balance wins.
+
+        thread_safe: allow add/sub/apply_batch from several threads. The
+        balance check, the debit and the log append happen in one short
+        critical section, so concurrent subs can never overdraw the fund and
+        every logged balance follows from the row before it. Readers use a
+        separate lock and never block writers.
+
+        scale: integer units per currency unit (100 = cents). Amounts and
+        balances are stored and summed as int64 units; add/sub/get and every
+        report take and return plain floats.
+
+        archive: optional Archive (or directory) for closed months, see
+        archive(). An existing archive is loaded first: its opening balance
+        wins and only the months after it are kept in memory.
+
+        detector: optional AnomalyDetector; every succeeded expense recorded
+        from then on is checked against its description's history (see
+        anomalies())."""
+        self.__opening = to_units(opening_balance, scale)   # 整数单位 (默认: 分)
+        self.__balance = self.__opening
+        self.opening_balance = from_units(self.__opening, scale)
         self.household_name = name
-        self.__log = []   # 每条记录: [action, amount, description, balance, status, date]
+        self.__log = Ledger(scale)   # 列式存储, 字段顺序同 log_title
+        self._reset_indexes()
+        self.__cache_hits = 0
+        self.__cache_misses = 0
+        self.__journal = None
+        self.__archive = None   # 已归档 (冷) 的月份, 在磁盘上
+        self.__base = 0         # 归档的行数: 内存里 (热) 的行从这个位置开始编号
+        self.recurring = Schedule()   # 周期性交易规则: 只存规则, 不预先展开
+        self.detector = detector      # 可选: 在线异常检测, 只看新记的支出
+        self.envelopes = Envelopes()  # 每月分类预算: 按 (信封, 月份) 的累计支出计数
+        # 写锁: 校验+扣款+记账是一个原子操作; 读锁: 只串行化索引/缓存的刷新
+        self.__write_lock = threading.Lock() if thread_safe else nullcontext()
+        self.__read_lock = threading.RLock() if thread_safe else nullcontext()
+        if archive is not None:
+            self._attach_archive(archive)
+        if journal is not None:
+            self._attach_journal(journal)
+
+    def _reset_indexes(self):
+        """Start every derived index and the get_df cache over (new ledger)."""
+        self.__dates = DateIndex()   # 按日期排序的位置, 用于区间查询
+        self.__months = MonthlyRollup()   # 每月汇总, summarize_month 直接合并
+        self.__running = RunningBalance()   # 按日期顺序的余额 (Fenwick 树, 支持补录)
+        self.__text = DescriptionIndex()   # 描述的倒排索引, search_log 用
+        self.__status = CodeIndex("status", STATUSES)   # 每种状态/动作的位置数组
+        self.__action = CodeIndex("action", ACTIONS)
+        self.__rolling = RollingMetrics()   # 7/30/90 天滑动窗口的支出累加器
+        # get_df 的物化缓存: 已转换的 DataFrame + 对应的 ledger 版本/行数
+        self.__frame = None
+        self.__frame_version = -1
+        self.__frame_rows = 0
+        self.__ordered = None          # 同一缓存按 (日期, 录入顺序) 排好的视图, 有补录时才用
+        self.__ordered_version = -1
+
+    def _attach_archive(self, archive):
+        """Load the archived months; the in-memory ledger starts where they end."""
+        if not isinstance(archive, Archive):
+            archive = Archive(archive)
+        if archive.until is not None:
+            if archive.scale != self.__log.scale:
+                self.__log = Ledger(archive.scale)
+            self.opening_balance = from_units(archive.opening, archive.scale)
+            self.__opening = self.__balance = archive.closing
+        self.__archive = archive
+        self.__base = archive.rows
+
+    def _archived_until(self):
+        """First day that is not archived (datetime64[D]), None if nothing is."""
+        return None if self.__archive is None else self.__archive.until
+
+    def _attach_journal(self, journal):
+        """Replay an existing journal into the ledger, then log to it.
+
+        The journal always holds the whole ledger. On an empty ledger every
+        journal row is replayed. On a ledger file (open()) only the journal
+        rows past the file's rows are (those the file header missed before
+        a crash); a new journal, or one that does not match the file, is
+        rewritten from the file.
+        """
+        if not isinstance(journal, Journal):
+            journal = Journal(journal)
+        opening, scale, descriptions, rows = journal.recover()
+        held = len(self.__log)
+        stale = held > 0 and opening is None
+        if opening is not None:
+            if held:
+                if (scale != self.__log.scale or opening != self.__opening or len(rows) < held
+                        or descriptions[:len(self.__log.descriptions)] != self.__log.descriptions[:len(descriptions)]):
+                    stale, rows, descriptions = True, rows[:0], []
+                else:
+                    rows = rows[held:]
+            elif scale != self.__log.scale:
+                self.__log = Ledger(scale)
+            until = self._archived_until()
+            if not held and until is not None and (rows["date"] < until).any():
+                # archive() 在重写日志之前中断: 已归档的行跳过, 余额从归档的期末重算
+                rows = rows[rows["date"] >= until]
+                rows["balance"] = date_order_balances(
+                    self.__opening, rows["date"], signed_amounts(rows["action"], rows["amount"], rows["status"]))
+                opening, stale = self.__opening, True
+            if not held:
+                self.__opening = self.__balance = opening
+                if until is None:
+                    self.opening_balance = from_units(opening, scale)
+            for text in descriptions:
+                self.__log.encode_description(text)
+            if len(rows):
+                self.__log.extend_records(rows)
+                self.__balance = int(rows["balance"][-1])
+        journal.open(self.__opening, self.__log.scale)
+        if stale:
+            journal.compact(self.__log, self.__opening)
+        self.__journal = journal
+
+    @classmethod
+    def open(cls, path, name='', journal=None, thread_safe=False, archive=None):
+        """Open a ledger file written by save(), memory-mapped.
+
+        Nothing is loaded up front: columns are views into the file and only
+        the pages a query touches are read. New transactions are written
+        into the file; call close() to record them in its header.
+        """
+        ledger = MappedLedger(path)
+        fund = cls(from_units(ledger.opening, ledger.scale), name, thread_safe=thread_safe, scale=ledger.scale,
+                   archive=archive)
+        fund.__log = ledger
+        fund.__opening = fund.__balance = ledger.opening
+        if len(ledger):
+            fund.__balance = int(ledger.column("balance")[-1])
+        if journal is not None:
+            fund._attach_journal(journal)
+        return fund
+
+    def save(self, path):
+        """Write the ledger to `path` (fixed-width rows) and `path.desc` (descriptions).
+
+        With an archive, only the in-memory months are written (the file's
+        opening balance is the archive's closing balance). Saving over the
+        file this fund has memory-mapped writes a new file and swaps it in.
+        """
+        log = self.__log
+        if isinstance(log, MappedLedger) and os.path.abspath(path) == os.path.abspath(log.path):
+            with self.__write_lock, self.__read_lock:
+                # 不能截断正在映射的文件: 写到临时文件再改名, 然后重新映射
+                tmp = log.path + ".tmp"
+                write_ledger_file(tmp, log, self.__opening)
+                os.replace(description_path(tmp), description_path(log.path))
+                os.replace(tmp, log.path)
+                self.__log = MappedLedger(log.path)
+                self._reset_indexes()
+            return
+        write_ledger_file(path, log, self.__opening)
+
+    def _written(self, lo):
+        """Hand ledger rows [lo, end) to the journal, if one is attached."""
+        if self.__journal is not None:
+            self.__journal.write(self.__log, lo, len(self.__log))
+
+    def close(self):
+        """Flush a memory-mapped ledger file, sync and close the journal."""
+        self.__log.flush()
+        if self.__journal is not None:
+            self.__journal.close()
+            self.__journal = None
 
     # ---------- 1. 带异常处理的校验 ----------
+    @_reader
     def get_log(self):
-        """Return raw log structure: [title_list, list_of_records]."""
-        return [self.log_title, self.__log]
+        """Return raw log structure: [title_list, list_of_records].
+
+        Records are in date order (same-day rows in the order they were entered).
+        """
+        records = self.__archive.records() if self.__base else []
+        log = self.__log
+        hot = log.records(self._row_balances(slice(0, len(log))))
+        if not log.date_sorted:
+            self.__dates.refresh(log)
+            hot = [hot[i] for i in self.__dates.sorted_positions().tolist()]
+        return [self.log_title, records + hot]
     
     def validate(self, amount=0, raise_error: bool = False):
         """Check if there is enough balance.
@@ -44,8 +251,9 @@ class budgetfund:  # this is the class for the whole budget of the family
                 # 这个是明显的参数错误，直接抛没问题
                 raise ValueError("Amount must be non-negative.")
 
-            if amount > self.__balance:
-                msg = f"Insufficient balance: need {amount}, current {self.__balance}"
+            # 按整数单位比较, 不会在分的边界上出错
+            if to_units(amount, self.__log.scale) > self.__balance:
+                msg = f"Insufficient balance: need {amount}, current {self.get()}"
                 if raise_error:
                     # 给内部（例如 sub）使用：触发自定义异常
                     raise InsufficientFundsError(msg)
@@ -61,31 +269,66 @@ class budgetfund:  # this is the class for the whole budget of the family
             raise
 
 
+    @staticmethod
+    def _parse_date(date):
+        """Parse a transaction date once, before anything is recorded."""
+        try:
+            return to_day(date)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            raise
+
+    def transaction_day(self, date=None):
+        """Parse the date of a new transaction; archived months are closed."""
+        day = self._parse_date(date)
+        until = self._archived_until()
+        if until is not None and day < until:
+            msg = f"{day} is in an archived month, transactions must be dated {until} or later."
+            print(f"[ERROR] {msg}")
+            raise ValueError(msg)
+        return day
+
     # ---------- 2. add：正常加钱 + 记一条 succeeded 记录 ----------
     def add(self, amount, desciption='', date=None):
-        if date is None:
-            date = datetime.today().strftime("%Y-%m-%d")
-        amount = float(amount)
-        self.__balance += amount
-        self.__log.append(['add', amount, desciption, self.get(), 'succeeded', date])
+        date = self.transaction_day(date)
+        units = to_units(amount, self.__log.scale)
+        with self.__write_lock:
+            self.__balance += units
+            self.__log.append('add', units, desciption, self.__balance, 'succeeded', date)
+            self._written(len(self.__log) - 1)
         return True
 
     # ---------- 3. sub：带异常处理、成功/失败都写 log ----------
     def sub(self, amount, description="", date=None):
         """Subtract an expense from the fund, with error handling."""
-        if date is None:
-            date = datetime.today().strftime("%Y-%m-%d")
+        date = self.transaction_day(date)
         try:
-            self.validate(amount, raise_error=True)
+            with self.__write_lock:
+                try:
+                    self.validate(amount, raise_error=True)
 
-            amount = float(amount)
-            self.__balance -= amount
-            self.__log.append(['sub', amount, description, self.get(), 'succeeded', date])
-            return True
+                    units = to_units(amount, self.__log.scale)
+                    # 信封额度: 只查一个计数器, 和余额校验在同一个临界区里
+                    charged = self.envelopes.check(description, units, date) if self.envelopes else None
+                    self.__balance -= units
+                    self.__log.append('sub', units, description, self.__balance, 'succeeded', date)
+                    self._written(len(self.__log) - 1)
+                    if charged is not None:
+                        self.envelopes.spend(charged, units)
+                    if self.detector is not None:
+                        self.detector.observe(self.__base + len(self.__log) - 1, description,
+                                              from_units(units, self.__log.scale), date)
+                    return True
 
-        except InsufficientFundsError:
-            self.__log.append(['sub', float(amount), description, self.get(), 'failed', date])
-            print("[ERROR] Transaction failed due to insufficient funds.")
+                except (InsufficientFundsError, EnvelopeExceededError) as e:
+                    failure = e
+                    self.__log.append('sub', to_units(amount, self.__log.scale), description,
+                                      self.__balance, 'failed', date)
+                    self._written(len(self.__log) - 1)
+            if isinstance(failure, EnvelopeExceededError):
+                print(f"[ERROR] Transaction failed: {failure}")
+            else:
+                print("[ERROR] Transaction failed due to insufficient funds.")
             return False
 
         except Exception as e:
@@ -93,10 +336,234 @@ class budgetfund:  # this is the class for the whole budget of the family
             raise
 
 
+    # ---------- 3b. apply_batch：批量 add/sub, 一次写入 ----------
+    def apply_batch(self, actions, amounts, descriptions=None, dates=None):
+        """Apply many add/sub transactions at once.
+
+        Parameters
+        ----------
+        actions : sequence of {"add", "sub"}
+        amounts : sequence of float
+        descriptions : sequence of str, optional
+            Defaults to "" for every row.
+        dates : sequence of "YYYY-MM-DD" / datetime64, optional
+            Defaults to today for every row.
+
+        Returns
+        -------
+        numpy.ndarray of bool
+            True for rows that succeeded. A sub that would overdraw the fund
+            or its envelope is logged as 'failed' and does not change the
+            balance, exactly like calling sub() row by row.
+        """
+        try:
+            amounts = np.asarray(amounts, dtype=np.float64)
+            n = len(amounts)
+            if len(actions) != n:
+                raise ValueError("actions and amounts must have the same length.")
+
+            if not isinstance(actions, np.ndarray):
+                actions = np.asarray(actions, dtype=object)
+            is_sub = actions == "sub"
+            if not (is_sub | (actions == "add")).all():
+                raise ValueError(f"Unknown action, expected one of {ACTIONS}.")
+            if not np.isfinite(amounts).all():
+                raise ValueError("Amount must be a finite number.")
+            if (amounts[is_sub] < 0).any():
+                raise ValueError("Amount must be non-negative.")
+
+            if descriptions is None:
+                descriptions = [""] * n
+            if len(descriptions) != n:
+                raise ValueError("descriptions and amounts must have the same length.")
+
+            dates = to_days(dates, n)
+            until = self._archived_until()
+            if until is not None and n and dates.min() < until:
+                raise ValueError(f"{dates.min()} is in an archived month, transactions must be dated {until} or later.")
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Invalid batch: {e}")
+            raise
+
+        action_codes = np.where(is_sub, ACTION_CODES["sub"], ACTION_CODES["add"]).astype(np.int8)
+        units = to_units_array(amounts, self.__log.scale)
+        breached = np.zeros(n, dtype=bool)
+        with self.__write_lock:
+            desc_ids = self.__log.encode_descriptions(descriptions)
+            keys = None
+            if self.envelopes:
+                groups, room, keys = self.envelopes.groups(desc_ids, self.__log.descriptions, dates)
+            if keys:
+                ok, balances = settle_batch(self.__balance, units, is_sub, groups=groups, room=room,
+                                            breached=breached)
+                self.envelopes.charge(keys, groups, units, ok & is_sub & (groups >= 0))
+            else:
+                ok, balances = settle_batch(self.__balance, units, is_sub)
+
+            lo = len(self.__log)
+            self.__log.extend(
+                action_codes,
+                units,
+                desc_ids,
+                balances,
+                (~ok).astype(np.int8),          # 0 = succeeded, 1 = failed
+                dates,
+            )
+            if n:
+                self.__balance = int(balances[-1])
+                self._written(lo)
+            if self.detector is not None:
+                # 描述从编码后的 id 取回: 调用方的 descriptions 可能是任意索引的 Series
+                spent = np.flatnonzero(ok & is_sub)
+                amounts = from_units(units[spent], self.__log.scale)
+                texts = self.__log.descriptions
+                for i, desc_id, amount in zip(spent.tolist(), desc_ids[spent].tolist(), amounts.tolist()):
+                    self.detector.observe(self.__base + lo + i, texts[desc_id], amount, dates[i])
+
+        n_breached = int(breached.sum())
+        n_failed = int(n - ok.sum()) - n_breached
+        if n_breached:
+            print(f"[ERROR] {n_breached} transaction(s) failed because their envelope is used up.")
+        if n_failed:
+            print(f"[ERROR] {n_failed} transaction(s) failed due to insufficient funds.")
+        return ok
+
     # ---------- 4. 一些 getter ----------
     def get(self):
-        return self.__balance
+        return from_units(self.__balance, self.__log.scale)
+
+    def _row_balances(self, rows):
+        """Balance (integer units) right after each ledger row, in date order.
+
+        Rows are ordered by date, same-day rows in the order they were
+        entered. While nothing was back-dated that is the stored balance;
+        otherwise it comes from the running-balance tree, so a late entry
+        shows up in the balance of every row dated after it.
+        """
+        log = self.__log
+        if log.date_sorted:
+            return log.column("balance")[rows]
+        return self.__opening + self.__running.after_rows(log, rows)
+
+    def _build_frame(self, rows):
+        """Convert ledger rows (a slice or a position array) into a DataFrame.
+
+        No per-row conversion (see ledger_frame). The index is the row
+        position, counted after the archived rows.
+        """
+        base = self.__base
+        if isinstance(rows, slice):
+            index = pd.RangeIndex(rows.start + base, rows.stop + base)
+        else:
+            index = pd.Index(rows + base)
+        return ledger_frame(self.__log, rows, self._row_balances(rows), index)
+
+    def _materialized_frame(self):
+        """Return the cached full-log DataFrame, converting only rows appended since last call."""
+        log = self.__log
+        if self.__frame is not None and self.__frame_version == log.version:
+            self.__cache_hits += 1
+            return self.__frame
+
+        self.__cache_misses += 1
+        version = log.version   # 先读版本再读行数: 并发写入时宁可多转换一次
+        n = len(log)
+        if self.__frame is None or self.__frame_rows == 0:
+            self.__frame = self._build_frame(slice(0, n))
+        elif self.__frame_rows < n:
+            # 只转换新追加的行, 再拼到已有的表后面
+            tail = self._build_frame(slice(self.__frame_rows, n))
+            frame = pd.concat([self.__frame, tail])
+            if not log.date_sorted:
+                # 补录的旧日期交易会改变之后日期所有行的余额
+                first_new = log.column("date")[self.__frame_rows:n].min()
+                stale = np.flatnonzero(log.column("date")[:self.__frame_rows] > first_new)
+                if len(stale):
+                    balance = frame["balance"].to_numpy().copy()
+                    balance[stale] = from_units(self._row_balances(stale), log.scale)
+                    frame["balance"] = balance
+            self.__frame = frame
+        self.__frame_rows = n
+        self.__frame_version = version
+        return self.__frame
+
+    def _ordered_frame(self):
+        """The cached full-log frame with rows in (date, entry) order.
+
+        While nothing was back-dated that is the cached frame itself;
+        otherwise a reordered copy, cached until the ledger changes.
+        """
+        frame = self._materialized_frame()
+        if self.__log.date_sorted:
+            return frame
+        if self.__ordered is None or self.__ordered_version != self.__frame_version:
+            self.__dates.refresh(self.__log)
+            order = self.__dates.sorted_positions()
+            if len(order) > len(frame):     # 并发写入: 只取缓存里已有的行
+                order = order[order < len(frame)]
+            self.__ordered = frame.iloc[order]
+            self.__ordered_version = self.__frame_version
+        return self.__ordered
+
+    @_reader
+    def cache_stats(self):
+        """Return hit/miss counters of the get_df cache."""
+        return {
+            "hits": self.__cache_hits,
+            "misses": self.__cache_misses,
+            "version": self.__frame_version,
+            "rows": self.__frame_rows,
+        }
+
+    # ---------- 5. 历史余额 (按日期的 Fenwick 树) ----------
+    @_reader
+    def balance_at(self, date):
+        """Balance at the end of `date`: opening balance plus every succeeded
+        transaction dated on or before it, whatever order they were entered in."""
+        day = self._parse_date(date)
+        until = self._archived_until()
+        if until is not None and day < until:
+            return from_units(int(self.__archive.balances_through([day])[0]), self.__log.scale)
+        self.__running.refresh(self.__log)
+        return from_units(self.__opening + int(self.__running.through(day)), self.__log.scale)
+
+    @_reader
+    def balance_series(self, start, end, freq="D"):
+        """End-of-day (freq="D") or end-of-month (freq="M") balances from start to end.
 
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            The datetime64[D] dates and the balance on each of them.
+        """
+        first, last = self._parse_date(start), self._parse_date(end)
+        if freq == "D":
+            days = np.arange(first, last + 1)
+        elif freq == "M":
+            months = np.arange(first.astype("datetime64[M]"), last.astype("datetime64[M]") + 1)
+            days = (months + 1).astype("datetime64[D]") - 1
+        else:
+            print(f"[ERROR] Unsupported freq {freq!r}, use 'D' or 'M'.")
+            raise ValueError(f"Unsupported freq {freq!r}, use 'D' or 'M'.")
+        return days, from_units(self._balances_through(days), self.__log.scale)
+
+    def _balances_through(self, days):
+        """Balance (units) at the end of each of `days`, archived months included."""
+        self.__running.refresh(self.__log)
+        out = self.__opening + self.__running.through(days)
+        until = self._archived_until()
+        if until is not None:
+            cold = days < until
+            if cold.any():
+                out[cold] = self.__archive.balances_through(days[cold])
+        return out
+
+    def _archived_span(self, start, end):
+        """Archive segments of the months [start, end] (None = open-ended)."""
+        return self.__archive.span(None if start is None else month_key(month_start(start)),
+                                   None if end is None else month_key(month_start(end)))
+
+    @_reader
     def get_df(self, start=None, end=None):
         """
         Return log as DataFrame within [start, end], always with 'year_month' column.
@@ -104,35 +571,39 @@ class budgetfund:  # this is the class for the whole budget of the family
         start, end:
             - None: 不限制
             - "YYYY-MM" 或 "YYYY-MM-DD" 都可以。我们会按“整月”范围来筛选。
+
+        Rows are in date order, same-day rows in the order they were entered
+        (a back-dated row shows up among its date, the index keeps its ledger
+        position). The full frame is cached and only extended with newly
+        appended rows; callers get a shallow copy, so modifying it never
+        touches the cache. A range query on a stale cache converts only the
+        rows in the range.
         """
         try:
-            # 用完整列名构建 DataFrame
-            df = pd.DataFrame(self.__log, columns=self.log_title)
-
             # 空表：也要带上 year_month 列
-            if df.empty:
+            if len(self.__log) == 0 and self.__base == 0:
+                df = pd.DataFrame(columns=self.log_title)
                 df["year_month"] = pd.Series(dtype="object")
                 return df
 
-            # 转 datetime
-            df["date"] = pd.to_datetime(df["date"])
-
-            # 先算 year_month，后面测试要用
-            df["year_month"] = df["date"].dt.to_period("M").astype(str)  # e.g. "2025-01"
+            # 区间里有已归档的月份: 只映射这些月份的数据段, 拼在内存数据前面
+            cold = self.__archive.frames(self._archived_span(start, end)) if self.__base else []
 
-            # 如果提供了 start / end，就按“月区间”筛选
-            if start is not None:
+            if start is None and end is None:
+                hot = self._ordered_frame().copy(deep=False)
+            else:
+                # 如果提供了 start / end，就按“月区间”筛选 (二分查找, 不扫描全表)
                 # 不管传 "2025-01" 还是 "2025-01-15"，都转成对应的月份
-                p_start = pd.Period(start, freq="M")
-                start_ts = p_start.to_timestamp(how="start")
-                df = df[df["date"] >= start_ts]
-
-            if end is not None:
-                p_end = pd.Period(end, freq="M")
-                end_ts = p_end.to_timestamp(how="end")
-                df = df[df["date"] <= end_ts]
-
-            return df
+                self.__dates.refresh(self.__log)
+                rows = self.__dates.date_positions(start, end)
+                if self.__frame is not None and self.__frame_version == self.__log.version:
+                    self.__cache_hits += 1
+                    hot = self.__frame.iloc[rows].copy(deep=False)
+                else:
+                    # 缓存不是最新的: 只转换区间内的行 (映射文件时只读到这些页)
+                    self.__cache_misses += 1
+                    hot = self._build_frame(rows)
+            return pd.concat(cold + [hot]) if cold else hot
 
         except KeyError as e:
             print(f"[ERROR] Missing expected column in log: {e}")
@@ -142,65 +613,417 @@ class budgetfund:  # this is the class for the whole budget of the family
             raise
 
 
-    # ---------- 6. summarize_month 保持逻辑，用修好的 get_df ----------
-    def summarize_month(self, start_month, end_month=''):
+    @_reader
+    def find(self, keyword=''):
+        """Ledger positions (ascending) of the rows whose description contains
+        `keyword`, case-insensitive. Uses the inverted description index, so
+        only posting lists are read, not the rows."""
+        self.__text.refresh(self.__log)
+        if keyword == '':
+            return np.arange(self.__base + len(self.__log))
+        found = self.__text.search(str(keyword))
+        if self.__base:
+            return np.concatenate((self.__archive.select(keyword=str(keyword)), found + self.__base))
+        return found
+
+    @_reader
+    def select(self, status=None, action=None, start=None, end=None, keyword=None):
+        """Ledger positions of the rows matching every given filter, in date
+        order (same-day rows ascending, like get_df).
+
+        status : "succeeded" / "failed"
+        action : "add" / "sub"
+        start, end : month range, same as get_df
+        keyword : description substring, same as find
+
+        Each filter is answered by its own index (per-code position arrays,
+        the date index, the description index) and the results are
+        intersected, so no filter scans the ledger. Archived months are
+        filtered segment by segment, only those in [start, end] are read.
+        """
+        log = self.__log
+        rows = slice(0, len(log))
+        try:
+            for value, index in ((status, self.__status), (action, self.__action)):
+                if value is None:
+                    continue
+                if value not in index.names:
+                    raise ValueError(f"Unknown {index.column} {value!r}, expected one of {index.names}.")
+                index.refresh(log)
+                rows = intersect(rows, index.positions(value))
+            if start is not None or end is not None:
+                self.__dates.refresh(log)
+                rows = intersect(rows, self.__dates.positions(start, end))
+            cold = None
+            if self.__base:
+                cold = self.__archive.select(status, action, self._archived_span(start, end),
+                                             None if keyword is None else str(keyword))
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Invalid filter: {e}")
+            raise
+        if keyword is not None:
+            self.__text.refresh(log)
+            rows = intersect(rows, self.__text.search(str(keyword)) if keyword != '' else slice(0, len(log)))
+        if isinstance(rows, slice):
+            rows = np.arange(rows.start, rows.stop)
+        elif log.date_sorted:
+            rows = rows.copy()
+        if not log.date_sorted:
+            # 补录过旧日期: 按日期重排 (稳定排序, 同一天保持录入顺序)
+            rows = rows[np.argsort(log.column("date")[rows], kind="stable")]
+        if cold is not None:
+            return np.concatenate((cold, rows + self.__base))
+        return rows
+
+    @_reader
+    def get_rows(self, positions):
+        """DataFrame of the given ledger positions, ascending (same columns as get_df).
+        Archived rows are read from their segments."""
+        positions = np.asarray(positions, dtype=np.int64)
+        base = self.__base
+        if base and len(positions) and positions[0] < base:
+            cold = positions < base
+            frames = self.__archive.row_frames(positions[cold])
+            if not cold.all():
+                frames.append(self._hot_rows(positions[~cold] - base))
+            return pd.concat(frames)
+        return self._hot_rows(positions - base if base else positions)
+
+    def _hot_rows(self, positions):
+        if self.__frame is not None and self.__frame_version == self.__log.version:
+            self.__cache_hits += 1
+            return self.__frame.iloc[positions].copy(deep=False)
+        return self._build_frame(positions)
+
+    # ---------- 6. summary / summarize_month：按月汇总直接合并, 不扫描全表 ----------
+    @_reader
+    def summary(self, start_month, end_month=''):
+        """Compute the summary of a month range without drawing anything.
+
+        Returns
+        -------
+        dict or None
+            {"start", "end", "opening", "income", "expense", "closing",
+            "breakdown"} where breakdown maps description -> expense total.
+            None when the period has no succeeded transaction.
+        """
         if end_month == '':
             end_month = start_month
-        df = self.get_df().copy()
-        if df.empty:
+        if len(self.__log) == 0 and self.__base == 0:
             print("No transaction records.")
             return None
 
-        df["date"] = pd.to_datetime(df["date"])
-
-        start = pd.to_datetime(start_month)
-        end = pd.to_datetime(end_month) + pd.offsets.MonthEnd(0)
-
-        period_df = df[(df["date"] >= start) & (df["date"] <= end)]
-        if period_df.empty:
+        log = self.__log
+        start_key, end_key = month_key(month_start(start_month)), month_key(month_start(end_month))
+        self.__months.refresh(log)
+        totals = self.__months.summarize(start_key, end_key)
+        if totals is not None:
+            totals["expense_by_desc"] = {log.descriptions[desc_id]: total
+                                         for desc_id, total in totals["expense_by_desc"].items()}
+        if self.__base:
+            # 已归档的月份直接用数据段的汇总检查点, 不读数据
+            cold = self.__archive.summarize(self.__archive.span(start_key, end_key))
+            if cold is not None:
+                totals = cold if totals is None else merge_totals(cold, totals)
+        if totals is None:
             print("No transactions in this period.")
             return None
 
-        success_df = period_df[period_df["status"] == "succeeded"].sort_values("date")
-        if success_df.empty:
+        if totals["succeeded"] == 0:
             print("No succeeded transaction in this period.")
             return None
 
-        income = success_df[success_df["action"] == "add"]["amount"].sum()
-        expense = success_df[success_df["action"] == "sub"]["amount"].sum()
+        breakdown = {text: from_units(total, log.scale) for text, total in totals["expense_by_desc"].items()}
+        # 期初 / 期末余额按日期顺序算, 补录的交易也算在内
+        opening, closing = self._balances_through(
+            np.array([month_start(start_month) - 1, next_month_start(end_month) - 1]))
+        return {
+            "start": start_month,
+            "end": end_month,
+            "opening": from_units(int(opening), log.scale),
+            "income": from_units(totals["income"], log.scale),
+            "expense": from_units(totals["expense"], log.scale),
+            "closing": from_units(int(closing), log.scale),
+            "breakdown": dict(sorted(breakdown.items())),
+        }
 
-        first = success_df.iloc[0]
-        if first["action"] == "add":
-            opening_balance = first["balance"] - first["amount"]
-        else:
-            opening_balance = first["balance"] + first["amount"]
+    @_reader
+    def expense_history(self, start=None, end=None):
+        """Succeeded expenses per month and description, as a DataFrame.
+
+        One row per month ("YYYY-MM") from `start` to `end` (default: the
+        first / last month with transactions), one column per description,
+        0.0 where nothing was spent. Read from the monthly rollups and the
+        archive checkpoints, not from the rows.
+        """
+        log = self.__log
+        self.__months.refresh(log)
+        spent = {}
+        if self.__base:
+            for entry in self.__archive.segments:
+                spent[month_key(np.datetime64(entry["month"], "M"))] = entry["expense_by_desc"]
+        for key, bucket in self.__months.items():
+            spent[key] = {log.descriptions[d]: total for d, total in bucket.expense_by_desc.items()}
+        if start is None and end is None and not spent:
+            return pd.DataFrame(index=pd.Index([], name="year_month"), dtype=float)
+        first = min(spent) if start is None else month_key(month_start(start))
+        last = max(spent) if end is None else month_key(month_start(end))
+        keys = np.arange(first, max(first, last + 1))
+        rows = [spent.get(key, {}) for key in keys.tolist()]
+        df = pd.DataFrame(rows, dtype=float).fillna(0.0) / log.scale
+        df.index = pd.Index(month_labels(keys.astype("datetime64[M]")), name="year_month")
+        return df[sorted(df.columns)]
 
-        closing_balance = success_df.iloc[-1]["balance"]
+    def month_frames(self):
+        """get_df-style frames of the whole history, for exports: one per
+        archived month (read from its segment), then the months in memory.
+        Only one archived month is loaded at a time."""
+        if self.__base:
+            for i in range(len(self.__archive.segments)):
+                yield from self.__archive.frames([i])
+        if len(self.__log):
+            yield self._hot_frame()
 
-        labels = ["Opening", "Income", "Expense", "Closing"]
-        values = [opening_balance, income, expense, closing_balance]
+    @_reader
+    def _hot_frame(self):
+        return self._materialized_frame().copy(deep=False)
 
-        plt.figure(figsize=(14, 6))
+    def summarize_month(self, start_month, end_month='', plot=True):
+        """Summary of a month range; plots it (bar + pie) unless plot=False.
 
-        plt.subplot(1, 2, 1)
-        plt.bar(labels, values)
-        plt.title(f"Summary for {start_month} → {end_month}")
-        plt.ylabel("Amount")
-        plt.grid(axis="y", linestyle="--", alpha=0.5)
+        With plot=False the summary dict is returned and matplotlib is never
+        loaded. With plot=True the chart is shown and None is returned.
+        """
+        summary = self.summary(start_month, end_month)
+        if summary is None or not plot:
+            return summary
+        render_summary(summary)
 
-        df_exp = success_df[success_df["action"] == "sub"]
+    # ---------- 7. 冷热分层: 已结束的月份归档到磁盘 ----------
+    def archive(self, before=None):
+        """Move every transaction dated before the month `before` to the archive.
 
-        plt.subplot(1, 2, 2)
-        if df_exp.empty:
-            plt.text(0.5, 0.5, "No expenses", ha="center", va="center", fontsize=12)
-            plt.title(f"Expense Breakdown {start_month} → {end_month}")
-        else:
-            category_sum = df_exp.groupby("description")["amount"].sum()
-            plt.pie(category_sum, labels=category_sum.index, autopct="%1.1f%%")
-            plt.title(f"Expense Breakdown {start_month} → {end_month}")
+        before : "YYYY-MM" (or any date in that month); earlier months are
+            closed. Default: keep the last HOT_MONTHS months in memory,
+            counted back from the latest transaction date.
+
+        The archived rows are written as one immutable segment per month with
+        a summary checkpoint (see Archive) and dropped from memory, together
+        with the descriptions only they used. get_df, get_rows, get_log, find,
+        select, summary and balance_at still cover the whole history and map
+        a segment only when a query needs it.
+
+        Closed months are final: transactions dated before `before` are
+        rejected from then on. Row positions returned before archiving are
+        no longer valid. An attached journal and a memory-mapped ledger file
+        are rewritten to hold just the rows that stay in memory.
+
+        Returns the number of rows archived.
+        """
+        if self.__archive is None:
+            msg = "No archive to move closed months to, create the fund with archive=<directory>."
+            print(f"[ERROR] {msg}")
+            raise ValueError(msg)
+        with self.__write_lock, self.__read_lock:
+            log = self.__log
+            if before is not None:
+                try:
+                    until = month_start(before)
+                except (TypeError, ValueError) as e:
+                    print(f"[ERROR] Invalid month for archive: {e}")
+                    raise
+            elif len(log):
+                last = log.column("date").max().astype("datetime64[M]")
+                until = (last - (HOT_MONTHS - 1)).astype("datetime64[D]")
+            else:
+                return 0
+            archived = self.__archive.until
+            if archived is not None and until <= archived:
+                return 0
+
+            # 按日期顺序的余额: 冷数据段和留下的行都存这个, 以后不再依赖录入顺序
+            n = len(log)
+            dates = log.column("date")
+            balances = self._row_balances(slice(0, n))
+            cold = np.flatnonzero(dates < until)
+            cold = cold[np.argsort(dates[cold], kind="stable")]
+            hot = np.flatnonzero(dates >= until)
+            self.__archive.append(log.take(cold, balances[cold]), self.__opening, until)
+
+            self.__opening = self.__archive.closing
+            ledger = log.take(hot, balances[hot])
+            if isinstance(log, MappedLedger):
+                # 写到临时文件再改名, 旧的映射一直有效直到被替换
+                tmp = log.path + ".tmp"
+                write_ledger_file(tmp, ledger, self.__opening)
+                os.replace(description_path(tmp), description_path(log.path))
+                os.replace(tmp, log.path)
+                ledger = MappedLedger(log.path)
+            self.__log = ledger
+            self.__base = self.__archive.rows
+            self._reset_indexes()
+            if self.__journal is not None:
+                self.__journal.compact(ledger, self.__opening)
+        return len(cold)
+
+    # ---------- 8. 周期性交易 (房租、工资、订阅) ----------
+    def add_recurring(self, action, amount, description='', every="monthly", start=None, end=None,
+                      interval=1, day=None, weekday=None, nth=None):
+        """Add a recurring transaction rule; returns its id.
+
+        every : "monthly" (on `day`), "weekly", "nth_weekday" (the `nth`
+            `weekday`, 0 = Monday, nth=-1 for the last) or "month_end",
+            every `interval` months / weeks from `start` until `end`.
+
+        Only the rule is stored. Its occurrences are recorded by
+        materialize_recurring().
+        """
+        try:
+            return self.recurring.add(action, amount, description, every, start, end, interval, day, weekday, nth)
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Invalid recurring rule: {e}")
+            raise
+
+    def materialize_recurring(self, until=None):
+        """Record every recurring occurrence due up to `until` (default today)
+        with one apply_batch call; returns how many were recorded.
+
+        Each rule remembers how far it was recorded, so calling this again
+        never records an occurrence twice.
+        """
+        ok = self.recurring.materialize(self.apply_batch, until)
+        return 0 if ok is None else len(ok)
+
+    def upcoming(self, until):
+        """Recurring occurrences not recorded yet, up to `until`, as a DataFrame
+        (action, amount, description, date) in date order. Nothing is recorded."""
+        rules, dates = self.recurring.pending(self._parse_date(until))
+        schedule = self.recurring
+        return pd.DataFrame({
+            "action": pd.Categorical.from_codes(schedule.column("action")[rules], categories=ACTIONS),
+            "amount": schedule.column("amount")[rules],
+            "description": np.array(schedule.descriptions, dtype=object)[rules],
+            "date": dates,
+        })
+
+    # ---------- 9. 滚动指标 (滑动窗口, 供告警轮询) ----------
+    def _rolling(self):
+        """The rolling accumulators, caught up with the ledger.
+
+        Started over after archive() or when opened on an archive, they
+        first fold the archived months the windows still reach into.
+        """
+        rolling, log = self.__rolling, self.__log
+        if rolling.end is None and self.__base:
+            last = self.__archive.until - 1
+            if len(log):
+                last = max(last, log.column("date").max())
+            first = month_key(month_start(last - (rolling.span - 1)))
+            for i in self.__archive.span(first, None):
+                segment = self.__archive.ledger(i)
+                rolling.fold(segment, 0, len(segment))
+        rolling.refresh(log)
+        return rolling
+
+    @_reader
+    def rolling_metrics(self, as_of=None):
+        """Burn rate, per-description moving average and runway, cheap enough to poll.
+
+        as_of : end of the windows (e.g. today). Default: the latest
+            transaction date. The windows only move forward, so a day before
+            the latest one already used is rejected.
+
+        Returns {"as_of": "YYYY-MM-DD" (None without transactions),
+        "burn_rate": {7: ..., 30: ..., 90: ...} succeeded expense per day over
+        the last 7 / 30 / 90 days, "expense_by_description": {description:
+        expense per day over the last 30 days}, "balance": current balance,
+        "runway_days": days the balance lasts at the 30-day burn rate (inf
+        when nothing was spent)}.
+
+        Kept up to date in O(1) per appended transaction (see
+        RollingMetrics); nothing is recomputed from the rows.
+        """
+        rolling = self._rolling()
+        if as_of is not None:
+            day = int(self._parse_date(as_of).view(np.int64))
+            if rolling.end is not None and day < rolling.end:
+                msg = "as_of is before the latest day of the rolling windows."
+                print(f"[ERROR] {msg}")
+                raise ValueError(msg)
+            rolling.advance(day)
+        scale = self.__log.scale
+        burn = {w: from_units(rolling.total(w), scale) / w for w in rolling.windows}
+        by_description = {text: from_units(total, scale) / rolling.description_window
+                          for text, total in sorted(rolling.by_description.items())}
+        balance = self.get()
+        rate = burn[RUNWAY_WINDOW]
+        return {
+            "as_of": None if rolling.end is None else str(np.datetime64(rolling.end, "D")),
+            "burn_rate": burn,
+            "expense_by_description": by_description,
+            "balance": balance,
+            "runway_days": max(0.0, balance / rate) if rate > 0 else float("inf"),
+        }
+
+    # ---------- 10. 异常支出 ----------
+    def anomalies(self, start=None, end=None, description=None):
+        """Expenses flagged by the attached AnomalyDetector, as a DataFrame
+        (position, date, description, amount, mean, std, z), optionally
+        filtered by date range and description. Flags are kept by the
+        detector, the ledger is not read. Positions are those at the time
+        of flagging (archive() renumbers rows)."""
+        if self.detector is None:
+            msg = "No anomaly detector attached, create the fund with detector=AnomalyDetector()."
+            print(f"[ERROR] {msg}")
+            raise ValueError(msg)
+        return self.detector.records(None if start is None else self._parse_date(start),
+                                     None if end is None else self._parse_date(end), description)
+
+    # ---------- 11. 预算信封 (每月分类额度) ----------
+    def set_envelope(self, name, limit, descriptions=None):
+        """Give the descriptions in `descriptions` (default: just `name`) a
+        shared monthly spending limit.
+
+        From then on sub and apply_batch check every expense of those
+        descriptions against what the envelope already spent that month:
+        one that would exceed `limit` is logged as 'failed', like a sub
+        without enough balance. Usage of the months in memory is taken from
+        the monthly rollups once; after that it is a running counter per
+        month, so a check never reads the ledger.
+        """
+        with self.__write_lock, self.__read_lock:
+            try:
+                members = set(self.envelopes.set(name, to_units(limit, self.__log.scale), descriptions))
+            except (TypeError, ValueError) as e:
+                print(f"[ERROR] Invalid envelope: {e}")
+                raise
+            log = self.__log
+            self.__months.refresh(log)
+            used = self.envelopes.used
+            for key in [key for key in used if key[0] == name]:
+                del used[key]
+            for month, bucket in self.__months.items():
+                spent = sum(total for d, total in bucket.expense_by_desc.items() if log.descriptions[d] in members)
+                if spent:
+                    used[(name, month)] = spent
+
+    def remove_envelope(self, name):
+        """Drop an envelope; its descriptions are no longer limited."""
+        with self.__write_lock:
+            if name not in self.envelopes:
+                msg = f"No envelope named {name!r}."
+                print(f"[ERROR] {msg}")
+                raise KeyError(msg)
+            self.envelopes.remove(name)
 
-        plt.tight_layout()
-        plt.show()
+    def envelope_usage(self, month=None):
+        """{envelope: {"limit", "spent", "remaining"}} of a month ("YYYY-MM",
+        default: the current month), read from the running counters."""
+        key = month_key(month_start(self._parse_date(None) if month is None else month))
+        scale = self.__log.scale
+        return {name: {"limit": from_units(limit, scale), "spent": from_units(spent, scale),
+                       "remaining": from_units(limit - spent, scale)}
+                for name, (limit, spent) in self.envelopes.usage(key).items()}
 
     def __str__(self):
         return 'The family budget of ' + self.household_name + ' is: ' + str(self.get())
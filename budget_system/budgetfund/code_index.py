@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def intersect(a, b):
+    """Intersection of two position sets, each a slice or an ascending array.
+
+    Slice & array is two binary searches; array & array looks the smaller
+    array up in the larger one, O(small * log(large)). The result is an
+    ascending array (or a slice if both inputs are slices).
+    """
+    if isinstance(a, slice) and isinstance(b, slice):
+        lo, hi = max(a.start, b.start), min(a.stop, b.stop)
+        return slice(lo, max(lo, hi))
+    if isinstance(a, slice):
+        a, b = b, a
+    if isinstance(b, slice):
+        return a[np.searchsorted(a, b.start):np.searchsorted(a, b.stop)]
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    at = np.searchsorted(b, a)
+    hit = at < len(b)
+    hit[hit] = b[at[hit]] == a[hit]
+    return a[hit]
+
+
+class CodeIndex:
+    """Ledger positions of every code of an int8 column (status or action).
+
+    One ascending position array per code, over-allocated like the Ledger
+    columns and extended by refresh() with the rows appended since the last
+    call. Selecting e.g. all failed rows is then a slice of one array, and
+    selections combine with intersect().
+    """
+
+    def __init__(self, column, names):
+        self.column = column
+        self.names = names
+        self._seen = 0
+        self._pos = [np.empty(64, dtype=np.int64) for _ in names]
+        self._len = [0] * len(names)
+
+    def refresh(self, ledger):
+        """Index the rows appended to `ledger` since the last call."""
+        lo, hi = self._seen, len(ledger)
+        if lo == hi:
+            return
+        codes = ledger.column(self.column)[lo:hi]
+        for code in range(len(self.names)):
+            new = np.flatnonzero(codes == code) + lo
+            m, k = self._len[code], len(new)
+            if m + k > len(self._pos[code]):
+                grown = np.empty(max(64, 2 * (m + k)), dtype=np.int64)
+                grown[:m] = self._pos[code][:m]
+                self._pos[code] = grown
+            self._pos[code][m:m + k] = new
+            self._len[code] = m + k
+        self._seen = hi
+
+    def positions(self, name):
+        """Ascending ledger positions of the rows with this code (a view)."""
+        code = self.names.index(name)
+        return self._pos[code][:self._len[code]]
@@ -0,0 +1,202 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+
+from .ledger import ACTION_CODES, STATUS_CODES
+
+LATE_ROWS = 4096        # back-dated rows buffered before they are merged into the sorted arrays
+
+
+def month_start(value):
+    """First day of the month containing `value` ("YYYY-MM", "YYYY-MM-DD", ...)."""
+    return np.datetime64(pd.Period(value, freq="M").strftime("%Y-%m"), "M").astype("datetime64[D]")
+
+
+def next_month_start(value):
+    """First day of the month after the one containing `value`."""
+    return (month_start(value).astype("datetime64[M]") + 1).astype("datetime64[D]")
+
+
+def signed_amounts(action, amount, status):
+    """Balance change of each row: +amount / -amount if it succeeded, else 0."""
+    delta = np.where(action == ACTION_CODES["add"], amount, -amount)
+    return np.where(status == STATUS_CODES["succeeded"], delta, 0)
+
+
+def search_sorted(dates, values, side="left"):
+    """np.searchsorted that never copies `dates`.
+
+    np.searchsorted makes a contiguous copy of a strided array first, which
+    for a column of a memory-mapped ledger file would read the whole file;
+    such columns are searched with bisect instead (log n element reads).
+    """
+    if dates.flags.c_contiguous:
+        return np.searchsorted(dates, values, side=side)
+    find = bisect_left if side == "left" else bisect_right
+    values = np.asarray(values, dtype=dates.dtype)
+    found = [find(dates, v) for v in values.ravel()]
+    return np.array(found, dtype=np.int64).reshape(values.shape)
+
+
+def _month_bounds(dates, start, end):
+    """(lo, hi) bounds in the sorted `dates` of the whole months [start, end]."""
+    lo = 0 if start is None else int(search_sorted(dates, month_start(start)))
+    hi = len(dates) if end is None else int(search_sorted(dates, next_month_start(end)))
+    return lo, max(lo, hi)
+
+
+def _sort_key(dates, positions):
+    """One int64 per row that sorts like (date, position)."""
+    return dates.astype(np.int64) * (1 << 40) + positions
+
+
+class DateIndex:
+    """Ledger positions sorted by (date, position), kept in step with a Ledger.
+
+    Month ranges are located with binary searches on the sorted dates, so a
+    [start, end] query never looks at rows outside the range. New rows are
+    picked up lazily by refresh(): rows that arrive in date order are simply
+    appended to the sorted arrays.
+
+    Back-dated rows go to a small sorted side buffer instead, which queries
+    search as well; only when it holds more than LATE_ROWS rows is it merged
+    into the sorted arrays (one O(n) pass). A late statement therefore costs
+    O(LATE_ROWS) to index, and range queries stay O(log n + rows returned).
+
+    While the ledger is in date order the sorted order is the ledger order
+    itself, so nothing is copied: dates are read from the ledger column
+    (for a memory-mapped ledger, only the pages a query touches are read).
+    The first back-dated row switches to owned arrays.
+    """
+
+    def __init__(self):
+        self._n = 0
+        self._seen = 0
+        self._ledger = None     # source of the dates while in_order
+        self._dates = None      # sorted dates, once out of order
+        self._order = None      # ledger positions, once out of order
+        self._m = 0             # rows in _dates / _order (the rest are late)
+        self._late_dates = np.empty(0, dtype="datetime64[D]")   # back-dated rows, sorted
+        self._late_order = np.empty(0, dtype=np.int64)
+        self.in_order = True    # True while the sorted order is just 0..n-1
+
+    def __len__(self):
+        return self._n
+
+    def _set(self, dates, order, extra=0):
+        cap = max(64, 2 * (len(dates) + extra))
+        self._dates = np.empty(cap, dtype="datetime64[D]")
+        self._order = np.empty(cap, dtype=np.int64)
+        self._dates[:len(dates)] = dates
+        self._order[:len(order)] = order
+        self._m = len(dates)
+
+    def refresh(self, ledger):
+        """Index the rows appended to `ledger` since the last call."""
+        n = len(ledger)
+        if n == self._seen:
+            return
+        lo = self._seen
+        if self.in_order:
+            if ledger.date_sorted:
+                self._ledger = ledger
+                self._n = self._seen = n
+                return
+            # first back-dated row: copy what is indexed so far, sort the rest in below
+            self._set(ledger.column("date")[:lo], np.arange(lo, dtype=np.int64), extra=n - lo)
+            self._ledger = None
+            self.in_order = False
+
+        new_dates = ledger.column("date")[lo:n]
+        new_pos = np.arange(lo, n, dtype=np.int64)
+        m = self._m
+
+        # a row not dated before anything indexed so far extends the sorted
+        # arrays; the others are back-dated and go to the side buffer
+        last = self._dates[m - 1] if m else new_dates[0]
+        ahead = new_dates >= np.maximum.accumulate(np.concatenate(([last], new_dates[:-1])))
+        k = int(ahead.sum())
+        if m + k > len(self._dates):
+            self._set(self._dates[:m], self._order[:m], extra=k)
+        self._dates[m:m + k] = new_dates[ahead]
+        self._order[m:m + k] = new_pos[ahead]
+        self._m = m + k
+
+        if k < len(new_dates):
+            late_dates, late_pos = new_dates[~ahead], new_pos[~ahead]
+            srt = np.argsort(late_dates, kind="stable")
+            late_dates, late_pos = late_dates[srt], late_pos[srt]
+            # 新行的位置比缓冲区里的都大: 同一天排在已有行之后
+            at = np.searchsorted(self._late_dates, late_dates, side="right")
+            self._late_dates = np.insert(self._late_dates, at, late_dates)
+            self._late_order = np.insert(self._late_order, at, late_pos)
+            if len(self._late_order) > LATE_ROWS:
+                self._merge()
+
+        self._n = n
+        self._seen = n
+
+    def _merge(self):
+        """Fold the side buffer into the sorted arrays, O(n)."""
+        m = self._m
+        at = np.searchsorted(_sort_key(self._dates[:m], self._order[:m]),
+                             _sort_key(self._late_dates, self._late_order))
+        self._set(np.insert(self._dates[:m], at, self._late_dates),
+                  np.insert(self._order[:m], at, self._late_order))
+        self._late_dates = self._late_dates[:0]
+        self._late_order = self._late_order[:0]
+
+    # ----- queries -----
+    def sorted_dates(self):
+        if self.in_order:
+            if self._ledger is None:
+                return np.empty(0, dtype="datetime64[D]")
+            return self._ledger.column("date")[:self._n]
+        if len(self._late_order):
+            self._merge()
+        return self._dates[:self._m]
+
+    def sorted_positions(self):
+        """Every indexed position in (date, position) order; merges the side
+        buffer first (the caller reads all rows anyway)."""
+        if self.in_order:
+            return np.arange(self._n, dtype=np.int64)
+        if len(self._late_order):
+            self._merge()
+        return self._order[:self._m]
+
+    def month_slice(self, start=None, end=None):
+        """(lo, hi) bounds in sorted order for the whole months [start, end]."""
+        return _month_bounds(self.sorted_dates(), start, end)
+
+    def _ranges(self, start, end):
+        """Rows in [start, end] as (sorted-array part, side-buffer part),
+        each a slice into its own dates / positions."""
+        return (slice(*_month_bounds(self._dates[:self._m], start, end)),
+                slice(*_month_bounds(self._late_dates, start, end)))
+
+    def positions(self, start=None, end=None):
+        """Ledger positions in [start, end], in ledger order.
+
+        Returns a slice while the ledger has never seen a back-dated row,
+        otherwise a sorted position array.
+        """
+        if self.in_order:
+            return slice(*_month_bounds(self.sorted_dates(), start, end))
+        rows, late = self._ranges(start, end)
+        rows, late = self._order[rows], self._late_order[late]
+        return np.sort(np.concatenate((rows, late)) if len(late) else rows)
+
+    def date_positions(self, start=None, end=None):
+        """Ledger positions in [start, end], in (date, position) order: the
+        order get_df presents rows in. A slice while in_order, else an array
+        (a view of the sorted positions when no back-dated row is pending)."""
+        if self.in_order:
+            return slice(*_month_bounds(self.sorted_dates(), start, end))
+        rows, late = self._ranges(start, end)
+        if late.start == late.stop:
+            return self._order[rows]
+        order = np.concatenate((self._order[rows], self._late_order[late]))
+        key = _sort_key(np.concatenate((self._dates[rows], self._late_dates[late])), order)
+        return order[np.argsort(key, kind="stable")]
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class EnvelopeExceededError(Exception):
+    """Raised when an expense would take its envelope past the monthly limit."""
+    pass
+
+
+class Envelopes:
+    """Monthly spending limits (envelopes) of a budgetfund, with running usage.
+
+    An envelope has a name, a limit per calendar month (integer units) and
+    the descriptions it covers (default: just the description equal to its
+    name). Usage is one counter per (envelope, month number), bumped by
+    every succeeded expense, so checking an expense is a couple of dict
+    lookups whatever the size of the history.
+    """
+
+    def __init__(self):
+        self.limits = {}        # envelope -> monthly limit (units)
+        self.members = {}       # envelope -> descriptions it covers
+        self._of = {}           # description -> envelope
+        self.used = {}          # (envelope, month number) -> units spent
+
+    def __len__(self):
+        return len(self.limits)
+
+    def __contains__(self, name):
+        return name in self.limits
+
+    def set(self, name, limit, descriptions=None):
+        """Create or change envelope `name`; returns the descriptions it covers."""
+        if limit < 0:
+            raise ValueError("Envelope limit must be non-negative.")
+        members = [name] if descriptions is None else [str(d) for d in descriptions]
+        for text in members:
+            other = self._of.get(text)
+            if other is not None and other != name:
+                raise ValueError(f"{text!r} already belongs to envelope {other!r}.")
+        for text in self.members.get(name, []):
+            del self._of[text]
+        self.limits[name] = int(limit)
+        self.members[name] = members
+        for text in members:
+            self._of[text] = name
+        return members
+
+    def remove(self, name):
+        """Drop envelope `name` and its usage counters."""
+        for text in self.members.pop(name):
+            del self._of[text]
+        del self.limits[name]
+        self.used = {key: units for key, units in self.used.items() if key[0] != name}
+
+    def of(self, description):
+        """Envelope covering `description`, None if there is none."""
+        return self._of.get(description)
+
+    def room(self, name, month):
+        """Units envelope `name` may still spend in `month` (month number)."""
+        return self.limits[name] - self.used.get((name, month), 0)
+
+    def check(self, description, units, day):
+        """Return the (envelope, month) an expense is charged to (None if it
+        has no envelope); raise EnvelopeExceededError if it does not fit."""
+        name = self._of.get(description)
+        if name is None:
+            return None
+        key = (name, int(day.astype("datetime64[M]").astype(np.int64)))
+        if units > self.limits[name] - self.used.get(key, 0):
+            raise EnvelopeExceededError(
+                f"Envelope {name!r} exceeded: need {units} units, {self.room(*key)} left this month.")
+        return key
+
+    def spend(self, key, units):
+        """Record `units` spent on the (envelope, month) `key` returned by check()."""
+        self.used[key] = self.used.get(key, 0) + units
+
+    def groups(self, desc_ids, texts, dates):
+        """Limit groups of a batch for settle_batch.
+
+        desc_ids : description id of each row, texts : id -> description.
+        Returns (groups, room, keys): groups[i] is the index into `keys`
+        ((envelope, month) pairs) of row i, -1 for rows without an envelope;
+        room[g] is what keys[g] may still spend.
+        """
+        groups = np.full(len(desc_ids), -1, dtype=np.int64)
+        names = list(self.limits)
+        ids, inverse = np.unique(desc_ids, return_inverse=True)
+        envelope = np.array([names.index(self._of[texts[i]]) if texts[i] in self._of else -1
+                             for i in ids.tolist()], dtype=np.int64)[inverse.ravel()]
+        limited = np.flatnonzero(envelope >= 0)
+        if not len(limited):
+            return groups, np.empty(0, dtype=np.int64), []
+        months = np.asarray(dates)[limited].astype("datetime64[M]").astype(np.int64)
+        pairs, inverse = np.unique(np.stack((envelope[limited], months)), axis=1, return_inverse=True)
+        groups[limited] = inverse.ravel()
+        keys = [(names[e], m) for e, m in zip(pairs[0].tolist(), pairs[1].tolist())]
+        room = np.array([self.room(*key) for key in keys], dtype=np.int64)
+        return groups, room, keys
+
+    def charge(self, keys, groups, amounts, spent):
+        """Add the `spent` rows of a settled batch to the usage counters."""
+        used = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(used, groups[spent], amounts[spent])
+        for key, units in zip(keys, used.tolist()):
+            if units:
+                self.spend(key, units)
+
+    def usage(self, month):
+        """{envelope: (limit, spent)} of `month` (month number), in units."""
+        return {name: (limit, self.used.get((name, month), 0)) for name, limit in self.limits.items()}
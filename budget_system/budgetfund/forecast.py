@@ -0,0 +1,86 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PERCENTILES = (5, 25, 50, 75, 95)
+POOL_SIZE = 1 << 16     # pre-drawn monthly expense totals, indexed with uint16
+CHUNK_PATHS = 25_000    # paths simulated at a time (and per pool task)
+
+
+def expense_pool(history, rng, size=POOL_SIZE):
+    """`size` draws of one month's total expense.
+
+    history : (descriptions, months) array of past monthly totals. Each
+    description is drawn independently from its own months (bootstrap),
+    so a draw is a sample of the sum of the per-description distributions.
+    """
+    pool = np.zeros(size)
+    for row in history:
+        pool += row[rng.integers(0, len(row), size)]
+    return pool
+
+
+def simulate_paths(opening, net, pool, n_paths, seed):
+    """Balances of `n_paths` paths, shape (months, n_paths), float32.
+
+    Month m of every path: balance of month m-1 + net[m] - one random
+    draw from `pool`. Built month-major so the running sum and the
+    percentiles read contiguous rows; no Python loop over paths or months.
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, len(pool), size=(len(net), n_paths), dtype=np.uint16)
+    flow = net[:, None] - pool[draws]
+    np.cumsum(flow, axis=0, out=flow)
+    flow += opening
+    return flow.astype(np.float32)
+
+
+def _simulate_chunk(args):
+    return simulate_paths(*args)
+
+
+def monte_carlo(opening, net, history, n_paths, seed=None, workers=None):
+    """Simulate future balances and summarize them.
+
+    opening : balance now
+    net     : (months,) known cash flow per month (income, recurring items)
+    history : (descriptions, past months) monthly expense totals
+    workers : None = simulate in this process, otherwise the number of
+              processes to split the paths across (same result either way
+              for a given seed)
+
+    Returns {"percentiles": {p: (months,) balances}, "p_below_zero": share
+    of paths that go below zero at some point, "p_below_zero_by_month":
+    (months,) share below zero at the end of each month}.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(1 + -(-n_paths // CHUNK_PATHS))
+    net = np.asarray(net, dtype=np.float64)
+    history = np.asarray(history, dtype=np.float64).reshape(-1, max(1, np.shape(history)[-1]))
+    pool = expense_pool(history, np.random.default_rng(seeds[0]))
+    tasks = [(opening, net, pool, min(CHUNK_PATHS, n_paths - lo), seeds[1 + i])
+             for i, lo in enumerate(range(0, n_paths, CHUNK_PATHS))]
+
+    balances = np.empty((len(net), n_paths), dtype=np.float32)
+    if workers is None:
+        chunks = map(_simulate_chunk, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunks = executor.map(_simulate_chunk, tasks)
+    try:
+        lo = 0
+        for chunk in chunks:
+            balances[:, lo:lo + chunk.shape[1]] = chunk
+            lo += chunk.shape[1]
+    finally:
+        if workers is not None:
+            executor.shutdown()
+
+    # percentiles with one partition per month row (nearest rank, no full sort)
+    ranks = [round(p / 100 * (n_paths - 1)) for p in PERCENTILES]
+    picked = np.partition(balances, ranks, axis=1)[:, ranks].astype(np.float64)
+    below = balances < 0
+    return {
+        "percentiles": {p: picked[:, i] for i, p in enumerate(PERCENTILES)},
+        "p_below_zero": float(below.any(axis=0).mean()),
+        "p_below_zero_by_month": below.mean(axis=1),
+    }
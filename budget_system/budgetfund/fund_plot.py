@@ -0,0 +1,49 @@
+import io
+
+
+def _draw(fig, summary):
+    """Bar chart of the totals (left) + pie chart of the expenses (right)."""
+    start, end = summary["start"], summary["end"]
+    labels = ["Opening", "Income", "Expense", "Closing"]
+    values = [summary["opening"], summary["income"], summary["expense"], summary["closing"]]
+
+    ax_bar, ax_pie = fig.subplots(1, 2)
+    ax_bar.bar(labels, values)
+    ax_bar.set_title(f"Summary for {start} → {end}")
+    ax_bar.set_ylabel("Amount")
+    ax_bar.grid(axis="y", linestyle="--", alpha=0.5)
+
+    breakdown = summary["breakdown"]
+    if not breakdown:
+        ax_pie.text(0.5, 0.5, "No expenses", ha="center", va="center", fontsize=12)
+    else:
+        ax_pie.pie(list(breakdown.values()), labels=list(breakdown.keys()), autopct="%1.1f%%")
+    ax_pie.set_title(f"Expense Breakdown {start} → {end}")
+
+    fig.tight_layout()
+
+
+def render_summary(summary, fmt=None):
+    """Draw a summary returned by budgetfund.summary().
+
+    fmt=None shows the figure with pyplot (notebook / desktop use).
+    fmt="png" / "svg" / ... renders off-screen on a bare Figure (no pyplot,
+    no GUI backend) and returns the encoded image as bytes.
+
+    matplotlib is only imported here, so computing summaries never loads it.
+    """
+    if fmt is None:
+        import matplotlib.pyplot as plt
+
+        fig = plt.figure(figsize=(14, 6))
+        _draw(fig, summary)
+        plt.show()
+        return None
+
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(14, 6))
+    _draw(fig, summary)
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    return buf.getvalue()
@@ -1,53 +1,104 @@
+from collections.abc import Sequence
+
+import numpy as np
 from .budgetfund import budgetfund
-import matplotlib.pyplot as plt
 import pandas as pd
 from IPython.display import display
 
-def print_log(budgetfund,start,end):
-    df = budgetfund.get_df(start,end)
-    def color_status(val):  # pragma: no cover
-        if val == 'succeeded':
-            return 'background-color: #d4edda; color: #155724;'
-        elif val == 'failed':
-            return 'background-color: #f8d7da; color: #721c24;'
-        return ""
-    styler = df.style
-    styler = styler.map(color_status, subset="status")
+PAGE_SIZE = 50
+
+
+def color_status(val):  # pragma: no cover
+    if val == 'succeeded':
+        return 'background-color: #d4edda; color: #155724;'
+    elif val == 'failed':
+        return 'background-color: #f8d7da; color: #721c24;'
+    return ""
+
+
+class LogResult(Sequence):
+    """Lazy result of print_log / search_log / filter_status.
+
+    Holds only the matched ledger positions. Rows are converted when they
+    are asked for, one page (or one slice) at a time:
+
+    - result[i], result[a:b]  -> rows as lists (same layout as df.values.tolist())
+    - page(k)                 -> DataFrame of page k (0-based)
+    - after(token)            -> (next page DataFrame, token for the page after it)
+    - chunks()                -> generator of page DataFrames
+    - show(k)                 -> display page k
+    """
+
+    def __init__(self, fund, positions, page_size=PAGE_SIZE):
+        self.fund = fund
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.page_size = max(1, int(page_size))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.fund.get_rows(self.positions[i]).values.tolist()
+        return self.fund.get_rows(self.positions[[i]]).values.tolist()[0]
 
-    display(styler)
+    def __iter__(self):
+        for df in self.chunks():
+            yield from df.values.tolist()
 
-    return [df.values.tolist(), f"Total Record #: {len(df)}"]
+    @property
+    def page_count(self):
+        return -(-len(self.positions) // self.page_size)
 
+    def page(self, number=0):
+        """DataFrame of page `number` (0-based); empty past the last page."""
+        lo = number * self.page_size
+        return self.fund.get_rows(self.positions[lo:lo + self.page_size])
 
-def search_log(budgetfund, keyword=''):
-    df = budgetfund.get_df().copy()
-    df['description'] = df['description'].fillna("")
-    found = df[df['description'].str.contains(keyword, case=False, na=False)]
-    if found.empty:
+    def after(self, token=None):
+        """Page after a cursor token (None = first page).
+
+        Returns (DataFrame, token); the token is the ledger position of the
+        page's last row, None once there is nothing left. Positions come in
+        date order, not necessarily ascending, so the token is looked up.
+        """
+        lo = 0 if token is None else int(np.flatnonzero(self.positions == token)[0]) + 1
+        rows = self.positions[lo:lo + self.page_size]
+        more = lo + self.page_size < len(self.positions)
+        return self.fund.get_rows(rows), int(rows[-1]) if more else None
+
+    def chunks(self):
+        """Yield the result page by page as DataFrames."""
+        for number in range(self.page_count):
+            yield self.page(number)
+
+    def show(self, number=0):
+        """Display page `number` with the status column colored; return it."""
+        df = self.page(number)
+        display(df.style.map(color_status, subset="status"))
+        return df
+
+
+def print_log(budgetfund, start, end, page_size=PAGE_SIZE):
+    records = LogResult(budgetfund, budgetfund.select(start=start, end=end), page_size)
+    records.show(0)   # 只渲染第一页, 其余按需翻页
+    return [records, f"Total Record #: {len(records)}"]
+
+
+def search_log(budgetfund, keyword='', page_size=PAGE_SIZE):
+    # 倒排索引找位置, 只转换要显示的那一页
+    records = LogResult(budgetfund, budgetfund.find(keyword), page_size)
+    if len(records) == 0:
         return ["No record found"]
-    def color_status(val):  # pragma: no cover
-        if val == 'succeeded':
-            return 'background-color: #d4edda; color: #155724;'
-        elif val == 'failed':
-            return 'background-color: #f8d7da; color: #721c24;'
-        return ""
-    styler = found.style.map(color_status, subset="status")
-    display(styler)
-    return [found.values.tolist(), f"Total # of Record Found is: {len(found)}"]
-    
-
-def filter_status(budgetfund, status=True):
-    df = budgetfund.get_df().copy()
+    records.show(0)
+    return [records, f"Total # of Record Found is: {len(records)}"]
+
+
+def filter_status(budgetfund, status=True, page_size=PAGE_SIZE):
     target = 'succeeded' if status else 'failed'
-    found = df[df['status'] == target]
-    if found.empty:
+    # 状态位置数组直接选行, 不再整表比较字符串
+    records = LogResult(budgetfund, budgetfund.select(status=target), page_size)
+    if len(records) == 0:
         return "No record found"
-    def color_status(val):  # pragma: no cover
-        if val == 'succeeded':
-            return 'background-color: #d4edda; color: #155724;'
-        elif val == 'failed':
-            return 'background-color: #f8d7da; color: #721c24;'
-        return ""
-    styler = found.style.map(color_status, subset="status")
-    display(styler)
-    return [found.values.tolist(), f"Total # of Record Found is: {len(found)}"]
\ No newline at end of file
+    records.show(0)
+    return [records, f"Total # of Record Found is: {len(records)}"]
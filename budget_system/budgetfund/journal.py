@@ -0,0 +1,219 @@
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from .ledger import RECORD_DTYPE
+
+MAGIC = b"BFJ3"
+_HEADER = struct.Struct("<4sqq")     # magic, opening balance (units), scale
+_FRAME = struct.Struct("<cII")       # kind, payload length, crc32 of payload
+_DESC = struct.Struct("<i")          # description id (followed by utf-8 text)
+_ROW = struct.Struct("<bbqqqi")      # one RECORD_DTYPE row, for single writes
+
+FSYNC_POLICIES = ("always", "group", "os")
+COMPACT_CHUNK = 1 << 20              # rows per T frame when compacting
+
+
+class Journal:
+    """Append-only write-ahead journal for a budgetfund.
+
+    File layout: a header (magic, opening balance, scale) followed by framed
+    records ``kind | length | crc32 | payload``:
+
+    - ``D``: a new description, ``desc id`` + utf-8 text
+    - ``T``: one or more transactions, packed RECORD_DTYPE rows
+
+    A single add/sub is one ``T`` frame, a whole apply_batch is also one
+    ``T`` frame. On open, a frame that is cut short or fails its crc (a
+    torn write from a crash) is dropped together with everything after it.
+
+    fsync policy:
+
+    - "always": flush + fsync after every write
+    - "group":  write() only notes the new row range; a background thread
+      frames everything noted (one ``T`` frame), writes and fsyncs it every
+      `group_ms` milliseconds (group commit)
+    - "os":     flush to the OS after every write, never fsync
+    """
+
+    def __init__(self, path, fsync="group", group_ms=5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}.")
+        self.path = path
+        self.fsync = fsync
+        self.group_ms = group_ms
+        self._file = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._syncer = None
+        self._desc_written = 0
+        self._pending = None        # ledger whose rows [_lo, _hi) are noted but not written yet
+        self._lo = self._hi = 0
+
+    # ----- recovery -----
+    def recover(self):
+        """Read the journal back, truncating a torn tail.
+
+        Returns
+        -------
+        (int or None, int or None, list of str, numpy.ndarray)
+            Opening balance in integer units and the scale (both None for a
+            new/empty journal), descriptions in id order and all transaction
+            rows as a RECORD_DTYPE array.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < _HEADER.size:
+            return None, None, [], np.empty(0, dtype=RECORD_DTYPE)
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+        magic, opening, scale = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a budgetfund journal.")
+
+        descriptions, chunks = [], []
+        offset = good = _HEADER.size
+        while offset + _FRAME.size <= len(data):
+            kind, length, crc = _FRAME.unpack_from(data, offset)
+            start = offset + _FRAME.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            if kind == b"D":
+                (desc_id,) = _DESC.unpack_from(payload, 0)
+                if desc_id != len(descriptions):
+                    break
+                descriptions.append(payload[_DESC.size:].decode("utf-8"))
+            elif kind == b"T":
+                chunks.append(np.frombuffer(payload, dtype=RECORD_DTYPE))
+            else:
+                break
+            offset = good = start + length
+
+        if good < len(data):
+            print(f"[ERROR] Journal {self.path}: dropping {len(data) - good} bytes of torn tail.")
+            os.truncate(self.path, good)
+
+        rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+        self._desc_written = len(descriptions)
+        return opening, scale, descriptions, rows
+
+    # ----- writing -----
+    def open(self, opening, scale):
+        """Open for appending, writing the header (opening units, scale) if the file is new."""
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) < _HEADER.size
+        self._file = open(self.path, "wb" if new else "ab")
+        if new:
+            self._file.write(_HEADER.pack(MAGIC, int(opening), int(scale)))
+            self._commit()
+        if self.fsync == "group":
+            self._stop.clear()
+            self._syncer = threading.Thread(target=self._group_commit, daemon=True)
+            self._syncer.start()
+
+    def _frame(self, kind, payload):
+        return _FRAME.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+    def write(self, ledger, lo, hi):
+        """Journal ledger rows [lo, hi) (plus any descriptions they introduced).
+
+        With fsync="group" the rows are not packed here: consecutive ranges
+        are merged and the group-commit thread frames them in one go, so an
+        add/sub only pays for taking the lock.
+        """
+        if self.fsync == "group":
+            with self._lock:
+                if self._pending is not None and (self._pending is not ledger or self._hi != lo):
+                    self._drain()
+                if self._pending is None:
+                    self._pending, self._lo = ledger, lo
+                self._hi = hi
+            return
+        data = self._frames(ledger, lo, hi)
+        with self._lock:
+            self._file.write(data)
+            self._commit()
+
+    def _frames(self, ledger, lo, hi):
+        """D frames for descriptions not journaled yet, then one T frame of rows [lo, hi)."""
+        if hi - lo == 1:
+            rows = _ROW.pack(*ledger.record(lo))
+        else:
+            rows = ledger.pack(lo, hi).tobytes()
+        data = self._frame(b"T", rows)
+
+        descriptions = ledger.descriptions
+        if self._desc_written < len(descriptions):
+            parts = []
+            for desc_id in range(self._desc_written, len(descriptions)):
+                text = descriptions[desc_id].encode("utf-8")
+                parts.append(self._frame(b"D", _DESC.pack(desc_id) + text))
+            self._desc_written = len(descriptions)
+            data = b"".join(parts) + data
+        return data
+
+    def _drain(self):
+        """Write the rows noted by write() in group mode (lock held)."""
+        if self._pending is not None:
+            self._file.write(self._frames(self._pending, self._lo, self._hi))
+            self._pending = None
+            self._dirty = True
+
+    def compact(self, ledger, opening):
+        """Replace the journal with one that holds just `ledger` (opening balance
+        `opening` units), e.g. after old months were archived.
+
+        The new file is written next to the old one and renamed over it, so
+        a crash leaves one complete journal or the other.
+        """
+        reopen = self._file is not None
+        self._pending = None        # 新文件会从 ledger 重新写出这些行
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, int(opening), int(ledger.scale)))
+            for desc_id, text in enumerate(ledger.descriptions):
+                f.write(self._frame(b"D", _DESC.pack(desc_id) + text.encode("utf-8")))
+            for lo in range(0, len(ledger), COMPACT_CHUNK):
+                f.write(self._frame(b"T", ledger.pack(lo, min(lo + COMPACT_CHUNK, len(ledger))).tobytes()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._desc_written = len(ledger.descriptions)
+        if reopen:
+            self.open(opening, ledger.scale)
+
+    def _commit(self):
+        self._file.flush()
+        if self.fsync != "os":
+            os.fsync(self._file.fileno())
+
+    def _group_commit(self):
+        while not self._stop.wait(self.group_ms / 1000):
+            self.sync()
+
+    def sync(self):
+        """Flush and fsync everything written so far."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._drain()
+            if self._dirty:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def close(self):
+        """Stop the group-commit thread, sync and close the file."""
+        if self._syncer is not None:
+            self._stop.set()
+            self._syncer.join()
+            self._syncer = None
+        if self._file is not None:
+            self._dirty = True
+            self.sync()
+            self._file.close()
+            self._file = None
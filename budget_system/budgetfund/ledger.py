@@ -0,0 +1,401 @@
+from datetime import date as _date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ACTIONS = ("add", "sub")
+STATUSES = ("succeeded", "failed")
+
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+
+# fixed-width, little-endian on-disk form of one ledger row (journal, ledger files)
+RECORD_DTYPE = np.dtype([
+    ("action", "i1"),
+    ("status", "i1"),
+    ("amount", "<i8"),    # integer units (cents with the default scale)
+    ("balance", "<i8"),
+    ("date", "<M8[D]"),   # int64 days since 1970-01-01, same as Ledger's date column
+    ("desc", "<i4"),
+])
+
+# same range as datetime.date, so every stored day can be shown as "%Y-%m-%d"
+MIN_DAY = np.datetime64("0001-01-01", "D")
+MAX_DAY = np.datetime64("9999-12-31", "D")
+
+
+DEFAULT_SCALE = 100     # units per currency unit: amounts are stored in cents
+
+
+def to_units(amount, scale=DEFAULT_SCALE):
+    """Convert one amount to integer units (rounded to the nearest unit)."""
+    return int(round(float(amount) * scale))
+
+
+def to_units_array(amounts, scale=DEFAULT_SCALE):
+    """Vectorized to_units: float amounts -> int64 units."""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * scale).astype(np.int64)
+
+
+def from_units(units, scale=DEFAULT_SCALE):
+    """Integer units -> float amounts, for display only (scalar or array)."""
+    return units / scale
+
+
+def to_day(date=None):
+    """Validate one transaction date and convert it to datetime64[D].
+
+    None means today. Accepts "YYYY-MM-DD" strings, date / datetime objects
+    and numpy datetime64 values; anything else (including "" and NaT)
+    raises ValueError.
+    """
+    if date is None:
+        return np.datetime64(datetime.today().date(), "D")
+    if isinstance(date, str):
+        return _parse_day(date)
+    if not isinstance(date, (_date, np.datetime64)):
+        raise ValueError(f"Invalid date {date!r}, expected 'YYYY-MM-DD'.")
+    return _check_day(date)
+
+
+@lru_cache(maxsize=4096)
+def _parse_day(text):
+    # transaction dates repeat a lot, so parsed strings are memoized
+    return _check_day(text)
+
+
+def _check_day(date):
+    try:
+        day = np.datetime64(date, "D")
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}, expected 'YYYY-MM-DD'.") from None
+    if np.isnat(day) or not MIN_DAY <= day <= MAX_DAY:
+        raise ValueError(f"Invalid date {date!r}, expected 'YYYY-MM-DD'.")
+    return day
+
+
+def to_days(dates, n):
+    """Vectorized to_day for a batch of `n` dates (None means today for all)."""
+    if dates is None:
+        return np.full(n, to_day())
+    try:
+        days = np.asarray(dates, dtype="datetime64[D]")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid date in batch: {e}") from None
+    if len(days) != n:
+        raise ValueError("dates and amounts must have the same length.")
+    if np.isnat(days).any() or (days < MIN_DAY).any() or (days > MAX_DAY).any():
+        raise ValueError("Invalid date in batch, expected 'YYYY-MM-DD'.")
+    return days
+
+
+def month_labels(months):
+    """Turn a datetime64[M] array into "YYYY-MM" strings (object array).
+
+    Only the distinct months between min and max are formatted, every row
+    is then a plain take() from that small label table.
+    """
+    if len(months) == 0:
+        return np.empty(0, dtype=object)
+    m = months.astype(np.int64)
+    lo, hi = int(m.min()), int(m.max())
+    table = np.datetime_as_string(np.arange(lo, hi + 1).astype("datetime64[M]"))
+    return table.astype(object)[m - lo]
+
+
+class Ledger:
+    """Columnar, append-only storage for budgetfund transactions.
+
+    Every field lives in its own typed numpy array:
+
+    - action / status : int8 codes into ACTIONS / STATUSES
+    - amount / balance: int64 units, `scale` units per currency unit
+      (cents by default); converted to floats only for display
+    - date            : datetime64[D]
+    - desc            : int32 id into the description dictionary
+
+    Arrays are over-allocated and doubled when full, so appends are
+    amortized O(1) and column reads are zero-copy slices.
+    """
+
+    DTYPES = {
+        "action": np.int8,
+        "amount": np.int64,
+        "desc": np.int32,
+        "balance": np.int64,
+        "status": np.int8,
+        "date": "datetime64[D]",
+    }
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, scale=DEFAULT_SCALE):
+        self.scale = scale
+        self._n = 0
+        self.version = 0           # bumped on every write, used by derived views
+        self._cols = {
+            name: np.empty(self.INITIAL_CAPACITY, dtype=dtype)
+            for name, dtype in self.DTYPES.items()
+        }
+        self.descriptions = []     # id -> text
+        self._desc_ids = {}        # text -> id
+        self._desc_array = np.empty(0, dtype=object)
+        self.date_sorted = True    # False once a row is dated before the row above it
+
+    def __len__(self):
+        return self._n
+
+    # ----- storage helpers -----
+    def _reserve(self, extra):
+        """Make room for `extra` more rows."""
+        need = self._n + extra
+        cap = len(self._cols["amount"])
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        for name, old in self._cols.items():
+            new = np.empty(cap, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            self._cols[name] = new
+
+    def encode_description(self, text):
+        """Return the dictionary id of a description, adding it if new."""
+        text = "" if text is None else str(text)
+        desc_id = self._desc_ids.get(text)
+        if desc_id is None:
+            desc_id = len(self.descriptions)
+            self.descriptions.append(text)
+            self._desc_ids[text] = desc_id
+        return desc_id
+
+    def encode_descriptions(self, texts):
+        """Vectorized encode_description: return an int32 id array for many texts."""
+        codes, uniques = pd.factorize(np.asarray(texts, dtype=object))
+        ids = [self.encode_description(u) for u in uniques]
+        ids.append(self.encode_description(""))   # code -1 (None / NaN) -> ""
+        return np.array(ids, dtype=np.int32)[codes]
+
+    # ----- write -----
+    def append(self, action, amount, description, balance, status, date):
+        """Append a single record (same field order as budgetfund.log_title).
+
+        `amount` / `balance` are integer units, `date` must already be a
+        datetime64[D] (see to_day).
+        """
+        self._reserve(1)
+        i = self._n
+        cols = self._cols
+        cols["action"][i] = ACTION_CODES[action]
+        cols["amount"][i] = amount
+        cols["desc"][i] = self.encode_description(description)
+        cols["balance"][i] = balance
+        cols["status"][i] = STATUS_CODES[status]
+        cols["date"][i] = date
+        if self.date_sorted and i and date < cols["date"][i - 1]:
+            self.date_sorted = False
+        self._n = i + 1
+        self.version += 1
+
+    def extend(self, action_codes, amounts, desc_ids, balances, status_codes, dates):
+        """Append a whole batch of already-encoded columns in one operation."""
+        k = len(amounts)
+        if k == 0:
+            return
+        self._reserve(k)
+        lo, hi = self._n, self._n + k
+        cols = self._cols
+        cols["action"][lo:hi] = action_codes
+        cols["amount"][lo:hi] = amounts
+        cols["desc"][lo:hi] = desc_ids
+        cols["balance"][lo:hi] = balances
+        cols["status"][lo:hi] = status_codes
+        cols["date"][lo:hi] = dates
+        if self.date_sorted:
+            new = cols["date"][lo:hi]
+            self.date_sorted = bool((new[1:] >= new[:-1]).all()) and (lo == 0 or new[0] >= cols["date"][lo - 1])
+        self._n = hi
+        self.version += 1
+
+    def extend_records(self, records):
+        """Append rows given as a RECORD_DTYPE array (desc ids must already exist)."""
+        self.extend(records["action"], records["amount"], records["desc"], records["balance"],
+                    records["status"], records["date"])
+
+    # ----- read -----
+    def column(self, name):
+        """Zero-copy view of the first len(self) values of a column."""
+        n = self._n     # read the length first: a grown column always holds it
+        return self._cols[name][:n]
+
+    def pack(self, lo=0, hi=None):
+        """Rows [lo, hi) as a RECORD_DTYPE array."""
+        hi = self._n if hi is None else hi
+        out = np.empty(hi - lo, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            out[name] = self._cols[name][lo:hi]
+        return out
+
+    def record(self, i):
+        """Row i as a plain tuple in RECORD_DTYPE field order."""
+        cols = self._cols
+        return (int(cols["action"][i]), int(cols["status"][i]), int(cols["amount"][i]),
+                int(cols["balance"][i]), int(cols["date"].view(np.int64)[i]), int(cols["desc"][i]))
+
+    def description_values(self):
+        """Dictionary as an object array, so desc ids can be decoded with take()."""
+        if len(self._desc_array) != len(self.descriptions):
+            self._desc_array = np.array(self.descriptions, dtype=object)
+        return self._desc_array
+
+    def records(self, balances=None):
+        """Materialize rows as [action, amount, description, balance, status, date].
+
+        Amounts are converted to floats here. `balances` (integer units)
+        replaces the stored (insert-time) balance column if given.
+        """
+        actions = np.array(ACTIONS, dtype=object)[self.column("action")]
+        statuses = np.array(STATUSES, dtype=object)[self.column("status")]
+        descriptions = self.description_values()[self.column("desc")]
+        dates = np.datetime_as_string(self.column("date"))
+        return [
+            list(row)
+            for row in zip(
+                actions.tolist(),
+                from_units(self.column("amount"), self.scale).tolist(),
+                descriptions.tolist(),
+                from_units(self.column("balance") if balances is None else balances, self.scale).tolist(),
+                statuses.tolist(),
+                dates.tolist(),
+            )
+        ]
+
+    def take(self, rows, balances=None):
+        """New in-memory Ledger holding `rows` (a slice or positions, in that
+        order) and only the descriptions they use. `balances` (integer units,
+        one per row) replaces the stored balance column if given."""
+        out = Ledger(self.scale)
+        ids, local = np.unique(self.column("desc")[rows], return_inverse=True)
+        for desc_id in ids.tolist():
+            out.encode_description(self.descriptions[desc_id])
+        out.extend(self.column("action")[rows], self.column("amount")[rows], local.astype(np.int32),
+                   self.column("balance")[rows] if balances is None else balances,
+                   self.column("status")[rows], self.column("date")[rows])
+        return out
+
+    def flush(self):
+        """Nothing to persist for an in-memory ledger (see MappedLedger)."""
+
+
+def ledger_frame(ledger, rows, balances, index):
+    """DataFrame of ledger rows (a slice or a position array) with the
+    budgetfund.get_df columns. `balances` are the rows' balances in integer
+    units; amounts and balances are turned into floats here, at the edge.
+    No per-row conversion.
+    """
+    dates = ledger.column("date")[rows]
+    return pd.DataFrame({
+        "action": pd.Categorical.from_codes(ledger.column("action")[rows], categories=ACTIONS),
+        "amount": from_units(ledger.column("amount")[rows], ledger.scale),
+        "description": ledger.description_values()[ledger.column("desc")[rows]],
+        "balance": from_units(balances, ledger.scale),
+        "status": pd.Categorical.from_codes(ledger.column("status")[rows], categories=STATUSES),
+        "date": dates,
+        "year_month": month_labels(dates.astype("datetime64[M]")),  # e.g. "2025-01"
+    }, index=index, copy=False)
+
+
+def settle_batch(opening, amounts, is_sub, block=4096, calm=256, groups=None, room=None, breached=None):
+    """Replay a batch of add/sub amounts (int64 units) against a balance.
+
+    Returns (ok, balances): which rows succeeded and the balance after each
+    row. Same rule as budgetfund.sub: a sub larger than the balance right
+    before it fails and leaves the balance unchanged. Integer arithmetic,
+    so the vectorized and row-by-row paths agree exactly.
+
+    groups / room: optional spending limits (envelopes). groups[i] is the
+    limit group of row i (-1 for none) and room[g] what group g may still
+    spend; a sub larger than its group's room fails the same way, and
+    `room` is reduced in place by what the succeeded rows spent. Those
+    failures are marked in `breached` (bool array, optional).
+
+    Stretches without failures are settled with a cumulative sum. After a
+    failure the rows are walked one by one (the fund is probably close to
+    empty) until `calm` rows in a row have succeeded, then it switches back
+    to the vectorized path.
+    """
+    n = len(amounts)
+    ok = np.ones(n, dtype=bool)
+    balances = np.empty(n, dtype=np.int64)
+    delta = np.where(is_sub, -amounts, amounts)
+    limited = None if groups is None else is_sub & (groups >= 0)
+    carry = int(opening)
+    pos = 0
+    while pos < n:
+        # --- vectorized stretch ---
+        hi = min(pos + block, n)
+        run = np.cumsum(np.concatenate(([carry], delta[pos:hi])))
+        bad = np.flatnonzero(is_sub[pos:hi] & (amounts[pos:hi] > run[:-1]))
+        if limited is not None:
+            # 每组按录入顺序累计的支出, 第一条超出剩余额度的行
+            rows = pos + np.flatnonzero(limited[pos:hi])
+            order = np.argsort(groups[rows], kind="stable")
+            rows, g = rows[order], groups[rows][order]
+            spent = np.cumsum(amounts[rows])
+            first = np.ones(len(g), dtype=bool)
+            first[1:] = g[1:] != g[:-1]
+            before = np.maximum.accumulate(np.where(first, spent - amounts[rows], 0))
+            over = rows[spent - before > room[g]]
+            if len(over):
+                bad = np.union1d(bad, over.min() - pos)
+        if len(bad) == 0:
+            balances[pos:hi] = run[1:]
+            carry = int(run[-1])
+            if limited is not None:
+                np.subtract.at(room, g, amounts[rows])
+            pos = hi
+            continue
+        j = pos + int(bad[0])
+        balances[pos:j] = run[1:j - pos + 1]
+        carry = int(run[j - pos])
+        if limited is not None:
+            settled = rows < j
+            np.subtract.at(room, g[settled], amounts[rows[settled]])
+
+        # --- row-by-row stretch ---
+        streak = 0
+        while j < n and streak < calm:
+            stop = min(j + block, n)
+            amt = amounts[j:stop].tolist()
+            sub = is_sub[j:stop].tolist()
+            grp = [-1] * (stop - j) if groups is None else groups[j:stop].tolist()
+            after = []
+            failed = []
+            for k, a in enumerate(amt):
+                if sub[k]:
+                    g_k = grp[k]
+                    if g_k >= 0 and a > room[g_k]:
+                        failed.append(j + k)
+                        if breached is not None:
+                            breached[j + k] = True
+                        streak = 0
+                    elif a > carry:
+                        failed.append(j + k)
+                        streak = 0
+                    else:
+                        carry = carry - a
+                        if g_k >= 0:
+                            room[g_k] -= a
+                        streak += 1
+                else:
+                    carry = carry + a
+                    streak += 1
+                after.append(carry)
+                if streak >= calm:
+                    break
+            balances[j:j + len(after)] = after
+            ok[failed] = False
+            j += len(after)
+        pos = j
+    return ok, balances
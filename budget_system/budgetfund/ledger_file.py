@@ -0,0 +1,113 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from .ledger import Ledger, RECORD_DTYPE
+
+MAGIC = b"BFL2"
+_HEADER = struct.Struct("<4sqqq?")   # magic, row count, opening balance (units), scale, rows in date order
+HEADER_SIZE = 64                     # rows start here, the rest of the header is padding
+WRITE_CHUNK = 1 << 20                # rows per write when saving
+
+
+def description_path(path):
+    """The description dictionary that goes with a ledger file."""
+    return path + ".desc"
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"{path} is not a budgetfund ledger file.")
+    magic, n, opening, scale, date_sorted = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a budgetfund ledger file.")
+    return n, opening, scale, date_sorted
+
+
+def _write_header(f, n, opening, scale, date_sorted):
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, n, int(opening), int(scale), date_sorted).ljust(HEADER_SIZE, b"\0"))
+
+
+def write_ledger_file(path, ledger, opening):
+    """Save a Ledger as a fixed-width ledger file plus its description dictionary.
+
+    Layout of `path`: a HEADER_SIZE header (row count, `opening` balance in
+    integer units, ledger.scale, date-order flag), then one RECORD_DTYPE
+    row per transaction. `path.desc` holds the descriptions, one JSON
+    string per line, line number = description id.
+    """
+    n = len(ledger)
+    with open(path, "wb") as f:
+        _write_header(f, n, opening, ledger.scale, ledger.date_sorted)
+        f.seek(HEADER_SIZE)
+        for lo in range(0, n, WRITE_CHUNK):
+            f.write(ledger.pack(lo, min(lo + WRITE_CHUNK, n)).tobytes())
+    with open(description_path(path), "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(text) + "\n" for text in ledger.descriptions)
+
+
+class MappedLedger(Ledger):
+    """A Ledger whose columns live in a memory-mapped ledger file.
+
+    Each column is a field view into one np.memmap of RECORD_DTYPE rows, so
+    opening a file reads only the header and the description dictionary;
+    column reads are zero-copy views and pages are loaded by the OS when a
+    query touches them. Appends are written into the mapping; when the file
+    is full it is grown (capacity doubled) and mapped again.
+
+    flush() writes the row count into the header and appends new
+    descriptions to the dictionary file.
+    """
+
+    def __init__(self, path):
+        n, self.opening, scale, date_sorted = _read_header(path)
+        super().__init__(scale)
+        self.path = path
+        self.date_sorted = date_sorted
+        with open(description_path(path), encoding="utf-8") as f:
+            for line in f:
+                self.encode_description(json.loads(line))
+        self._desc_saved = len(self.descriptions)
+        capacity = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if capacity < n:
+            raise ValueError(f"{path} is truncated: header says {n} rows, file holds {capacity}.")
+        self._n = n
+        self._map(max(capacity, 1))
+
+    def _map(self, capacity):
+        if HEADER_SIZE + capacity * RECORD_DTYPE.itemsize > os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self._rows = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r+",
+                               offset=HEADER_SIZE, shape=(capacity,))
+        self._cols = {name: self._rows[name] for name in self.DTYPES}
+
+    def _reserve(self, extra):
+        """Grow the file (and the mapping) to fit `extra` more rows."""
+        need = self._n + extra
+        cap = len(self._rows)
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        self._rows.flush()
+        self._map(cap)
+
+    def pack(self, lo=0, hi=None):
+        """Rows [lo, hi), already in RECORD_DTYPE form: a view of the file."""
+        return self._rows[lo:self._n if hi is None else hi]
+
+    def flush(self):
+        """Persist appended rows, the row count and new descriptions."""
+        self._rows.flush()
+        with open(self.path, "r+b") as f:
+            _write_header(f, self._n, self.opening, self.scale, self.date_sorted)
+        if self._desc_saved < len(self.descriptions):
+            with open(description_path(self.path), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(text) + "\n" for text in self.descriptions[self._desc_saved:])
+            self._desc_saved = len(self.descriptions)
@@ -0,0 +1,231 @@
+import threading
+
+import numpy as np
+
+from .ledger import ACTIONS, ACTION_CODES, MAX_DAY, to_day
+
+KINDS = ("monthly", "weekly", "nth_weekday", "month_end")
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+CHUNK_RULES = 4096      # rules expanded per generator step
+
+
+def day_of_week(days):
+    """Day of the week of datetime64[D] values, Monday = 0 (1970-01-01 was a Thursday)."""
+    return (np.asarray(days, dtype="datetime64[D]").view(np.int64) + 3) % 7
+
+
+def _ranges(counts):
+    """0..count-1 for every count, concatenated."""
+    starts = np.cumsum(counts) - counts
+    return np.arange(int(counts.sum())) - np.repeat(starts, counts)
+
+
+NO_DAY = np.iinfo(np.int64).min    # table entry of a month without that occurrence
+
+
+def _month_code(kind, day, weekday, nth):
+    """Row of _month_table for each month-kind rule."""
+    nth_row = 31 + 7 * np.where(nth > 0, nth - 1, 5) + weekday
+    return np.select([kind == KIND_CODES["monthly"], kind == KIND_CODES["nth_weekday"]],
+                     [day - 1, nth_row], 31 + 42)
+
+
+def _month_table(m0, m1):
+    """Day numbers of every month-kind occurrence in months m0..m1 (months since 1970-01).
+
+    Rows: 0..30 monthly day 1..31 (clamped to the month's last day),
+    31..72 nth_weekday (nth 1..5 then last, times weekday 0..6, NO_DAY
+    where the month has no such day), 73 month end. Flattened row-major.
+    """
+    starts = np.arange(m0, m1 + 2).astype("datetime64[M]").astype("datetime64[D]").view(np.int64)
+    first, last = starts[:-1], starts[1:] - 1
+    monthly = np.minimum(first + np.arange(31)[:, None], last)
+    offset = (np.arange(7)[:, None] - (first + 3)) % 7               # first such weekday, (d + 3) % 7: Monday = 0
+    nth = first + offset + 7 * np.arange(5)[:, None, None]
+    nth = np.where(nth <= last, nth, NO_DAY).reshape(35, -1)
+    final = last - ((last + 3) - np.arange(7)[:, None]) % 7
+    return np.concatenate((monthly, nth, final, last[None, :])).ravel()
+
+
+class Schedule:
+    """Recurring transaction rules of a budgetfund, stored as rules only.
+
+    Every rule is one row of typed numpy columns (like the Ledger):
+    action, amount, description, kind, start / end day, interval and the
+    kind's parameters, plus `done` — the last day already materialized.
+
+    kinds:
+
+    - "monthly":     on `day` of every `interval`-th month (clamped to the
+                     month's last day, so 31 means month end in February)
+    - "weekly":      every `interval` weeks from `start`
+    - "nth_weekday": the `nth` `weekday` (0 = Monday) of the month, nth = -1
+                     for the last one; months without a 5th one are skipped
+    - "month_end":   last day of every `interval`-th month
+
+    Occurrences are never stored: expand() computes those in (done, until]
+    for a chunk of rules at a time, vectorized across rules, and
+    materialize() hands them to the fund as one batch and then moves the
+    `done` markers, so an occurrence is never recorded twice.
+    """
+
+    COLUMNS = {
+        "action": np.int8,
+        "amount": np.float64,
+        "kind": np.int8,
+        "start": "datetime64[D]",
+        "end": "datetime64[D]",
+        "interval": np.int64,
+        "day": np.int64,        # monthly: day of month
+        "weekday": np.int64,    # nth_weekday
+        "nth": np.int64,        # nth_weekday: 1..5 or -1
+        "done": "datetime64[D]",
+    }
+
+    def __init__(self):
+        self._n = 0
+        self._cols = {name: np.empty(16, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.descriptions = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def column(self, name):
+        return self._cols[name][:self._n]
+
+    def add(self, action, amount, description='', kind="monthly", start=None, end=None, interval=1,
+            day=None, weekday=None, nth=None):
+        """Add a rule; returns its id. start defaults to today, end to never.
+
+        day / weekday / nth default to those of `start` (e.g. a monthly rule
+        starting on the 15th runs on the 15th).
+        """
+        if action not in ACTION_CODES:
+            raise ValueError(f"Unknown action {action!r}, expected one of {ACTIONS}.")
+        if kind not in KIND_CODES:
+            raise ValueError(f"Unknown schedule {kind!r}, expected one of {KINDS}.")
+        amount = float(amount)
+        if amount < 0:
+            raise ValueError("Amount must be non-negative.")
+        if int(interval) < 1:
+            raise ValueError("interval must be at least 1.")
+        start = to_day(start)
+        end = MAX_DAY if end is None else to_day(end)
+        first = start.astype("datetime64[M]").astype("datetime64[D]")
+        day = int((start - first).astype(np.int64)) + 1 if day is None else int(day)
+        weekday = int(day_of_week(start)) if weekday is None else int(weekday)
+        nth = (day - 1) // 7 + 1 if nth is None else int(nth)
+        if not 1 <= day <= 31 or not 0 <= weekday <= 6 or nth not in (1, 2, 3, 4, 5, -1):
+            raise ValueError("day must be 1..31, weekday 0..6 and nth 1..5 or -1.")
+
+        if self._n == len(self._cols["amount"]):
+            for name, old in self._cols.items():
+                grown = np.empty(2 * len(old), dtype=old.dtype)
+                grown[:self._n] = old[:self._n]
+                self._cols[name] = grown
+        i = self._n
+        row = {"action": ACTION_CODES[action], "amount": amount, "kind": KIND_CODES[kind], "start": start,
+               "end": end, "interval": interval, "day": day, "weekday": weekday, "nth": nth,
+               "done": start - 1}
+        for name, value in row.items():
+            self._cols[name][i] = value
+        self.descriptions.append(str(description))
+        self._n = i + 1
+        return i
+
+    def cancel(self, rule_id, after=None):
+        """Stop a rule: no occurrences after `after` (default: what is materialized)."""
+        end = self._cols["done"][rule_id] if after is None else to_day(after)
+        self._cols["end"][rule_id] = min(self._cols["end"][rule_id], end)
+
+    # ----- expansion -----
+    def _occurrences(self, rules, lo, hi):
+        """(rule ids, dates) of the occurrences of `rules` in [lo, hi] (per-rule day bounds).
+
+        Everything per occurrence is int64 arithmetic: weekly rules step in
+        days from their start, the other kinds look their day up in a small
+        (rule code x month) table of the months involved, so datetime64 is
+        never converted per element.
+        """
+        kind = self.column("kind")[rules]
+        interval = self.column("interval")[rules]
+        start = self.column("start")[rules]
+        lo_day, hi_day = lo.view(np.int64), hi.view(np.int64)
+        weekly = kind == KIND_CODES["weekly"]
+        out_rules, out_dates = [], []
+
+        # ----- weekly: start + 7 * interval * k -----
+        w = np.flatnonzero(weekly & (hi >= lo))
+        if len(w):
+            step, origin = 7 * interval[w], start[w].view(np.int64)
+            k_lo = np.maximum(0, -((origin - lo_day[w]) // step))   # ceil((lo - origin) / step)
+            counts = np.maximum(0, (hi_day[w] - origin) // step - k_lo + 1)
+            at = np.repeat(np.arange(len(w)), counts)
+            dates = origin[at] + step[at] * (k_lo[at] + _ranges(counts))
+            out_rules.append(rules[w][at])
+            out_dates.append(dates)
+
+        # ----- month kinds: every interval-th month from the start month -----
+        m = np.flatnonzero(~weekly & (hi >= lo))
+        if len(m):
+            step = interval[m]
+            origin = start[m].astype("datetime64[M]").view(np.int64)
+            lo_month = lo[m].astype("datetime64[M]").view(np.int64)
+            hi_month = hi[m].astype("datetime64[M]").view(np.int64)
+            k_lo = np.maximum(0, -((origin - lo_month) // step))
+            counts = np.maximum(0, (hi_month - origin) // step - k_lo + 1)
+            if counts.any():
+                m0, m1 = int(lo_month.min()), int(hi_month.max())
+                table = _month_table(m0, m1)
+                code = _month_code(kind[m], self.column("day")[rules][m],
+                                   self.column("weekday")[rules][m], self.column("nth")[rules][m])
+                at = np.repeat(np.arange(len(m)), counts)
+                month = origin[at] + step[at] * (k_lo[at] + _ranges(counts))
+                dates = table[code[at] * (m1 - m0 + 1) + (month - m0)]
+                keep = (dates >= lo_day[m][at]) & (dates <= hi_day[m][at])
+                out_rules.append(rules[m][at[keep]])
+                out_dates.append(dates[keep])
+
+        if not out_rules:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[D]")
+        return np.concatenate(out_rules), np.concatenate(out_dates).view("datetime64[D]")
+
+    def expand(self, until):
+        """Generator of (rule ids, dates): occurrences after each rule's
+        `done` marker up to `until` (and the rule's end), CHUNK_RULES rules
+        at a time. Nothing is recorded."""
+        until = to_day(until)
+        for lo in range(0, self._n, CHUNK_RULES):
+            rules = np.arange(lo, min(lo + CHUNK_RULES, self._n))
+            first = np.maximum(self.column("done")[rules] + 1, self.column("start")[rules])
+            last = np.minimum(self.column("end")[rules], until)
+            yield self._occurrences(rules, first, last)
+
+    def pending(self, until):
+        """All occurrences not yet materialized up to `until`, in date order
+        (same-day occurrences in rule order): (rule ids, dates)."""
+        parts = list(self.expand(until))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[D]")
+        rules = np.concatenate([p[0] for p in parts])
+        dates = np.concatenate([p[1] for p in parts])
+        order = np.lexsort((rules, dates))
+        return rules[order], dates[order]
+
+    def materialize(self, apply_batch, until=None):
+        """Record every occurrence up to `until` (default today) with one
+        apply_batch(actions, amounts, descriptions, dates) call, then move
+        the markers. Returns apply_batch's result (None if nothing was due)."""
+        until = to_day(until)
+        with self._lock:
+            rules, dates = self.pending(until)
+            ok = None
+            if len(rules):
+                ok = apply_batch(np.array(ACTIONS, dtype=object)[self.column("action")[rules]],
+                                 self.column("amount")[rules],
+                                 [self.descriptions[i] for i in rules.tolist()],
+                                 dates)
+            done = self.column("done")
+            done[:] = np.maximum(done, np.minimum(self.column("end"), until))
+        return ok
@@ -0,0 +1,119 @@
+import numpy as np
+
+from .ledger import ACTION_CODES, STATUS_CODES
+
+WINDOWS = (7, 30, 90)       # burn-rate windows, days
+DESCRIPTION_WINDOW = 30     # days behind the per-description moving average
+RUNWAY_WINDOW = 30          # burn-rate window the runway is computed from
+
+
+class RollingMetrics:
+    """Sliding-window expense totals of a Ledger, cheap to read at any time.
+
+    The window end is the latest day seen (a transaction date, or a later
+    day passed to advance()). Kept per window:
+
+    - a ring of daily expense totals for the last max(windows) days
+    - the running total of each window (7 / 30 / 90 days)
+    - per description, the running total of the last DESCRIPTION_WINDOW
+      days, with a ring of per-day {description: total} to take days out
+
+    A new expense adds to the ring and to the windows it falls in; moving
+    the end one day forward takes the leaving day out of every window.
+    Each row and each day goes in and out once: O(1) amortized per row,
+    and a read only looks at the window totals. Back-dated rows inside the
+    windows are counted, older ones can no longer be in any window.
+
+    Amounts are integer units. refresh() folds the rows appended to a
+    Ledger since the last call (same lazy pattern as the other indexes).
+    """
+
+    def __init__(self, windows=WINDOWS, description_window=DESCRIPTION_WINDOW):
+        self.windows = tuple(windows)
+        self.description_window = description_window
+        self.span = max(max(self.windows), description_window)
+        self._seen = 0
+        self.end = None                             # day number of the window end
+        self._day = [0] * self.span                 # expense of day d at d % span
+        self._sums = dict.fromkeys(self.windows, 0)
+        self._day_desc = [{} for _ in range(description_window)]   # {description: expense} of day d
+        self.by_description = {}                    # description -> expense in the description window
+
+    # ----- sliding -----
+    def advance(self, day):
+        """Move the window end forward to `day` (int day number)."""
+        if self.end is None:
+            self.end = day
+            return
+        if day <= self.end:
+            return
+        if day - self.end >= self.span:
+            # gap longer than every window: everything falls out
+            self._day = [0] * self.span
+            self._sums = dict.fromkeys(self.windows, 0)
+            self._day_desc = [{} for _ in range(self.description_window)]
+            self.by_description = {}
+            self.end = day
+            return
+        span, dw = self.span, self.description_window
+        for d in range(self.end + 1, day + 1):
+            for w in self.windows:
+                self._sums[w] -= self._day[(d - w) % span]   # day d - w leaves window w
+            self._day[d % span] = 0                          # day d - span leaves the ring
+            leaving = self._day_desc[d % dw]                 # day d - description_window
+            for text, total in leaving.items():
+                left = self.by_description[text] - total
+                if left:
+                    self.by_description[text] = left
+                else:
+                    del self.by_description[text]
+            leaving.clear()
+        self.end = day
+
+    def add(self, day, text, units):
+        """Count an expense of `units` on `day` (int day number)."""
+        self.advance(day)
+        age = self.end - day
+        if age >= self.span:
+            return
+        self._day[day % self.span] += units
+        for w in self.windows:
+            if age < w:
+                self._sums[w] += units
+        if age < self.description_window:
+            slot = self._day_desc[day % self.description_window]
+            slot[text] = slot.get(text, 0) + units
+            self.by_description[text] = self.by_description.get(text, 0) + units
+
+    # ----- keeping up with a ledger -----
+    def fold(self, ledger, lo, hi):
+        """Count the succeeded expenses among ledger rows [lo, hi) (a Ledger
+        or a MappedLedger, e.g. an archive segment)."""
+        if lo == hi:
+            return
+        days = ledger.column("date")[lo:hi].view(np.int64)
+        self.advance(int(days.max()))
+        keep = ((ledger.column("action")[lo:hi] == ACTION_CODES["sub"])
+                & (ledger.column("status")[lo:hi] == STATUS_CODES["succeeded"])
+                & (days > self.end - self.span))
+        if not keep.any():
+            return
+        desc = ledger.column("desc")[lo:hi][keep].astype(np.int64)
+        # one add() per (day, description) of the batch
+        pairs, inverse = np.unique(np.stack((days[keep], desc)), axis=1, return_inverse=True)
+        totals = np.zeros(pairs.shape[1], dtype=np.int64)
+        np.add.at(totals, inverse.ravel(), ledger.column("amount")[lo:hi][keep])
+        texts = ledger.descriptions
+        for day, desc_id, units in zip(pairs[0].tolist(), pairs[1].tolist(), totals.tolist()):
+            self.add(day, texts[desc_id], units)
+
+    def refresh(self, ledger):
+        """Fold the rows appended to `ledger` since the last call."""
+        lo, hi = self._seen, len(ledger)
+        self.fold(ledger, lo, hi)
+        self._seen = hi
+
+    # ----- reads -----
+    def total(self, window):
+        """Expense (units) of the last `window` days, window in self.windows."""
+        return self._sums[window]
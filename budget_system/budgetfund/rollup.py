@@ -0,0 +1,131 @@
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+from .ledger import ACTION_CODES, STATUS_CODES
+
+
+def month_key(day):
+    """Integer month number (months since 1970-01) of a datetime64 value."""
+    return int(np.datetime64(day, "M").astype(np.int64))
+
+
+class MonthBucket:
+    """Running totals of one calendar month (amounts in integer units)."""
+
+    __slots__ = ("income", "expense", "succeeded", "failed", "expense_by_desc")
+
+    def __init__(self):
+        self.income = 0
+        self.expense = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.expense_by_desc = {}    # desc id -> expense total (units)
+
+    @property
+    def count(self):
+        return self.succeeded + self.failed
+
+    def update(self, action, amount, desc, status):
+        """Fold rows of this month (column arrays, ledger order) into the totals."""
+        ok = status == STATUS_CODES["succeeded"]
+        is_add = action == ACTION_CODES["add"]
+        n_ok = int(ok.sum())
+        self.succeeded += n_ok
+        self.failed += len(ok) - n_ok
+        if n_ok == 0:
+            return
+
+        add_ok = ok & is_add
+        sub_ok = ok & ~is_add
+        self.income += int(amount[add_ok].sum())
+        self.expense += int(amount[sub_ok].sum())
+
+        ids, inverse = np.unique(desc[sub_ok], return_inverse=True)
+        sums = np.zeros(len(ids), dtype=np.int64)
+        np.add.at(sums, inverse, amount[sub_ok])
+        for desc_id, total in zip(ids.tolist(), sums.tolist()):
+            self.expense_by_desc[desc_id] = self.expense_by_desc.get(desc_id, 0) + total
+
+
+class MonthlyRollup:
+    """Per-month aggregates of a Ledger, kept up to date incrementally.
+
+    New ledger rows are folded into their month bucket by refresh(), so a
+    summary over a month range only combines a handful of buckets instead
+    of filtering, sorting and grouping the whole log.
+    """
+
+    def __init__(self):
+        self._seen = 0
+        self._buckets = {}    # month key -> MonthBucket
+        self._months = []     # sorted month keys
+
+    def refresh(self, ledger):
+        """Fold the rows appended to `ledger` since the last call."""
+        lo, hi = self._seen, len(ledger)
+        if lo == hi:
+            return
+        cols = {name: ledger.column(name)[lo:hi] for name in ("action", "amount", "desc", "status")}
+        months = ledger.column("date")[lo:hi].astype("datetime64[M]").astype(np.int64)
+
+        order = np.argsort(months, kind="stable")
+        keys, starts = np.unique(months[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for key, a, b in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+            rows = order[a:b]
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = MonthBucket()
+                insort(self._months, key)
+            bucket.update(**{name: col[rows] for name, col in cols.items()})
+        self._seen = hi
+
+    def items(self, start_key=None, end_key=None):
+        """(month key, bucket) of the non-empty months start_key..end_key
+        (inclusive, None = open-ended), in month order."""
+        a = 0 if start_key is None else bisect_left(self._months, start_key)
+        b = len(self._months) if end_key is None else bisect_right(self._months, end_key)
+        return [(key, self._buckets[key]) for key in self._months[a:b]]
+
+    def buckets(self, start_key, end_key):
+        """Non-empty buckets for months start_key..end_key (inclusive), in month order."""
+        return [bucket for _, bucket in self.items(start_key, end_key)]
+
+    def summarize(self, start_key, end_key):
+        """Combine the buckets of a month range.
+
+        Returns None when the range has no rows at all, otherwise a dict with
+        row counts, income, expense and the expense total per description id
+        (all in integer units).
+        (Opening / closing balances come from budgetfund's running balances.)
+        """
+        buckets = self.buckets(start_key, end_key)
+        if not buckets:
+            return None
+        done = [b for b in buckets if b.succeeded]
+        expense_by_desc = {}
+        for b in done:
+            for desc_id, total in b.expense_by_desc.items():
+                expense_by_desc[desc_id] = expense_by_desc.get(desc_id, 0) + total
+        return {
+            "succeeded": sum(b.succeeded for b in buckets),
+            "failed": sum(b.failed for b in buckets),
+            "income": sum(b.income for b in done),
+            "expense": sum(b.expense for b in done),
+            "expense_by_desc": expense_by_desc,
+        }
+
+
+def merge_totals(a, b):
+    """Add up two summarize()-style dicts (expense_by_desc keyed the same way)."""
+    expense_by_desc = dict(a["expense_by_desc"])
+    for key, total in b["expense_by_desc"].items():
+        expense_by_desc[key] = expense_by_desc.get(key, 0) + total
+    return {
+        "succeeded": a["succeeded"] + b["succeeded"],
+        "failed": a["failed"] + b["failed"],
+        "income": a["income"] + b["income"],
+        "expense": a["expense"] + b["expense"],
+        "expense_by_desc": expense_by_desc,
+    }
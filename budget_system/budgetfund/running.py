@@ -0,0 +1,170 @@
+import numpy as np
+
+from .date_index import signed_amounts
+
+
+def _segment_cumsum(keys, values):
+    """Running sum of `values` restarted wherever `keys` changes (keys grouped)."""
+    total = np.cumsum(values)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    before = total[starts] - values[starts]
+    return total - np.repeat(before, np.diff(np.append(starts, len(keys))))
+
+
+def date_order_balances(opening, dates, delta):
+    """Balance right after each row when the rows are replayed in date
+    order (same-day rows in the order given), starting from `opening`."""
+    order = np.argsort(dates, kind="stable")
+    out = np.empty(len(delta), dtype=np.int64)
+    out[order] = opening + np.cumsum(delta[order])
+    return out
+
+
+class RunningBalance:
+    """Balance changes of a Ledger in date order, with O(log D) updates.
+
+    All sums are int64 units, so they are exact whatever the update order.
+
+    A Fenwick tree over day slots (D = days between the first and last
+    transaction date) holds each day's total balance change, so
+
+    - the change up to the end of any day is one prefix sum, O(log D)
+    - a new row, back-dated or not, is one point update, O(log D)
+
+    The balance right after a row (date-order running balance) is the
+    prefix up to the day before it plus the changes of the same-day rows
+    entered up to and including it. That last part is kept per row
+    (`within`) and only built when a caller asks for row balances.
+
+    Days outside the slot range grow it (doubling, rebuild in O(D)), and a
+    large batch rebuilds the tree in O(D) instead of many point updates.
+    """
+
+    def __init__(self):
+        self._seen = 0          # rows folded into the day totals / tree
+        self._base = 0          # day number of slot 0
+        self._day = np.zeros(0, dtype=np.int64)        # slot -> total change that day
+        self._tree = np.zeros(1, dtype=np.int64)       # Fenwick tree, 1-based
+        self._within_n = 0      # rows with a `within` value
+        self._within = np.empty(64, dtype=np.int64)
+        self._wday = np.zeros(0, dtype=np.int64)       # day totals of rows [0, _within_n)
+
+    # ----- Fenwick tree -----
+    def _build(self):
+        """Rebuild the tree from the day totals, O(D)."""
+        size = len(self._day)
+        prefix = np.concatenate(([0], np.cumsum(self._day)))
+        i = np.arange(1, size + 1)
+        self._tree = np.concatenate(([0], prefix[i] - prefix[i - (i & -i)]))
+
+    def _update(self, slots, values):
+        """Add values to the tree at slots, O(k log D)."""
+        size = len(self._day)
+        i = slots + 1
+        while len(i):
+            np.add.at(self._tree, i, values)
+            i = i + (i & -i)
+            keep = i <= size
+            i, values = i[keep], values[keep]
+
+    def _prefix(self, slots):
+        """Sum of the day totals of slots 0..slots (inclusive, may be out of range)."""
+        if np.ndim(slots) == 0:
+            # single query (balance_at): plain loop, no array overhead
+            i, total, tree = min(max(int(slots) + 1, 0), len(self._day)), 0, self._tree
+            while i:
+                total += int(tree[i])
+                i -= i & -i
+            return np.int64(total)
+        i = np.clip(np.asarray(slots, dtype=np.int64) + 1, 0, len(self._day))
+        out = np.zeros(i.shape, dtype=np.int64)
+        while i.any():
+            out += self._tree[i]
+            i = i - (i & -i)
+        return out
+
+    def _cover(self, first, last):
+        """Grow the slot range to include days first..last."""
+        size = len(self._day)
+        if size and self._base <= first and last < self._base + size:
+            return
+        lo = first if not size else min(first, self._base)
+        hi = last if not size else max(last, self._base + size - 1)
+        new_size = max(64, 2 * size, hi - lo + 1)
+        # leave the spare room on the side that grew
+        base = hi - new_size + 1 if size and first < self._base else lo
+        day = np.zeros(new_size, dtype=np.int64)
+        wday = np.zeros(new_size, dtype=np.int64)
+        at = self._base - base
+        day[at:at + size] = self._day
+        wday[at:at + size] = self._wday
+        self._base, self._day, self._wday = base, day, wday
+        self._build()
+
+    def _slots(self, dates):
+        return dates.astype(np.int64) - self._base
+
+    # ----- keeping up with the ledger -----
+    def refresh(self, ledger):
+        """Fold the rows appended to `ledger` since the last call into the tree."""
+        lo, hi = self._seen, len(ledger)
+        if lo == hi:
+            return
+        days = ledger.column("date")[lo:hi].astype(np.int64)
+        delta = signed_amounts(ledger.column("action")[lo:hi],
+                               ledger.column("amount")[lo:hi],
+                               ledger.column("status")[lo:hi])
+        self._cover(int(days.min()), int(days.max()))
+        if hi - lo == 1:
+            # single add/sub: one point update
+            slot, value, tree, size = int(days[0]) - self._base, int(delta[0]), self._tree, len(self._day)
+            self._day[slot] += value
+            i = slot + 1
+            while i <= size:
+                tree[i] += value
+                i += i & -i
+            self._seen = hi
+            return
+        slots, inverse = np.unique(days - self._base, return_inverse=True)
+        sums = np.zeros(len(slots), dtype=np.int64)
+        np.add.at(sums, inverse, delta)
+        self._day[slots] += sums
+        if len(slots) * np.log2(len(self._day)) > len(self._day):
+            self._build()
+        else:
+            self._update(slots, sums)
+        self._seen = hi
+
+    def _refresh_within(self, ledger):
+        """Extend the per-row same-day running totals to every ledger row."""
+        self.refresh(ledger)
+        lo, hi = self._within_n, len(ledger)
+        if lo == hi:
+            return
+        slots = self._slots(ledger.column("date")[lo:hi])
+        delta = signed_amounts(ledger.column("action")[lo:hi],
+                               ledger.column("amount")[lo:hi],
+                               ledger.column("status")[lo:hi])
+        order = np.argsort(slots, kind="stable")
+        within = np.empty(hi - lo, dtype=np.int64)
+        within[order] = self._wday[slots[order]] + _segment_cumsum(slots[order], delta[order])
+        np.add.at(self._wday, slots, delta)
+
+        if hi > len(self._within):
+            grown = np.empty(max(64, 2 * hi), dtype=np.int64)
+            grown[:lo] = self._within[:lo]
+            self._within = grown
+        self._within[lo:hi] = within
+        self._within_n = hi
+
+    # ----- queries -----
+    def through(self, days):
+        """Total balance change of all rows dated on or before each of `days`."""
+        return self._prefix(self._slots(np.asarray(days, dtype="datetime64[D]")))
+
+    def after_rows(self, ledger, rows):
+        """Total balance change right after each of the given ledger rows, in
+        date order (rows on the same day in the order they were entered)."""
+        self._refresh_within(ledger)
+        slots = self._slots(ledger.column("date")[rows])
+        return self._prefix(slots - 1) + self._within[:self._within_n][rows]
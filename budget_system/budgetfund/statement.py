@@ -0,0 +1,124 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 100_000        # statement rows per apply_batch call
+OFX_BLOCK = 1 << 20         # characters read from an OFX file at a time
+
+# column name in the file for each field; "action" is optional (sign of amount)
+DEFAULT_COLUMNS = {"date": "date", "amount": "amount", "description": "description", "action": "action"}
+
+# bank wording -> add / sub (compared lower-case)
+ACTION_ALIASES = {
+    "add": "add", "credit": "add", "deposit": "add", "income": "add", "cr": "add",
+    "sub": "sub", "debit": "sub", "withdrawal": "sub", "payment": "sub", "expense": "sub", "dr": "sub",
+}
+
+
+def to_batch(frame, date_format=None):
+    """Convert one chunk with date / amount / description (/ action) columns
+    into apply_batch arguments: (actions, amounts, descriptions, dates).
+
+    Everything is column-wise: amounts may carry currency signs and
+    thousands separators, "(12.50)" means -12.50; without an action column
+    a negative amount is a sub and a positive one an add. Amounts are
+    returned non-negative. A chunk with a blank / unparseable amount or
+    date is rejected with a ValueError naming the first such row (rows
+    counted from 0 after the header).
+    """
+    amount = frame["amount"]
+    if amount.dtype.kind not in "iuf":
+        text = amount.astype(str).str.strip()
+        negative = text.str.startswith("(") & text.str.endswith(")")
+        amount = pd.to_numeric(text.str.replace(r"[^0-9.\-]", "", regex=True))
+        amount = amount.where(~negative, -amount)
+    amount = amount.to_numpy(dtype=np.float64)
+    bad = np.flatnonzero(~np.isfinite(amount))
+    if len(bad):
+        raise ValueError(f"Missing or invalid amount in statement row {frame.index[bad[0]]}.")
+
+    if "action" in frame:
+        actions = frame["action"].astype(str).str.strip().str.lower().map(ACTION_ALIASES)
+        unknown = actions.isna()
+        if unknown.any():
+            raise ValueError(f"Unknown action {frame['action'][unknown].iloc[0]!r} in statement.")
+        actions = actions.to_numpy(dtype=object)
+    else:
+        actions = np.where(amount < 0, "sub", "add").astype(object)
+
+    dates = pd.to_datetime(frame["date"], format=date_format).to_numpy().astype("datetime64[D]")
+    bad = np.flatnonzero(np.isnat(dates))
+    if len(bad):
+        raise ValueError(f"Missing date in statement row {frame.index[bad[0]]}.")
+    descriptions = frame["description"].fillna("").astype(str).to_numpy(dtype=object) \
+        if "description" in frame else np.full(len(frame), "", dtype=object)
+    return actions, np.abs(amount), descriptions, dates
+
+
+def csv_chunks(path, columns=None, chunk_rows=CHUNK_ROWS, **read_csv_args):
+    """Generator of statement chunks (DataFrames with the field names as
+    columns) read from a CSV file `chunk_rows` rows at a time.
+
+    columns maps field -> column name in the file (see DEFAULT_COLUMNS);
+    only those columns are parsed. Extra keyword arguments go to
+    pandas.read_csv (sep, encoding, skiprows, ...).
+    """
+    mapping = dict(DEFAULT_COLUMNS if columns is None else columns)
+    header = pd.read_csv(path, nrows=0, **read_csv_args).columns
+    mapping = {field: name for field, name in mapping.items() if name in header}
+    missing = {"date", "amount"} - set(mapping)
+    if missing:
+        raise ValueError(f"Statement has no column for {sorted(missing)}, map it with columns=.")
+    rename = {name: field for field, name in mapping.items()}
+    dtype = {mapping[f]: str for f in ("description", "action") if f in mapping}
+    for chunk in pd.read_csv(path, usecols=list(rename), dtype=dtype, chunksize=chunk_rows, **read_csv_args):
+        yield chunk.rename(columns=rename)
+
+
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+_OFX_START = re.compile(r"<STMTTRN>", re.I)
+_OFX_FIELD = re.compile(r"<(TRNTYPE|DTPOSTED|TRNAMT|NAME|MEMO)>([^<\r\n]*)", re.I)
+
+
+def ofx_chunks(path, chunk_rows=CHUNK_ROWS, encoding="latin-1"):
+    """Generator of statement chunks read from an OFX / QFX file.
+
+    The file is read OFX_BLOCK characters at a time and every complete
+    <STMTTRN> block is taken out of the buffer, so memory stays flat.
+    Fields: DTPOSTED (date), TRNAMT (signed amount), NAME (else MEMO).
+    """
+    rows = {"date": [], "amount": [], "description": []}
+    buffer = ""
+    with open(path, encoding=encoding) as f:
+        while True:
+            block = f.read(OFX_BLOCK)
+            buffer += block
+            end = 0
+            for match in _OFX_TRANSACTION.finditer(buffer):
+                fields = {k.upper(): v.strip() for k, v in _OFX_FIELD.findall(match.group(1))}
+                rows["date"].append(fields.get("DTPOSTED", "")[:8])
+                rows["amount"].append(fields.get("TRNAMT", ""))
+                rows["description"].append(fields.get("NAME") or fields.get("MEMO", ""))
+                end = match.end()
+                if len(rows["date"]) >= chunk_rows:
+                    yield pd.DataFrame(rows)
+                    rows = {name: [] for name in rows}
+            # 只留下还没读完的那笔交易 (或可能被截断的开始标签)
+            start = _OFX_START.search(buffer, end)
+            buffer = buffer[start.start():] if start else buffer[-len("<STMTTRN>"):]
+            if not block:
+                break
+    if rows["date"]:
+        yield pd.DataFrame(rows)
+
+
+def statement_chunks(path, columns=None, chunk_rows=CHUNK_ROWS, date_format=None, **read_csv_args):
+    """Generator of apply_batch arguments, one tuple per chunk of `path`
+    (.ofx / .qfx files as OFX, anything else as CSV)."""
+    if str(path).lower().endswith((".ofx", ".qfx")):
+        chunks, date_format = ofx_chunks(path, chunk_rows), "%Y%m%d"
+    else:
+        chunks = csv_chunks(path, columns, chunk_rows, **read_csv_args)
+    for chunk in chunks:
+        yield to_batch(chunk, date_format)
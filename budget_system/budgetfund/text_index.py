@@ -0,0 +1,84 @@
+import numpy as np
+
+GRAM = 3    # n-gram length of the description index
+
+
+def grams(text):
+    """Set of the GRAM-character substrings of `text`."""
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class DescriptionIndex:
+    """Inverted index from description text to ledger positions.
+
+    Two levels, both kept in step with a Ledger by refresh():
+
+    - n-grams -> description ids: every GRAM-character substring of each
+      (lower-cased) dictionary entry. A substring query intersects the
+      posting lists of its n-grams and checks the few candidates left.
+    - description id -> ledger positions, in ledger order.
+
+    So a search looks at posting lists only, never at the rows of the
+    ledger, and its cost grows with the number of matches.
+    """
+
+    def __init__(self):
+        self._seen = 0          # ledger rows indexed
+        self._lowered = []      # desc id -> lower-cased text
+        self._grams = {}        # n-gram -> list of desc ids (ascending)
+        self._rows = {}         # desc id -> list of position arrays (ledger order)
+
+    def refresh(self, ledger):
+        """Index descriptions and rows added to `ledger` since the last call."""
+        for desc_id in range(len(self._lowered), len(ledger.descriptions)):
+            text = ledger.descriptions[desc_id].lower()
+            self._lowered.append(text)
+            for gram in grams(text):
+                self._grams.setdefault(gram, []).append(desc_id)
+
+        lo, hi = self._seen, len(ledger)
+        if lo == hi:
+            return
+        desc = ledger.column("desc")[lo:hi]
+        if hi - lo == 1:
+            self._rows.setdefault(int(desc[0]), []).append(np.array([lo], dtype=np.int64))
+        else:
+            order = np.argsort(desc, kind="stable")
+            ids, starts = np.unique(desc[order], return_index=True)
+            for desc_id, rows in zip(ids.tolist(), np.split(order + lo, starts[1:])):
+                self._rows.setdefault(desc_id, []).append(rows)
+        self._seen = hi
+
+    def matching_ids(self, keyword):
+        """Description ids whose text contains `keyword` (case-insensitive)."""
+        keyword = keyword.lower()
+        if len(keyword) < GRAM:
+            # too short for the n-gram lists: check the dictionary itself
+            return [i for i, text in enumerate(self._lowered) if keyword in text]
+        postings = []
+        for gram in grams(keyword):
+            ids = self._grams.get(gram)
+            if ids is None:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return sorted(i for i in candidates if keyword in self._lowered[i])
+
+    def positions(self, desc_id):
+        """Ledger positions of one description id, ascending."""
+        chunks = self._rows.get(desc_id)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    def search(self, keyword):
+        """Ledger positions (ascending) of rows whose description contains `keyword`."""
+        found = [self.positions(desc_id) for desc_id in self.matching_ids(keyword)]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        if len(found) == 1:
+            return found[0].copy()
+        return np.sort(np.concatenate(found))
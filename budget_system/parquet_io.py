@@ -0,0 +1,163 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .budgetfund.date_index import month_start
+from .budgetfund.ledger import ACTIONS, STATUSES, month_labels
+
+LEDGER_COLUMNS = ["action", "amount", "description", "balance", "status", "date"]
+ASSET_COLUMNS = ["Asset ID", "Name", "Type", "Owner", "Value", "Date Acquired", "Last Updated"]
+
+
+def _arrow():
+    """pyarrow and pyarrow.dataset, imported on first use (optional dependency)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        print("[ERROR] Parquet export / import needs pyarrow: pip install pyarrow")
+        raise
+    return pa, ds
+
+
+def _partitioning(pa, ds):
+    # 显式的分区类型: 住户名 "2024" 也按字符串读回, 不会被推断成整数
+    schema = pa.schema([("household", pa.string()), ("year_month", pa.string())])
+    return ds.partitioning(schema, flavor="hive")
+
+
+def _household_filter(ds, household):
+    return None if household is None else ds.field("household") == str(household)
+
+
+def _replace_household(pa, ds, root, household, tables):
+    """Write `tables` (iterable of pyarrow Tables) as the household's data,
+    after removing the files it had under `root`."""
+    if os.path.isdir(root):
+        old = ds.dataset(root, format="parquet", partitioning=_partitioning(pa, ds))
+        for fragment in old.get_fragments(filter=_household_filter(ds, household)):
+            os.remove(fragment.path)
+    rows = 0
+    for i, table in enumerate(tables):
+        ds.write_dataset(table, root, format="parquet", partitioning=_partitioning(pa, ds),
+                         basename_template=f"part-{i}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+        rows += table.num_rows
+    return rows
+
+
+def _scan(root, columns, filters):
+    """Read the matching rows / columns of a partitioned dataset; filters on
+    household / year_month only open the matching partition directories."""
+    pa, ds = _arrow()
+    dataset = ds.dataset(root, format="parquet", partitioning=_partitioning(pa, ds))
+    expression = None
+    for f in filters:
+        if f is not None:
+            expression = f if expression is None else expression & f
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+# ---------- budgetfund logs ----------
+def export_ledger(fund, root, household=None):
+    """Write a fund's whole log (archived months included) as Parquet under
+    `root`, partitioned by household and year_month:
+
+        root/household=<name>/year_month=YYYY-MM/part-*.parquet
+
+    household defaults to the fund's household_name; that household's
+    previous export is replaced. Columns: position (the get_df index) plus
+    the get_df columns, with dates stored as days. One month frame is
+    converted at a time. Returns the number of rows written.
+    """
+    pa, ds = _arrow()
+    household = str(fund.household_name if household is None else household)
+
+    def tables():
+        for frame in fund.month_frames():
+            yield pa.table({
+                "position": pa.array(frame.index.to_numpy(dtype=np.int64)),
+                "action": pa.array(frame["action"].astype(str).to_numpy(dtype=object), pa.string()),
+                "amount": pa.array(frame["amount"].to_numpy()),
+                "description": pa.array(frame["description"].to_numpy(dtype=object), pa.string()),
+                "balance": pa.array(frame["balance"].to_numpy()),
+                "status": pa.array(frame["status"].astype(str).to_numpy(dtype=object), pa.string()),
+                "date": pa.array(frame["date"].to_numpy().astype("datetime64[D]")),
+                "household": pa.array([household] * len(frame), pa.string()),
+                "year_month": pa.array(frame["year_month"].to_numpy(dtype=object), pa.string()),
+            })
+
+    return _replace_household(pa, ds, root, household, tables())
+
+
+def read_ledger(root, household=None, start=None, end=None, status=None, action=None, columns=None):
+    """Read an export_ledger dataset back as a get_df-compatible DataFrame.
+
+    start / end: "YYYY-MM" or "YYYY-MM-DD", whole months like get_df.
+    household, start and end select partition directories, so other months
+    and households are never opened; status / action ("succeeded" /
+    "failed", "add" / "sub") are pushed down to the Parquet reader, and
+    only `columns` (default: all get_df columns) are read.
+
+    Index: the rows' get_df positions, in order (per household). The
+    `household` column is kept when several households are read.
+    """
+    _, ds = _arrow()
+    wanted = LEDGER_COLUMNS if columns is None else [c for c in LEDGER_COLUMNS if c in columns]
+    read = ["position"] + wanted + ["year_month"] + (["household"] if household is None else [])
+    first = None if start is None else month_labels(np.array([month_start(start)], dtype="datetime64[M]"))[0]
+    last = None if end is None else month_labels(np.array([month_start(end)], dtype="datetime64[M]"))[0]
+    df = _scan(root, read, [
+        _household_filter(ds, household),
+        None if first is None else ds.field("year_month") >= first,
+        None if last is None else ds.field("year_month") <= last,
+        None if status is None else ds.field("status") == status,
+        None if action is None else ds.field("action") == action,
+    ])
+    df = df.sort_values(["household", "position"] if household is None else "position", kind="stable")
+    df.index = pd.Index(df.pop("position").to_numpy())
+    if "action" in df:
+        df["action"] = pd.Categorical(df["action"], categories=ACTIONS)
+    if "status" in df:
+        df["status"] = pd.Categorical(df["status"], categories=STATUSES)
+    if "date" in df:
+        df["date"] = df["date"].astype("datetime64[s]")
+    df["year_month"] = df["year_month"].astype(str)
+    return df
+
+
+# ---------- PropertyRegistry ----------
+def export_assets(registry, root, household):
+    """Write a PropertyRegistry as Parquet under `root`, partitioned by
+    household and the year_month of each asset's acquisition date (the
+    household's previous export is replaced). Returns the number of assets."""
+    pa, ds = _arrow()
+    household = str(household)
+    frame = registry.to_dataframe()
+    if frame.empty:
+        frame = pd.DataFrame(columns=ASSET_COLUMNS)
+    table = pa.table({
+        **{name: pa.array(frame[name].to_numpy(dtype=object), pa.string())
+           for name in ASSET_COLUMNS if name != "Value"},
+        "Value": pa.array(frame["Value"].to_numpy(dtype=np.float64)),
+        "household": pa.array([household] * len(frame), pa.string()),
+        "year_month": pa.array([str(d)[:7] for d in frame["Date Acquired"]], pa.string()),
+    })
+    return _replace_household(pa, ds, root, household, [table] if len(frame) else [])
+
+
+def read_assets(root, household=None, asset_type=None, owner=None, columns=None):
+    """Read an export_assets dataset back in PropertyRegistry.to_dataframe form
+    (with Value_Display). household selects partition directories;
+    asset_type / owner are pushed down to the reader."""
+    _, ds = _arrow()
+    wanted = ASSET_COLUMNS if columns is None else [c for c in ASSET_COLUMNS if c in columns]
+    df = _scan(root, wanted + (["household"] if household is None else []), [
+        _household_filter(ds, household),
+        None if asset_type is None else ds.field("Type") == asset_type,
+        None if owner is None else ds.field("Owner") == owner,
+    ])
+    if "Value" in df and not df.empty:
+        df["Value_Display"] = df["Value"].map(lambda x: f"${x:,.2f}" if pd.notna(x) else "")
+    return df.reset_index(drop=True)
@@ -1,7 +1,6 @@
 import pandas as pd
 from typing import Dict, Union
 from .asset import PropertyRegistry
-import matplotlib.pyplot as plt
 
 
 def summarize_total_value(registry: PropertyRegistry) -> Dict[str, Union[float, pd.DataFrame]]:
@@ -123,6 +122,8 @@ def get_visualization_data(registry: PropertyRegistry, group_by: str = "Type") -
         print("No aggregated data to visualize.")
         return result
 
+    import matplotlib.pyplot as plt   # only needed when something is drawn
+
     fig, axes = plt.subplots(1, 2, figsize=(10, 5))
 
     # left: table
@@ -1,9 +1,19 @@
+import importlib.util
+import io
+import os
+import tempfile
 import unittest
+from contextlib import redirect_stdout
 from unittest.mock import patch
 
+import numpy as np
+
 import budget_system.budget_system as bs
 from budget_system.budget_system import BudgetSystem
 from budget_system.member.member_type import guardian, dependant
+from budget_system.parquet_io import read_ledger, read_assets
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
 
 
 class TestBudgetSystemModule(unittest.TestCase):
@@ -83,6 +93,60 @@ class TestBudgetSystemModule(unittest.TestCase):
         # visualize just to hit path
         self.system.visualize("2025-01")
 
+        # data-only summary (no plotting)
+        self.system.add_fund(10, "Gift", date="2025-01-03")
+        summary = self.system.summarize_month("2025-01", plot=False)
+        self.assertEqual(summary["income"], 10.0)
+        self.assertEqual(self.system.visualize("2025-01", plot=False), summary)
+
+    def test_recurring_fund_rules(self):
+        self.system.add_recurring_fund("sub", 100, "Rent", start="2025-01-01")
+        self.assertEqual(self.system.materialize_recurring("2025-06-30"), 6)
+        self.assertEqual(self.system.materialize_recurring("2025-06-30"), 0)
+        self.assertEqual(len(self.system.get_df("2025-01", "2025-06")), 6)
+
+    def test_forecast_known_cash_flow_is_exact(self):
+        self.system.add_member(guardian("Alice", "G1", "1980-01-01", 1000, "Engineer"))
+        self.system.add_recurring_fund("sub", 1500, "Rent", start="2026-01-01")
+        result = self.system.forecast(months=4, n_paths=500, start="2025-12-15", seed=1)
+
+        self.assertEqual(result["months"], ["2026-01", "2026-02", "2026-03", "2026-04"])
+        for band in result["percentiles"].values():   # no expense history: every path is the same
+            self.assertEqual(band.tolist(), [500.0, 0.0, -500.0, -1000.0])
+        self.assertEqual(result["p_below_zero"], 1.0)
+        self.assertEqual(result["p_below_zero_by_month"].tolist(), [0.0, 0.0, 1.0, 1.0])
+
+        with self.assertRaises(ValueError):
+            self.system.forecast(months=0)
+
+    def test_forecast_samples_expense_history(self):
+        self.system.add_member(guardian("Alice", "G1", "1980-01-01", 2000, "Engineer"))
+        for month, (food, fuel) in enumerate([(300, 50), (500, 150), (400, 100), (600, 0)], start=1):
+            self.system.add_fund(2000, "Salary", date=f"2025-0{month}-01")
+            self.system.sub_fund(food, "Food", date=f"2025-0{month}-10")
+            if fuel:
+                self.system.sub_fund(fuel, "Fuel", date=f"2025-0{month}-20")
+
+        history = self.system.fund.expense_history("2025-01", "2025-05")
+        self.assertEqual(history.columns.tolist(), ["Food", "Fuel"])
+        self.assertEqual(history["Fuel"].tolist(), [50.0, 150.0, 100.0, 0.0, 0.0])
+
+        result = self.system.forecast(months=6, n_paths=4000, history_months=4, start="2025-05-01", seed=7)
+        bands = [result["percentiles"][p] for p in (5, 25, 50, 75, 95)]
+        for lower, upper in zip(bands, bands[1:]):
+            self.assertTrue((lower <= upper).all())
+        # monthly expense is 300..750, income 2000: the fund only grows
+        start = self.system.fund.get()
+        self.assertTrue((bands[0] >= start + 1250 * (1 + np.arange(6)) - 1e-6).all())
+        self.assertTrue((bands[-1] <= start + 1700 * (1 + np.arange(6)) + 1e-6).all())
+        self.assertEqual(result["p_below_zero"], 0.0)
+
+        # splitting the paths across processes gives the same result for a seed
+        pooled = self.system.forecast(months=6, n_paths=4000, history_months=4, start="2025-05-01",
+                                      seed=7, workers=2)
+        for p in result["percentiles"]:
+            self.assertTrue(np.array_equal(result["percentiles"][p], pooled["percentiles"][p]))
+
     # ========= Core logic: upgrade_member =========
 
     def test_upgrade_member_not_found_and_already_guardian(self):
@@ -279,6 +343,17 @@ class TestBudgetSystemModule(unittest.TestCase):
             "Snacks",
             "2025-01-02",
             "",
+            # 1. Add Fund with blank date (today) and with a bad date
+            "1",
+            "10",
+            "Gift",
+            "",
+            "",
+            "1",
+            "10",
+            "Typo",
+            "2025-13-01",
+            "",
             # 3. back
             "3",
         ]
@@ -288,7 +363,8 @@ class TestBudgetSystemModule(unittest.TestCase):
             bs.fund_editor(self.system)
 
         df = self.system.get_df()
-        self.assertGreaterEqual(len(df), 2)
+        self.assertEqual(len(df), 3)
+        self.assertNotIn("Typo", list(df["description"]))
 
     # ========= CLI: log_viewer =========
 
@@ -324,6 +400,23 @@ class TestBudgetSystemModule(unittest.TestCase):
              patch("budget_system.budget_system.input", side_effect=inputs):
             bs.log_viewer(self.system)
 
+    def test_log_viewer_pages_through_results(self):
+        # 120 rows -> 3 pages of 50
+        self.system.fund.apply_batch(["add"] * 120, [10] * 120, None, ["2025-01-01"] * 120)
+
+        inputs = ["1", "", "", "n", "n", "n", "p", "x", "", "5"]
+        with patch("budget_system.budget_system.clear_screen"), \
+             patch("budget_system.budget_system.time.sleep"), \
+             patch("budget_system.budget_system.input", side_effect=inputs), \
+             patch("budget_system.budgetfund.fund_utils.display") as mock_display, \
+             redirect_stdout(io.StringIO()) as out:
+            bs.log_viewer(self.system)
+
+        # first page + two "n" + one "p"; the third "n" and "x" are rejected
+        self.assertEqual(mock_display.call_count, 4)
+        self.assertEqual(out.getvalue().count("No such page."), 2)
+        self.assertIn("(page 3/3)", out.getvalue())
+
     # ========= CLI: property_editor =========
 
     def _prepare_member_and_asset(self):
@@ -430,3 +523,108 @@ class TestBudgetSystemModule(unittest.TestCase):
              patch("budget_system.budget_system.time.sleep"), \
              patch("budget_system.budget_system.input", side_effect=inputs):
             bs.property_editor(self.system)
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_export_parquet_round_trip_with_filters(self):
+        self.system.add_fund(500, "Salary", date="2025-01-05")
+        self.system.sub_fund(200, "Food", date="2025-01-20")
+        with redirect_stdout(io.StringIO()):
+            self.system.sub_fund(5000, "Car", date="2025-02-03")     # failed
+        self.system.sub_fund(100, "Food", date="2025-03-01")
+        with redirect_stdout(io.StringIO()):
+            self.system.property_registry.add_asset(bs.Asset("House", "Real Estate", 300000, "Ann", "2020-05-01"))
+            self.system.property_registry.add_asset(bs.Asset("Car", "Vehicle", 20000, "Ben", "2023-01-10"))
+
+        with tempfile.TemporaryDirectory() as root:
+            counts = self.system.export_parquet(root)
+            self.assertEqual(counts, {"ledger": 4, "assets": 2})
+            ledger = os.path.join(root, "ledger")
+            (household_dir,) = os.listdir(ledger)          # household=Test%20Family
+            self.assertEqual(sorted(os.listdir(os.path.join(ledger, household_dir))),
+                             ["year_month=2025-01", "year_month=2025-02", "year_month=2025-03"])
+
+            back = read_ledger(ledger, "Test Family")
+            expected = self.system.get_df()
+            self.assertEqual(back.index.tolist(), expected.index.tolist())
+            self.assertEqual(list(back.columns), list(expected.columns))
+            self.assertEqual(back["amount"].tolist(), expected["amount"].tolist())
+            self.assertEqual(back["balance"].tolist(), expected["balance"].tolist())
+            self.assertTrue((back["date"] == expected["date"]).all())
+
+            failed = read_ledger(ledger, "Test Family", start="2025-02", end="2025-03", status="failed")
+            self.assertEqual(failed["description"].tolist(), ["Car"])
+            self.assertEqual(failed.index.tolist(), [2])
+            only = read_ledger(ledger, "Test Family", start="2025-03", columns=["amount"])
+            self.assertEqual(list(only.columns), ["amount", "year_month"])
+
+            assets = read_assets(os.path.join(root, "assets"), "Test Family", asset_type="Vehicle")
+            self.assertEqual(assets["Name"].tolist(), ["Car"])
+            self.assertEqual(assets["Value_Display"].tolist(), ["$20,000.00"])
+
+            # a second export replaces the household's data
+            self.system.property_registry.delete_asset(assets["Asset ID"][0])
+            self.system.export_parquet(root)
+            self.assertEqual(read_assets(os.path.join(root, "assets"))["Name"].tolist(), ["House"])
+
+    def test_import_statement_csv_in_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "statement.csv")
+            with open(path, "w") as f:
+                f.write("Posted,Type,Amount,Payee,Balance\n"
+                        "01/03/2025,CREDIT,\"$1,200.00\",Salary,1\n"
+                        "02/03/2025,debit,45.10,Groceries,1\n"
+                        "03/03/2025,Debit,(5000.00),Car,1\n"
+                        "04/03/2025,DEBIT,$10,,1\n"
+                        "05/03/2025,deposit,3.5,Refund,1\n")
+            reports = []
+            with redirect_stdout(io.StringIO()) as out:
+                report = self.system.import_statement(
+                    path, columns={"date": "Posted", "action": "Type", "amount": "Amount", "description": "Payee"},
+                    chunk_rows=2, progress=reports.append, date_format="%d/%m/%Y")
+            self.assertIn("rows/sec", out.getvalue())
+            self.assertEqual((report["rows"], report["succeeded"], report["failed"], report["chunks"]), (5, 4, 1, 3))
+            self.assertEqual([r["rows"] for r in reports], [2, 4, 5])
+            self.assertGreater(report["rows_per_sec"], 0)
+
+            df = self.system.get_df()
+            self.assertEqual(df["amount"].tolist(), [1200.0, 45.1, 5000.0, 10.0, 3.5])
+            self.assertEqual(df["status"].tolist().count("failed"), 1)     # the car: not enough funds
+            self.assertEqual(df["date"].dt.strftime("%Y-%m-%d").tolist()[0], "2025-03-01")
+            self.assertAlmostEqual(self.system.fund.get(), 1000 + 1200 - 45.1 - 10 + 3.5)
+
+            with open(path, "w") as f:
+                f.write("when,what\n2025-01-01,1\n")
+            with redirect_stdout(io.StringIO()), self.assertRaises(ValueError):
+                self.system.import_statement(path)
+
+    def test_import_statement_rejects_blank_amount_or_date(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "statement.csv")
+            with open(path, "w") as f:
+                f.write("date,amount,description\n2025-01-01,-5,a\n2025-01-02,,b\n2025-01-03,7,c\n")
+            with redirect_stdout(io.StringIO()), self.assertRaisesRegex(ValueError, "amount in statement row 1"):
+                self.system.import_statement(path)
+            with open(path, "w") as f:
+                f.write("date,amount,description\n2025-01-01,-5,a\n,3,b\n")
+            with redirect_stdout(io.StringIO()), self.assertRaisesRegex(ValueError, "date in statement row 1"):
+                self.system.import_statement(path)
+        self.assertEqual(len(self.system.get_df()), 0)
+        self.assertEqual(self.system.fund.get(), 1000)
+
+    def test_import_statement_ofx(self):
+        ofx = ("OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+               "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250105120000<TRNAMT>-25.40<NAME>Coffee Shop</STMTTRN>\n"
+               "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250110<TRNAMT>300.00<MEMO>Transfer in</STMTTRN>\n"
+               "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "statement.ofx")
+            with open(path, "w") as f:
+                f.write(ofx)
+            with redirect_stdout(io.StringIO()), patch("budget_system.budgetfund.statement.OFX_BLOCK", 16):
+                report = self.system.import_statement(path)     # tiny blocks: transactions span reads
+        self.assertEqual(report["rows"], 2)
+        df = self.system.get_df()
+        self.assertEqual(df["action"].tolist(), ["sub", "add"])
+        self.assertEqual(df["description"].tolist(), ["Coffee Shop", "Transfer in"])
+        self.assertEqual(df["date"].dt.strftime("%Y-%m-%d").tolist(), ["2025-01-05", "2025-01-10"])
+        self.assertAlmostEqual(self.system.fund.get(), 1000 - 25.4 + 300)
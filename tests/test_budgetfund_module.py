@@ -1,8 +1,25 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import threading
 import unittest
+from contextlib import redirect_stdout
+from datetime import date
 from unittest.mock import patch
 
+import numpy as np
+import pandas as pd
+
 from budget_system.budgetfund.budgetfund import budgetfund
+from budget_system.budgetfund.fund_plot import render_summary
+from budget_system.budgetfund.journal import Journal
+from budget_system.budgetfund.async_fund import AsyncFund
+from budget_system.budgetfund.anomaly import AnomalyDetector, QuantileSketch
+from budget_system.budgetfund.code_index import intersect
 from budget_system.budgetfund.fund_utils import (
+    LogResult,
     print_log,
     search_log,
     filter_status,
@@ -64,6 +81,548 @@ class TestBudgetFundModule(unittest.TestCase):
         self.assertEqual(len(df), 1)
         self.assertEqual(df.iloc[0]["status"], "failed")
 
+    def test_get_log_keeps_record_shape(self):
+        self.fund.add(200, "Salary", date="2025-01-05")
+        self.fund.sub(5000, "Big Purchase", date="2025-01-06")  # failed
+
+        title, records = self.fund.get_log()
+        self.assertEqual(title, budgetfund.log_title)
+        self.assertEqual(records[0], ["add", 200.0, "Salary", 1200.0, "succeeded", "2025-01-05"])
+        self.assertEqual(records[1], ["sub", 5000.0, "Big Purchase", 1200.0, "failed", "2025-01-06"])
+
+    def test_columnar_storage_dtypes(self):
+        # many rows force the column arrays to grow
+        for i in range(200):
+            self.fund.add(1, "Salary" if i % 2 else "Gift", date="2025-01-05")
+
+        df = self.fund.get_df()
+        self.assertEqual(len(df), 200)
+        self.assertEqual(df["amount"].dtype.kind, "f")
+        self.assertEqual(df["date"].dtype.kind, "M")
+        self.assertEqual(set(df["action"]), {"add"})
+        self.assertEqual(set(df["description"]), {"Salary", "Gift"})
+        self.assertEqual(df.iloc[-1]["balance"], 1200.0)
+
+    # ========= apply_batch =========
+
+    def test_apply_batch_matches_add_sub_loop(self):
+        actions = ["add", "sub", "sub", "sub", "add", "sub"]
+        amounts = [200, 700, 600, 500, 50, 49.5]
+        descriptions = ["Salary", "Rent", "TV", "Car", "Gift", "Food"]
+        dates = ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-04", "2025-01-05", "2025-01-06"]
+
+        loop_fund = budgetfund(opening_balance=1000)
+        for act, amt, desc, day in zip(actions, amounts, descriptions, dates):
+            if act == "add":
+                loop_fund.add(amt, desc, day)
+            else:
+                loop_fund.sub(amt, desc, day)
+
+        ok = self.fund.apply_batch(actions, amounts, descriptions, dates)
+        # 1200 - 700 = 500: TV (600) fails, Car (500) still fits exactly
+        self.assertEqual(ok.tolist(), [True, True, False, True, True, True])
+        self.assertEqual(self.fund.get(), loop_fund.get())
+        self.assertEqual(self.fund.get_log(), loop_fund.get_log())
+
+    def test_apply_batch_random_parity(self):
+        # long enough to switch between the vectorized and row-by-row paths
+        rng = np.random.default_rng(7)
+        n = 5000
+        actions = np.where(rng.random(n) < 0.35, "add", "sub")
+        amounts = np.round(rng.random(n) * 100, 2)
+
+        loop_fund = budgetfund(opening_balance=1000)
+        with redirect_stdout(io.StringIO()):
+            for act, amt in zip(actions, amounts):
+                if act == "add":
+                    loop_fund.add(amt, date="2025-01-01")
+                else:
+                    loop_fund.sub(amt, date="2025-01-01")
+            ok = self.fund.apply_batch(actions, amounts, dates=["2025-01-01"] * n)
+
+        loop_df = loop_fund.get_df()
+        self.assertFalse(ok.all())
+        self.assertEqual(ok.tolist(), (loop_df["status"] == "succeeded").tolist())
+        self.assertEqual(self.fund.get_df()["balance"].tolist(), loop_df["balance"].tolist())
+
+    def test_apply_batch_defaults_and_errors(self):
+        ok = self.fund.apply_batch(["add", "sub"], [10, 20])
+        self.assertTrue(ok.all())
+        self.assertEqual(self.fund.get(), 990.0)
+        df = self.fund.get_df()
+        self.assertEqual(list(df["description"]), ["", ""])
+
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["add", "withdraw"], [1, 2])
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["add"], [1, 2])
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["sub"], [-1])
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["add"], [float("nan")])
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["add", "sub"], [1, float("inf")])
+        # rejected batches leave the fund untouched
+        self.assertEqual(self.fund.get(), 990.0)
+        self.assertEqual(len(self.fund.get_df()), 2)
+
+    # ========= journal =========
+
+    def test_journal_replay_restores_ledger(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fund.bfj")
+            fund = budgetfund(1000, "Journaled", journal=Journal(path, fsync="always"))
+            fund.add(200, "Salary", date="2025-01-05")
+            fund.sub(5000, "Big Purchase", date="2025-01-06")   # failed
+            fund.apply_batch(["sub", "add"], [50, 10], ["Food", "Gift"], ["2025-01-07", "2025-01-08"])
+            fund.close()
+
+            # the opening balance comes from the journal, not the argument
+            restored = budgetfund(0, "Journaled", journal=path)
+            self.assertEqual(restored.opening_balance, 1000.0)
+            self.assertEqual(restored.get(), 1160.0)
+            self.assertEqual(restored.get_log(), fund.get_log())
+
+            # keeps appending after replay
+            restored.sub(60, "Food", date="2025-01-09")
+            restored.close()
+            again = budgetfund(0, journal=Journal(path, fsync="os"))
+            self.assertEqual(again.get(), 1100.0)
+            self.assertEqual(len(again.get_df()), 5)
+            again.close()
+
+    def test_journal_truncates_torn_tail(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fund.bfj")
+            fund = budgetfund(1000, journal=Journal(path, fsync="group", group_ms=1))
+            fund.add(200, "Salary", date="2025-01-05")
+            fund.sub(100, "Rent", date="2025-01-06")
+            fund.close()
+            good_size = os.path.getsize(path)
+
+            # a crash in the middle of the next write leaves half a frame
+            with open(path, "ab") as f:
+                f.write(b"T\x1a\x00\x00\x00\xde\xad")
+
+            with redirect_stdout(io.StringIO()):
+                restored = budgetfund(0, journal=path)
+            self.assertEqual(os.path.getsize(path), good_size)
+            self.assertEqual(restored.get(), 1100.0)
+            restored.add(1, "Gift", date="2025-01-07")
+            restored.close()
+            self.assertEqual(budgetfund(0, journal=path).get(), 1101.0)
+
+        with self.assertRaises(ValueError):
+            Journal("unused.bfj", fsync="sometimes")
+
+    def test_group_journal_frames_noted_rows_at_commit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fund.bfj")
+            journal = Journal(path, fsync="group", group_ms=60_000)    # no commit during the test
+            fund = budgetfund(1000, journal=journal)
+            header = os.path.getsize(path)
+            for i in range(50):
+                fund.add(1, f"Tip {i % 3}", date="2025-01-05")
+            fund.apply_batch(["sub", "sub"], [5, 5], ["Rent", "Food"], ["2025-01-06", "2025-01-07"])
+            self.assertEqual(os.path.getsize(path), header)     # only noted so far
+
+            journal.sync()
+            _, _, descriptions, rows = Journal(path).recover()
+            self.assertEqual(len(rows), 52)
+            self.assertEqual(descriptions[:5], ["Tip 0", "Tip 1", "Tip 2", "Rent", "Food"])
+            fund.add(3, "Gift", date="2025-01-08")
+            fund.close()
+            self.assertEqual(budgetfund(0, journal=path).get(), 1043.0)
+
+    # ========= integer cents =========
+
+    def test_amounts_are_exact_integer_cents(self):
+        fund = budgetfund(0)
+        fund.add(0.1, "a")
+        fund.add(0.2, "b")
+        self.assertTrue(fund.validate(0.3))
+        self.assertTrue(fund.sub(0.3, "c"))
+        self.assertEqual(fund.get(), 0.0)
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(fund.sub(0.01, "one cent too many"))
+
+        # a million cents add up exactly, in the batch and in the reports
+        fund.apply_batch(["add"] * 1_000_000, np.full(1_000_000, 0.01), dates=["2025-01-01"] * 1_000_000)
+        self.assertEqual(fund.get(), 10000.0)
+        self.assertEqual(fund.balance_at("2025-01-01"), 10000.0)
+        self.assertEqual(fund.summary("2025-01")["income"], 10000.0)
+
+    def test_custom_scale_round_trips_through_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mills.bfj")
+            fund = budgetfund(1, journal=Journal(path, fsync="os"), scale=1000)
+            fund.add(0.001, "Mill", date="2025-01-01")
+            fund.add(0.0004, "Rounded away", date="2025-01-01")
+            self.assertEqual(fund.get(), 1.001)
+            fund.close()
+
+            restored = budgetfund(0, journal=path)       # scale comes from the journal
+            self.assertEqual(restored.get(), 1.001)
+            self.assertEqual(restored.get_df()["amount"].tolist(), [0.001, 0.0])
+
+    # ========= thread-safe mode =========
+
+    def test_thread_safe_concurrent_writers_never_overdraw(self):
+        fund = budgetfund(500, "Shared", thread_safe=True)
+        n_threads, per_thread = 8, 400
+        errors = []
+
+        def writer(seed):
+            rng = np.random.default_rng(seed)
+            try:
+                for i in range(per_thread):
+                    amount = float(rng.integers(1, 40))
+                    if i % 50 == 0:
+                        fund.apply_batch(["sub", "add", "sub"], [amount, 5.0, amount])
+                    elif rng.random() < 0.2:
+                        fund.add(amount, f"in {seed}")
+                    else:
+                        fund.sub(amount, f"out {seed}")
+            except Exception as e:   # pragma: no cover - reported below
+                errors.append(e)
+
+        def reader(stop):
+            try:
+                while not stop.is_set():
+                    fund.get_df()
+                    fund.balance_at("2100-01-01")
+                    fund.select(status="failed")
+            except Exception as e:   # pragma: no cover - reported below
+                errors.append(e)
+
+        old_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)   # switch threads as often as possible
+        stop = threading.Event()
+        try:
+            with redirect_stdout(io.StringIO()):
+                readers = [threading.Thread(target=reader, args=(stop,)) for _ in range(2)]
+                writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(n_threads)]
+                for t in readers + writers:
+                    t.start()
+                for t in writers:
+                    t.join()
+                stop.set()
+                for t in readers:
+                    t.join()
+        finally:
+            sys.setswitchinterval(old_interval)
+
+        self.assertEqual(errors, [])
+        df = fund.get_df()
+        self.assertEqual(len(df), n_threads * (per_thread + 2 * (per_thread // 50)))
+
+        # every logged balance follows from the row before it (one linear order)
+        balance = np.asarray(fund._budgetfund__log.column("balance")) / 100    # stored in cents
+        ok = (df["status"] == "succeeded").to_numpy()
+        delta = np.where(df["action"] == "add", df["amount"], -df["amount"]) * ok
+        np.testing.assert_allclose(balance, 500 + np.cumsum(delta))
+        self.assertTrue((balance >= 0).all())
+        failed_subs = (~ok) & (df["action"] == "sub").to_numpy()
+        prev = np.concatenate(([500.0], balance[:-1]))
+        self.assertTrue((df["amount"].to_numpy()[failed_subs] > prev[failed_subs]).all())
+        self.assertEqual(fund.get(), balance[-1])
+
+    # ========= memory-mapped ledger file =========
+
+    def test_ledger_file_save_and_open(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fund.bfl")
+            fund = budgetfund(1000, "Saved")
+            fund.add(200, "Salary", date="2025-01-05")
+            fund.sub(5000, "Big Purchase", date="2025-01-06")   # failed
+            fund.apply_batch(["sub", "add"], [50, 10], ["Food", 'say "hi"\n'], ["2025-02-07", "2025-03-08"])
+            fund.save(path)
+
+            opened = budgetfund.open(path, "Saved")
+            self.assertEqual(opened.opening_balance, 1000.0)
+            self.assertEqual(opened.get(), fund.get())
+            self.assertEqual(opened.get_log(), fund.get_log())
+
+            # range queries read the mapped rows; ledger columns are views of the file
+            feb = opened.get_df("2025-02", "2025-02")
+            self.assertEqual(feb["description"].tolist(), ["Food"])
+            ledger = opened._budgetfund__log
+            self.assertTrue(np.shares_memory(ledger.column("amount"), ledger.pack()))
+            self.assertEqual(opened.balance_at("2025-02-28"), 1150.0)
+
+            # appends grow the file; close() records them for the next open
+            for i in range(100):
+                opened.sub(1, f"Snack {i % 3}", date="2025-04-01")
+            opened.add(5, "Refund", date="2025-01-31")   # back-dated
+            opened.close()
+
+            again = budgetfund.open(path)
+            self.assertEqual(len(again.get_df()), 105)
+            self.assertEqual(again.get(), 1065.0)
+            self.assertEqual(len(again.get_df("2025-01", "2025-01")), 3)
+            self.assertEqual(again.balance_at("2025-02-28"), 1155.0)
+            again.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bad.bfl")
+            with open(path, "wb") as f:
+                f.write(b"not a ledger")
+            with self.assertRaises(ValueError):
+                budgetfund.open(path)
+
+    def test_ledger_file_reopens_with_journal_and_saves_in_place(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path, journal = os.path.join(tmp, "fund.bfl"), os.path.join(tmp, "fund.bfj")
+            fund = budgetfund(100, "Saved")
+            fund.add(1, "Gift", date="2025-01-01")
+            fund.save(path)
+
+            opened = budgetfund.open(path, journal=journal)
+            opened.add(2, "Refund", date="2025-01-02")
+            opened.close()
+            again = budgetfund.open(path, journal=journal)     # the +2 is not replayed twice
+            self.assertEqual(again.get_df()["amount"].tolist(), [1.0, 2.0])
+            self.assertEqual(again.get(), 103.0)
+
+            # a crash before close(): the file header misses the row, the journal has it
+            again.add(3, "Cash", date="2025-01-03")
+            again._budgetfund__journal.close()
+            recovered = budgetfund.open(path, journal=journal)
+            self.assertEqual(recovered.get_df()["description"].tolist(), ["Gift", "Refund", "Cash"])
+            self.assertEqual(recovered.get(), 106.0)
+            recovered.close()
+            self.assertEqual(budgetfund(0, journal=journal).get(), 106.0)    # the journal holds everything
+
+            # saving over the mapped file swaps a new file in instead of truncating it
+            mapped = budgetfund.open(path)
+            mapped.add(4, "Tip", date="2025-01-04")
+            mapped.save(path)
+            mapped.add(5, "Bonus", date="2025-01-05")
+            self.assertEqual(mapped.get(), 115.0)
+            mapped.close()
+            self.assertEqual(len(budgetfund.open(path).get_df()), 5)
+
+    # ========= hot / cold tiering =========
+
+    def _fill_six_months(self, fund):
+        for m in range(1, 7):
+            fund.add(50, f"Salary {m}", date=f"2025-0{m}-05")
+            fund.sub(30, f"Food {m}", date=f"2025-0{m}-20")
+        fund.sub(10, "Late bill", date="2025-02-01")   # back-dated
+
+    def test_archive_keeps_queries_over_whole_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            plain = budgetfund(100, "Plain")
+            fund = budgetfund(100, "Tiered", archive=os.path.join(tmp, "archive"))
+            for f in (plain, fund):
+                self._fill_six_months(f)
+
+            self.assertEqual(fund.archive("2025-04"), 7)
+            self.assertEqual(len(fund._budgetfund__log), 6)   # only Apr-Jun stay in memory
+            self.assertTrue(os.path.exists(os.path.join(tmp, "archive", "2025-02.bfl")))
+
+            def by_description(df):
+                return df.sort_values("description").reset_index(drop=True)
+
+            self.assertTrue(by_description(fund.get_df()).equals(by_description(plain.get_df())))
+            self.assertTrue(by_description(fund.get_df("2025-03", "2025-04")).equals(
+                by_description(plain.get_df("2025-03", "2025-04"))))
+            for period in (("2025-01", "2025-06"), ("2025-02", "2025-02"), ("2025-03", "2025-05")):
+                self.assertEqual(fund.summary(*period), plain.summary(*period))
+            for day in ("2024-12-31", "2025-02-10", "2025-03-31", "2025-05-01"):
+                self.assertEqual(fund.balance_at(day), plain.balance_at(day))
+            self.assertEqual(fund.get_rows(fund.find("food"))["description"].tolist(),
+                             [f"Food {m}" for m in range(1, 7)])
+            self.assertEqual(len(fund.select(action="sub", start="2025-02", end="2025-04")), 4)
+            self.assertEqual(len(fund.get_log()[1]), 13)
+
+            # closed months are final, later months still take writes
+            with self.assertRaises(ValueError):
+                fund.add(1, "Too late", date="2025-03-31")
+            with self.assertRaises(ValueError):
+                fund.apply_batch(["add"], [1], dates=["2025-01-01"])
+            self.assertTrue(fund.add(1, "On time", date="2025-04-01"))
+            self.assertEqual(fund.archive("2025-02"), 0)
+
+        with self.assertRaises(ValueError):
+            budgetfund(100).archive("2025-01")
+
+    def test_archive_reopens_with_journal_and_ledger_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive, journal = os.path.join(tmp, "archive"), os.path.join(tmp, "fund.journal")
+            fund = budgetfund(100, "Tiered", journal=journal, archive=archive)
+            self._fill_six_months(fund)
+            summary = fund.summary("2025-01", "2025-06")
+            fund.close()
+            with open(journal, "rb") as f:
+                before_compaction = f.read()
+
+            fund = budgetfund(0, "Tiered", journal=journal, archive=archive)
+            fund.archive("2025-04")
+            fund.close()
+            self.assertLess(os.path.getsize(journal), len(before_compaction))
+
+            reopened = budgetfund(0, "Tiered", journal=journal, archive=archive)
+            self.assertEqual(reopened.opening_balance, 100.0)
+            self.assertEqual(reopened.get(), 210.0)
+            self.assertEqual(reopened.summary("2025-01", "2025-06"), summary)
+            reopened.close()
+
+            # crash between writing the archive and compacting the journal:
+            # the already archived rows are skipped on replay
+            with open(journal, "wb") as f:
+                f.write(before_compaction)
+            recovered = budgetfund(0, "Tiered", journal=journal, archive=archive)
+            self.assertEqual(len(recovered._budgetfund__log), 6)
+            self.assertEqual(recovered.get(), 210.0)
+            self.assertEqual(recovered.summary("2025-01", "2025-06"), summary)
+
+            path = os.path.join(tmp, "hot.bfl")
+            recovered.save(path)
+            recovered.close()
+            opened = budgetfund.open(path, archive=archive)
+            self.assertEqual(opened.archive("2025-06"), 4)
+            opened.close()
+            again = budgetfund.open(path, archive=archive)
+            self.assertEqual(len(again._budgetfund__log), 2)
+            self.assertEqual(len(again.get_df()), 13)
+            self.assertEqual(again.balance_series("2025-01", "2025-06", freq="M")[1].tolist(),
+                             [120.0, 130.0, 150.0, 170.0, 190.0, 210.0])
+            again.close()
+
+    # ========= recurring transactions =========
+
+    def test_recurring_rules_expand_and_materialize_once(self):
+        fund = budgetfund(1000, "Recurring")
+        rent = fund.add_recurring("sub", 800, "Rent", start="2025-01-31")          # 31st, clamped
+        fund.add_recurring("add", 3000, "Salary", every="month_end", start="2025-01-01")
+        fund.add_recurring("sub", 10, "Gym", every="weekly", start="2025-01-06", interval=2)
+        fund.add_recurring("sub", 5, "Club", every="nth_weekday", start="2025-01-01", weekday=1, nth=5)
+        fund.add_recurring("sub", 20, "Book club", every="nth_weekday", start="2025-01-01",
+                           weekday=4, nth=-1, end="2025-02-28")
+
+        preview = fund.upcoming("2025-03-31")
+        self.assertEqual(len(fund.get_df()), 0)          # nothing recorded yet
+        by_rule = preview.groupby("description")["date"].apply(lambda d: [str(x.date()) for x in d])
+        self.assertEqual(by_rule["Rent"], ["2025-01-31", "2025-02-28", "2025-03-31"])
+        self.assertEqual(by_rule["Gym"], ["2025-01-06", "2025-01-20", "2025-02-03", "2025-02-17",
+                                          "2025-03-03", "2025-03-17", "2025-03-31"])
+        self.assertEqual(by_rule["Book club"], ["2025-01-31", "2025-02-28"])
+        self.assertNotIn("Club", by_rule)                # no 5th Tuesday before April
+        self.assertTrue(preview["date"].is_monotonic_increasing)
+
+        self.assertEqual(fund.materialize_recurring("2025-03-31"), len(preview))
+        self.assertEqual(fund.materialize_recurring("2025-03-31"), 0)   # never twice
+        fund.recurring.cancel(rent)
+        self.assertEqual(fund.materialize_recurring("2025-04-30"), 4)   # salary, 2 x gym, club
+        df = fund.get_df()
+        self.assertEqual(df["description"].value_counts()["Rent"], 3)
+        self.assertEqual(df[df["description"] == "Club"]["date"].dt.strftime("%Y-%m-%d").tolist(),
+                         ["2025-04-29"])
+
+        with self.assertRaises(ValueError):
+            fund.add_recurring("sub", 1, "Bad", every="yearly")
+
+    def test_rolling_metrics_slide_with_new_transactions(self):
+        fund = budgetfund(1000, "Rolling")
+        fund.sub(70, "Food", date="2025-03-01")
+        fund.sub(300, "Rent", date="2025-03-20")
+        fund.sub(14, "Food", date="2025-03-25")
+        fund.sub(1000, "Car", date="2025-03-26")     # fails: not counted
+        fund.add(500, "Salary", date="2025-03-26")
+
+        m = fund.rolling_metrics()
+        self.assertEqual(m["as_of"], "2025-03-26")
+        self.assertAlmostEqual(m["burn_rate"][7], 314 / 7)
+        self.assertAlmostEqual(m["burn_rate"][30], 384 / 30)
+        self.assertEqual(m["expense_by_description"], {"Food": 84 / 30, "Rent": 10.0})
+        self.assertAlmostEqual(m["runway_days"], fund.get() / (384 / 30))
+
+        fund.sub(30, "Food", date="2025-03-10")      # back-dated, inside the windows
+        m = fund.rolling_metrics(as_of="2025-04-05")
+        self.assertAlmostEqual(m["burn_rate"][7], 0.0)
+        self.assertAlmostEqual(m["burn_rate"][30], 344 / 30)   # 03-01 left the 30-day window
+        self.assertAlmostEqual(m["burn_rate"][90], 414 / 90)
+        self.assertAlmostEqual(m["expense_by_description"]["Food"], 44 / 30)
+        with self.assertRaises(ValueError):
+            fund.rolling_metrics(as_of="2025-03-30")
+
+        self.assertEqual(budgetfund(100).rolling_metrics()["runway_days"], float("inf"))
+
+    def test_anomaly_detector_flags_unusual_expenses(self):
+        fund = budgetfund(100000, "Anomaly", detector=AnomalyDetector(min_count=5))
+        for amount in (40, 42, 38, 41, 39, 40):
+            fund.sub(amount, "Food", date="2025-01-05")
+        fund.sub(300, "Food", date="2025-01-06")        # flagged
+        fund.sub(300, "Car", date="2025-01-06")         # no history yet: not flagged
+        fund.sub(500000, "Food", date="2025-01-07")     # failed: never observed
+        ok = fund.apply_batch(["sub", "add", "sub"], [41, 900, 5000], ["Food", "Food", "Food"],
+                              ["2025-02-01"] * 3)
+        self.assertTrue(ok.all())
+
+        flagged = fund.anomalies()
+        self.assertEqual(flagged["amount"].tolist(), [300.0, 5000.0])
+        self.assertEqual(flagged["position"].tolist(), [6, 11])
+        self.assertEqual(fund.get_rows(flagged["position"].to_numpy())["amount"].tolist(), [300.0, 5000.0])
+        self.assertAlmostEqual(flagged["mean"][0], 40.0)
+        self.assertGreater(flagged["z"][0], 3)
+        self.assertEqual(len(fund.anomalies(start="2025-02-01")), 1)
+        self.assertEqual(len(fund.anomalies(description="Car")), 0)
+        self.assertEqual(fund.detector.stats("Food")["count"], 9)
+
+        with self.assertRaises(ValueError):
+            budgetfund(100).anomalies()
+
+    def test_anomaly_detector_with_series_batch(self):
+        # a later statement chunk: descriptions as a Series not indexed from 0
+        fund = budgetfund(100, detector=AnomalyDetector())
+        ok = fund.apply_batch(pd.Series(["sub", "sub"], index=[5, 6]), pd.Series([2.0, 3.0], index=[5, 6]),
+                              pd.Series(["Food", None], index=[5, 6]), ["2025-01-05"] * 2)
+        self.assertTrue(ok.all())
+        self.assertEqual(fund.get(), 95.0)
+        self.assertEqual(fund.detector.stats("Food")["count"], 1)
+        self.assertEqual(fund.detector.stats("")["count"], 1)     # same text as the ledger row
+
+    def test_quantile_sketch_tracks_quantile(self):
+        values = np.random.default_rng(3).exponential(10, 20000)
+        sketch = QuantileSketch(0.9)
+        for x in values.tolist():
+            sketch.add(x)
+        self.assertAlmostEqual(sketch.value(), np.quantile(values, 0.9), delta=0.5)
+        self.assertEqual(len(sketch.q), 5)
+
+    def test_envelopes_fail_expenses_over_the_monthly_limit(self):
+        fund = budgetfund(5000, "Envelopes")
+        fund.sub(120, "Groceries", date="2025-03-02")        # before the envelope: counted once set
+        fund.set_envelope("Food", 300, ["Groceries", "Takeaway"])
+        self.assertEqual(fund.envelope_usage("2025-03")["Food"]["spent"], 120)
+
+        self.assertTrue(fund.sub(150, "Takeaway", date="2025-03-10"))
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(fund.sub(40, "Groceries", date="2025-03-11"))    # 310 > 300
+        self.assertIn("Envelope 'Food' exceeded", out.getvalue())
+        self.assertTrue(fund.sub(30, "Groceries", date="2025-03-12"))        # exactly 300
+        self.assertTrue(fund.sub(40, "Groceries", date="2025-04-01"))        # new month
+        self.assertTrue(fund.sub(400, "Rent", date="2025-03-12"))            # no envelope
+
+        df = fund.get_df()
+        self.assertEqual(df["status"].tolist().count("failed"), 1)
+        self.assertAlmostEqual(fund.get(), 5000 - 120 - 150 - 30 - 40 - 400)
+        usage = fund.envelope_usage("2025-03")["Food"]
+        self.assertEqual((usage["spent"], usage["remaining"]), (300, 0))
+
+        # apply_batch: same outcome as sub() row by row, in row order
+        with redirect_stdout(io.StringIO()):
+            ok = fund.apply_batch(["sub", "sub", "add", "sub"], [200, 100, 50, 60],
+                                  ["Takeaway", "Groceries", "Groceries", "Takeaway"], ["2025-04-05"] * 4)
+        self.assertEqual(ok.tolist(), [True, False, True, True])
+        self.assertEqual(fund.envelope_usage("2025-04")["Food"]["spent"], 300)
+
+        fund.remove_envelope("Food")
+        self.assertTrue(fund.sub(500, "Groceries", date="2025-04-06"))
+        with self.assertRaises(ValueError):
+            fund.set_envelope("Misc", -1)
+
     # ========= get_df & year_month =========
 
     def test_get_df_empty_then_with_range(self):
@@ -94,11 +653,188 @@ class TestBudgetFundModule(unittest.TestCase):
         self.assertEqual(len(df_from_feb), 1)
         self.assertTrue((df_from_feb["year_month"] == "2025-02").all())
 
+    def test_get_df_cache_hits_and_incremental_append(self):
+        self.fund.add(100, "Salary", date="2025-01-05")
+        self.fund.get_df()
+        self.fund.get_df(start="2025-01", end="2025-01")
+        stats = self.fund.cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+        # appended rows invalidate the cache, only the tail is converted
+        self.fund.sub(30, "Food", date="2025-02-01")
+        df = self.fund.get_df()
+        self.assertEqual(len(df), 2)
+        self.assertEqual(list(df.index), [0, 1])
+        self.assertEqual(df.iloc[1]["year_month"], "2025-02")
+        self.assertEqual(self.fund.cache_stats()["misses"], 2)
+
+        # changing the returned frame must not change the cache
+        df["amount"] = 0
+        self.assertEqual(self.fund.get_df().iloc[0]["amount"], 100.0)
+
+    def test_get_df_range_with_back_dated_rows(self):
+        self.fund.add(100, "Salary Mar", date="2025-03-01")
+        self.fund.add(100, "Salary Apr", date="2025-04-01")
+        self.assertEqual(len(self.fund.get_df("2025-03", "2025-03")), 1)
+
+        # back-dated rows arrive after the index was built
+        self.fund.sub(10, "Food Jan", date="2025-01-20")
+        self.fund.sub(10, "Food Mar", date="2025-03-15")
+        self.fund.apply_batch(["sub", "sub"], [1, 2], ["Late Feb", "Late Jan"], ["2025-02-10", "2025-01-02"])
+
+        df_q1 = self.fund.get_df("2025-01-10", "2025-03-31")   # whole months Jan..Mar
+        self.assertEqual(list(df_q1["description"]), ["Late Jan", "Food Jan", "Late Feb", "Salary Mar", "Food Mar"])
+        self.assertEqual(list(df_q1.index), [5, 2, 4, 0, 3])
+
+        self.assertEqual(list(self.fund.get_df("2025-01", "2025-01")["description"]), ["Late Jan", "Food Jan"])
+        self.assertEqual(len(self.fund.get_df(start="2025-04")), 1)
+        self.assertTrue(self.fund.get_df("2025-05", "2025-06").empty)
+
+    def test_back_dated_rows_wait_in_side_buffer(self):
+        rng = np.random.default_rng(11)
+        entered = []
+        with patch("budget_system.budgetfund.date_index.LATE_ROWS", 8):
+            for i in range(300):
+                day = np.datetime64("2025-01-01") + int(rng.integers(0, 120))
+                if i % 50 == 0:
+                    dates = day + rng.integers(-30, 30, 5).astype("timedelta64[D]")
+                    self.fund.apply_batch(["add"] * 5, [1] * 5, dates=dates)
+                    entered += dates.tolist()
+                else:
+                    self.fund.add(1, date=str(day))
+                    entered.append(day.item())
+                if i % 37 == 0:     # queries in between, with rows still in the buffer
+                    self.fund.get_df("2025-02", "2025-03")
+
+            dates = np.array(entered, dtype="datetime64[D]")
+            order = np.argsort(dates, kind="stable")
+            for start, end in (("2025-01", "2025-01"), ("2025-02", "2025-03"), (None, "2025-02"), ("2025-04", None)):
+                lo = np.datetime64("1900-01-01") if start is None else np.datetime64(start + "-01")
+                hi = np.datetime64("2100-01-01") if end is None else np.datetime64(end, "M") + 1
+                expected = order[(dates[order] >= lo) & (dates[order] < hi)]
+                self.assertEqual(self.fund.get_df(start, end).index.tolist(), expected.tolist())
+                self.assertEqual(self.fund.select(start=start, end=end).tolist(), expected.tolist())
+            self.assertEqual(self.fund.get_df().index.tolist(), order.tolist())
+
+            # a late row is buffered: the sorted arrays are not copied
+            index = self.fund._budgetfund__dates
+            index.sorted_positions()
+            sorted_dates = index._dates
+            self.fund.sub(1, "Late", date="2024-06-01")
+            self.assertEqual(self.fund.get_df("2024-06", "2024-06")["description"].tolist(), ["Late"])
+            self.assertIs(index._dates, sorted_dates)
+
+    def test_dates_validated_at_insert(self):
+        self.fund.add(10, "Salary", date=date(2025, 3, 4))
+        self.fund.sub(5, "Food", date=np.datetime64("2025-03-05"))
+        self.fund.add(10, "Gift")   # today
+        for bad in ["", "2025-13-01", "not a date", "20250105", 20250105]:
+            with self.assertRaises(ValueError):
+                self.fund.add(100, "Bad", date=bad)
+            with self.assertRaises(ValueError):
+                self.fund.sub(1, "Bad", date=bad)
+        with self.assertRaises(ValueError):
+            self.fund.apply_batch(["add", "add"], [1, 1], dates=["2025-01-01", "2025-02-30"])
+
+        # rejected rows never touch the balance or the log
+        self.assertEqual(self.fund.get(), 1015.0)
+        records = self.fund.get_log()[1]
+        self.assertEqual(len(records), 3)
+        self.assertEqual([r[5] for r in records[:2]], ["2025-03-04", "2025-03-05"])
+
+    # ========= balance_at / balance_series =========
+
+    def test_balance_at_with_back_dated_rows(self):
+        self.fund.add(500, "Salary", date="2025-02-01")
+        self.fund.sub(200, "Rent", date="2025-02-03")
+        self.fund.sub(99999, "Too Big", date="2025-02-04")   # failed, no effect
+        self.assertEqual(self.fund.balance_at("2025-01-31"), 1000.0)
+        self.assertEqual(self.fund.balance_at("2025-02-03"), 1300.0)
+
+        # back-dated entry changes every later balance
+        self.fund.sub(50, "Food", date="2025-01-15")
+        self.assertEqual(self.fund.balance_at("2025-01-14"), 1000.0)
+        self.assertEqual(self.fund.balance_at("2025-01-15"), 950.0)
+        self.assertEqual(self.fund.balance_at("2025-02-03"), 1250.0)
+        self.assertEqual(self.fund.balance_at("2030-01-01"), self.fund.get())
+
+    def test_balance_at_many_rows_matches_cumsum(self):
+        # enough rows to span several checkpoints, inserted in random date order
+        rng = np.random.default_rng(3)
+        n = 2000
+        days = np.datetime64("2024-01-01") + rng.integers(0, 400, n).astype("timedelta64[D]")
+        amounts = np.round(rng.random(n) * 10, 2)
+        actions = np.where(rng.random(n) < 0.6, "add", "sub")
+        with redirect_stdout(io.StringIO()):
+            ok = self.fund.apply_batch(actions, amounts, dates=days)
+        delta = np.where(actions == "add", amounts, -amounts) * ok
+
+        query = np.datetime64("2024-08-15")
+        expected = 1000 + delta[days <= query].sum()
+        self.assertAlmostEqual(self.fund.balance_at(query), expected, places=6)
+
+        dates, balances = self.fund.balance_series("2024-01-01", "2025-02-04")
+        self.assertEqual(len(dates), 401)
+        self.assertAlmostEqual(balances[-1], self.fund.get(), places=6)
+        self.assertAlmostEqual(float(balances[dates == query][0]), expected, places=6)
+
+    def test_back_dated_rows_update_later_balances(self):
+        self.fund.add(500, "Salary", date="2025-02-01")
+        self.fund.sub(200, "Rent", date="2025-02-03")
+        self.assertEqual(self.fund.get_df()["balance"].tolist(), [1500.0, 1300.0])
+
+        # a late statement: every row dated after it moves, cached frame included
+        self.fund.sub(50, "Food", date="2025-01-15")
+        self.fund.add(5, "Refund", date="2025-02-01")    # same day as Salary, entered later
+        df = self.fund.get_df()    # rows in date order, same day in entry order
+        self.assertEqual(df["description"].tolist(), ["Food", "Salary", "Refund", "Rent"])
+        self.assertEqual(df.index.tolist(), [2, 0, 3, 1])
+        self.assertEqual(df["balance"].tolist(), [950.0, 1450.0, 1455.0, 1255.0])
+        self.assertEqual([row[3] for row in self.fund.get_log()[1]], [950.0, 1450.0, 1455.0, 1255.0])
+        self.assertEqual(self.fund.get_df("2025-02", "2025-02")["balance"].tolist(), [1450.0, 1455.0, 1255.0])
+        self.assertEqual(self.fund.get(), 1255.0)
+
+    def test_running_balances_match_date_order_replay(self):
+        rng = np.random.default_rng(7)
+        self.fund.apply_batch(["add"] * 50, np.round(rng.random(50) * 100, 2),
+                              dates=np.datetime64("2025-06-01") + rng.integers(0, 60, 50).astype("timedelta64[D]"))
+        df0 = self.fund.get_df()    # warm the cache before the late entries
+        for i in range(40):
+            day = str(np.datetime64("2025-01-01") + int(rng.integers(0, 400)))
+            with redirect_stdout(io.StringIO()):
+                if i % 3:
+                    self.fund.sub(float(np.round(rng.random() * 30, 2)), f"Late {i}", date=day)
+                else:
+                    self.fund.add(float(np.round(rng.random() * 30, 2)), f"Late {i}", date=day)
+
+        df = self.fund.get_df()
+        ok = np.where(df["status"] == "succeeded", 1.0, 0.0)
+        delta = np.where(df["action"] == "add", df["amount"], -df["amount"]) * ok
+        order = np.lexsort((np.arange(len(df)), df["date"].to_numpy()))
+        expected = np.empty(len(df))
+        expected[order] = 1000 + np.cumsum(delta[order])
+        np.testing.assert_allclose(df["balance"].to_numpy(), expected)
+        self.assertEqual(len(df0), 50)
+
+    def test_balance_series_monthly_and_errors(self):
+        self.fund.add(100, "Salary", date="2025-01-10")
+        self.fund.sub(30, "Food", date="2025-03-02")
+
+        dates, balances = self.fund.balance_series("2024-12", "2025-03", freq="M")
+        self.assertEqual([str(d) for d in dates], ["2024-12-31", "2025-01-31", "2025-02-28", "2025-03-31"])
+        self.assertEqual(balances.tolist(), [1000.0, 1100.0, 1100.0, 1070.0])
+
+        with self.assertRaises(ValueError):
+            self.fund.balance_series("2025-01-01", "2025-02-01", freq="W")
+        with self.assertRaises(ValueError):
+            self.fund.balance_at("not a date")
+
     # ========= summarize_month =========
 
     def test_summarize_month_no_transactions(self):
         # no records at all
-        with patch("budget_system.budgetfund.budgetfund.plt.show"):
+        with patch("matplotlib.pyplot.show"):
             result = self.fund.summarize_month("2025-01")
         self.assertIsNone(result)
 
@@ -107,7 +843,7 @@ class TestBudgetFundModule(unittest.TestCase):
         self.fund.add(100, "Salary Jan", date="2025-01-10")
         self.fund.sub(30, "Food Jan", date="2025-01-15")
 
-        with patch("budget_system.budgetfund.budgetfund.plt.show"):
+        with patch("matplotlib.pyplot.show"):
             result = self.fund.summarize_month("2024-01", "2024-01")
         self.assertIsNone(result)
 
@@ -115,7 +851,7 @@ class TestBudgetFundModule(unittest.TestCase):
         # only failed transactions in the period
         self.fund.sub(5000, "Big Purchase", date="2025-01-10")  # failed
 
-        with patch("budget_system.budgetfund.budgetfund.plt.show"):
+        with patch("matplotlib.pyplot.show"):
             result = self.fund.summarize_month("2025-01", "2025-01")
         self.assertIsNone(result)
 
@@ -125,13 +861,55 @@ class TestBudgetFundModule(unittest.TestCase):
         self.fund.sub(100, "Food", date="2025-01-10")
         self.fund.sub(50, "Snacks", date="2025-01-15")
 
-        with patch("budget_system.budgetfund.budgetfund.plt.show") as mock_show:
+        with patch("matplotlib.pyplot.show") as mock_show:
             result = self.fund.summarize_month("2025-01", "2025-01")
 
         # function returns None but should have called plt.show once
         self.assertIsNone(result)
         mock_show.assert_called_once()
 
+    def test_summarize_month_uses_monthly_rollups(self):
+        self.fund.add(500, "Salary", date="2025-01-05")
+        self.fund.sub(100, "Food", date="2025-01-10")
+        self.fund.sub(9999, "Too Big", date="2025-01-11")       # failed
+        self.fund.sub(40, "Food", date="2025-02-03")
+        self.fund.sub(60, "Rent", date="2025-03-01")
+
+        summary = self.fund.summarize_month("2025-01", "2025-02", plot=False)
+        self.assertEqual(summary, {
+            "start": "2025-01",
+            "end": "2025-02",
+            "opening": 1000.0,
+            "income": 500.0,
+            "expense": 140.0,
+            "closing": 1360.0,
+            "breakdown": {"Food": 140.0},
+        })
+
+        # rows appended later land in their month bucket, and the closing
+        # balance is the balance at the end of February (March rent excluded)
+        self.fund.add(10, "Gift", date="2025-02-20")
+        summary = self.fund.summary("2025-01", "2025-02")
+        self.assertEqual(summary["income"], 510.0)
+        self.assertEqual(summary["closing"], 1370.0)
+
+        # a late December statement moves January's opening balance
+        self.fund.sub(25, "Late Bill", date="2024-12-30")
+        summary = self.fund.summary("2025-01")
+        self.assertEqual((summary["opening"], summary["closing"]), (975.0, 1375.0))
+
+    def test_render_summary_to_image_bytes(self):
+        self.fund.add(500, "Salary", date="2025-01-05")
+        summary = self.fund.summary("2025-01")
+        self.assertEqual(summary["breakdown"], {})
+
+        self.fund.sub(100, "Food", date="2025-01-10")
+        summary = self.fund.summary("2025-01")
+        png = render_summary(summary, fmt="png")
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        svg = render_summary(summary, fmt="svg")
+        self.assertIn(b"<svg", svg)
+
     # ========= __str__ =========
 
     def test_str_representation(self):
@@ -156,6 +934,34 @@ class TestBudgetFundModule(unittest.TestCase):
         self.assertGreaterEqual(len(records), 2)
         self.assertIn("Total Record #:", summary)
 
+    def test_log_result_pages_lazily(self):
+        self.fund.apply_batch(["add"] * 25, list(range(1, 26)), [f"Row {i}" for i in range(25)],
+                              ["2025-01-01"] * 20 + ["2025-02-01"] * 5)
+
+        with patch("budget_system.budgetfund.fund_utils.display") as mock_display:
+            records, summary = print_log(self.fund, "2025-01", "2025-01", page_size=8)
+        self.assertIsInstance(records, LogResult)
+        self.assertEqual(summary, "Total Record #: 20")
+        self.assertEqual(mock_display.call_count, 1)
+        self.assertEqual(mock_display.call_args[0][0].data.shape[0], 8)   # only the first page
+
+        self.assertEqual(len(records), 20)
+        self.assertEqual(records.page_count, 3)
+        self.assertEqual(records[0][:3], ["add", 1.0, "Row 0"])
+        self.assertEqual([row[2] for row in records[18:]], ["Row 18", "Row 19"])
+        self.assertEqual(len(list(records)), 20)
+        self.assertEqual(records.page(2)["description"].tolist(), ["Row 16", "Row 17", "Row 18", "Row 19"])
+        self.assertTrue(records.page(3).empty)
+
+        # cursor: follow the tokens to the end
+        seen, token = [], None
+        while True:
+            df, token = records.after(token)
+            seen += df["description"].tolist()
+            if token is None:
+                break
+        self.assertEqual(seen, [f"Row {i}" for i in range(20)])
+
     # ========= fund_utils: search_log =========
 
     def test_search_log_found_and_not_found(self):
@@ -176,6 +982,61 @@ class TestBudgetFundModule(unittest.TestCase):
             result_not_found = search_log(self.fund, "xyz")
             self.assertEqual(result_not_found, ["No record found"])
 
+    def test_select_combines_status_action_date_and_keyword(self):
+        self.fund.apply_batch(["add", "sub", "sub", "sub"], [100, 30, 5000, 20],
+                              ["Salary", "Food", "Car", "Food"],
+                              ["2025-01-05", "2025-01-06", "2025-02-01", "2025-02-02"])
+        self.fund.sub(9999, "Food", date="2024-12-31")    # failed, back-dated
+        self.fund.add(10, "Gift", date="2025-02-03")
+
+        self.assertEqual(self.fund.select(status="failed").tolist(), [4, 2])    # date order
+        self.assertEqual(self.fund.select(action="add").tolist(), [0, 5])
+        self.assertEqual(self.fund.select(status="succeeded", action="sub").tolist(), [1, 3])
+        self.assertEqual(self.fund.select(status="failed", start="2025-02").tolist(), [2])
+        self.assertEqual(self.fund.select(keyword="food", status="succeeded", end="2025-01").tolist(), [1])
+        self.assertEqual(self.fund.select().tolist(), [4, 0, 1, 2, 3, 5])
+
+        # cursor paging follows the date order, not the positions
+        records, seen, token = LogResult(self.fund, self.fund.select(), 4), [], None
+        while True:
+            df, token = records.after(token)
+            seen += df.index.tolist()
+            if token is None:
+                break
+        self.assertEqual(seen, [4, 0, 1, 2, 3, 5])
+
+        with redirect_stdout(io.StringIO()):
+            with self.assertRaises(ValueError):
+                self.fund.select(status="pending")
+
+    def test_intersect_slices_and_arrays(self):
+        a = np.array([1, 3, 5, 7, 9])
+        self.assertEqual(intersect(a, np.array([0, 3, 4, 9, 12])).tolist(), [3, 9])
+        self.assertEqual(intersect(slice(2, 8), a).tolist(), [3, 5, 7])
+        self.assertEqual(intersect(slice(2, 8), slice(5, 20)), slice(5, 8))
+        self.assertEqual(intersect(slice(8, 9), slice(1, 3)), slice(8, 8))
+        self.assertEqual(intersect(a, np.array([], dtype=np.int64)).tolist(), [])
+
+    def test_find_uses_index_and_keeps_ledger_order(self):
+        self.fund.apply_batch(["add", "sub", "sub", "add"], [500, 20, 30, 5],
+                              ["Salary Jan", "Coffee", "coffee beans", "Cashback"],
+                              ["2025-01-01"] * 4)
+        self.assertEqual(self.fund.find("COFFEE").tolist(), [1, 2])
+
+        # rows appended after the index was built are picked up
+        self.fund.sub(4, "Iced Coffee", date="2025-01-02")
+        self.fund.add(1, "", date="2025-01-03")
+        self.assertEqual(self.fund.find("coffee").tolist(), [1, 2, 4])
+        self.assertEqual(self.fund.find("ee").tolist(), [1, 2, 4])       # shorter than an n-gram
+        self.assertEqual(self.fund.find("sal").tolist(), [0])
+        self.assertEqual(self.fund.find("fee bea").tolist(), [2])
+        self.assertEqual(self.fund.find("tea").tolist(), [])
+        self.assertEqual(self.fund.find("").tolist(), list(range(6)))
+
+        df = self.fund.get_rows(self.fund.find("coffee"))
+        self.assertEqual(df["description"].tolist(), ["Coffee", "coffee beans", "Iced Coffee"])
+        self.assertEqual(df.index.tolist(), [1, 2, 4])
+
     # ========= fund_utils: filter_status =========
 
     def test_filter_status_succeeded_and_failed(self):
@@ -213,3 +1074,59 @@ class TestBudgetFundModule(unittest.TestCase):
 
         # 这里的返回值在源码里就是这个字符串
         self.assertEqual(result, "No record found")
+
+
+class TestAsyncFund(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_requests_are_coalesced(self):
+        fund = budgetfund(100, "Async")
+        front = AsyncFund(fund, window_ms=5)
+        with patch.object(fund, "apply_batch", wraps=fund.apply_batch) as batch, \
+             redirect_stdout(io.StringIO()):
+            results = await asyncio.gather(
+                front.add(50, "Salary", date="2025-01-01"),
+                front.sub(120, "Rent", date="2025-01-02"),
+                front.sub(40, "Food", date="2025-01-03"),     # fails: 30 left
+                front.add(5, "Gift", date="2025-01-04"),
+            )
+        self.assertEqual(results, [True, True, False, True])
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(fund.get(), 35.0)
+        self.assertEqual(list(fund.get_df()["description"]), ["Salary", "Rent", "Food", "Gift"])
+
+        # same outcome as calling add/sub one by one
+        plain = budgetfund(100)
+        with redirect_stdout(io.StringIO()):
+            expected = [plain.add(50), plain.sub(120), plain.sub(40), plain.add(5)]
+        self.assertEqual(results, expected)
+
+    async def test_max_batch_and_bad_arguments(self):
+        fund = budgetfund(0)
+        front = AsyncFund(fund, window_ms=1000, max_batch=3)
+        # a full batch is applied without waiting for the window
+        results = await asyncio.wait_for(asyncio.gather(*(front.add(1) for _ in range(3))), timeout=0.5)
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(front.get(), 3.0)
+
+        with self.assertRaises(ValueError):
+            await front.sub(-1)
+        with self.assertRaises(ValueError):
+            await front.add(1, date="2025-13-01")
+        self.assertEqual(len(fund.get_df()), 3)
+
+    async def test_bad_request_does_not_fail_its_window(self):
+        fund = budgetfund(100)
+        front = AsyncFund(fund, window_ms=5)
+        results = await asyncio.gather(
+            front.add(10, "Gift"),
+            front.sub(float("nan"), "Broken"),
+            front.add(float("inf"), "Broken"),
+            front.sub(5, "Food"),
+            return_exceptions=True,
+        )
+        self.assertEqual(results[0], True)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(results[3], True)
+        self.assertEqual(fund.get(), 105.0)
+        self.assertEqual(list(fund.get_df()["description"]), ["Gift", "Food"])
@@ -8,7 +8,7 @@ if PROJECT_ROOT not in sys.path:
 
 import unittest
 
-from test_budgetfund_module import TestBudgetFundModule
+from test_budgetfund_module import TestBudgetFundModule, TestAsyncFund
 from test_member_type_module import TestMemberTypeModule
 from test_asset_module import TestAssetModule
 from test_budget_system_module import TestBudgetSystemModule
@@ -19,6 +19,7 @@ def suite():
     s = unittest.TestSuite()
 
     s.addTests(loader.loadTestsFromTestCase(TestBudgetFundModule))
+    s.addTests(loader.loadTestsFromTestCase(TestAsyncFund))
     s.addTests(loader.loadTestsFromTestCase(TestMemberTypeModule))
     s.addTests(loader.loadTestsFromTestCase(TestAssetModule))
     s.addTests(loader.loadTestsFromTestCase(TestBudgetSystemModule))